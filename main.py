@@ -1,25 +1,27 @@
 import asyncio
+import sys
+import time
+from typing import TYPE_CHECKING
 
-from pyrogram import Client
-from pyrogram.types import User
 from src.log import logger
 from src.progress_tracker import ProgressTracker
-
-from src.operations.media_clone import MediaClone
-from src.operations.media_downloader import MediaDownloader
-from src.operations.media_download_single import MediaDownloadSingle
-from src.operations.media_downup import MediaDownUp
-from src.operations.media_upload import MediaUpload
-from src.interface.menu import menu
+from src.interface.cli import build_parser, input_from_args, job_from_dict, load_job_file, read_job_file
 from src.schemas import InputModel
 from configparser import ConfigParser
 
+# Operações, pyrogram e a UI interativa (InquirerPy, pyfiglet) são importados só
+# quando usados: `--help`, erros de argumento e jobs headless não pagam por eles.
+if TYPE_CHECKING:
+    from pyrogram import Client
+    from pyrogram.types import User
+    from src.client_pool import ClientPool
+
 config = ConfigParser()
 config.read('config.ini')
 
 #TODO - Verificar se já existe arquivo antes de baixar
 
-def format_session_details(me: User) -> list[str]:
+def format_session_details(me: "User") -> list[str]:
     username = f"@{me.username}" if me.username else "nao definido"
     full_name = " ".join(filter(None, [me.first_name, me.last_name])) or "nao definido"
     is_premium = "✅" if getattr(me, "is_premium", False) else "❌"
@@ -33,66 +35,261 @@ def format_session_details(me: User) -> list[str]:
     ]
 
 
-async def main():
-    # Crie e inicie o cliente Pyrogram. Altere "user" conforme sua sessão/configuração.
-    async with Client("user", workers=100, max_concurrent_transmissions=10) as client:
-        me = await client.get_me()
-        session_details = format_session_details(me)
+def build_action(client: "Client", args: InputModel, progress_tracker: ProgressTracker, delete_corrupted: bool | None = None, pool: "ClientPool | None" = None):
+    """Cria a operação correspondente a um InputModel (menu, CLI ou arquivo de jobs).
 
-        # Função principal e configuração da linha de comando
-        args: InputModel = await menu(session_details=session_details)
+    `pool` (só com mais de uma sessão) distribui envios e downloads entre as contas.
+    """
+    if args.action == "clone":
+        from src.operations.media_clone import MediaClone
+        return MediaClone(
+            client=client,
+            config=config,
+            origin_chat_id=args.origin_id,
+            destination_chat_id=args.dest_id,
+            progress_tracker=progress_tracker,
+            add_suffix=args.add_suffix,
+            remove_suffix=args.remove_suffix,
+            mirror=args.mirror,
+            mirror_batch_delay=config.getfloat('clone', 'mirror_batch_delay', fallback=1.5),
+        )
+    if args.action == "download chat":
+        from src.operations.media_downloader import MediaDownloader
+        return MediaDownloader(
+            client=client,
+            origin_chat_id=args.origin_id,
+            progress_tracker=progress_tracker,
+            pool=pool,
+        )
+    if args.action == "download media":
+        from src.operations.media_download_single import MediaDownloadSingle
+        return MediaDownloadSingle(
+            client=client,
+            origin_link=args.origin_id,
+            progress_tracker=progress_tracker
+        )
+    if args.action == "upload":
+        from src.operations.media_upload import MediaUpload
+        return MediaUpload(
+            client=client,
+            upload_path=args.upload_path,
+            destination_chat_id=args.dest_id,
+            progress_tracker=progress_tracker,
+            pipeline=config.getboolean('upload', 'pipeline', fallback=False),
+            probe_concurrency=config.getint('upload', 'probe_concurrency', fallback=0) or None,
+            zip_workers=config.getint('upload', 'zip_workers', fallback=0) or None,
+            stream_zip=config.getboolean('upload', 'stream_zip', fallback=False),
+            fingerprint_mode=config.get('upload', 'fingerprint', fallback='full'),
+            max_attempts=config.getint('upload', 'max_attempts', fallback=5),
+            thumb_lookahead=config.getint('upload', 'thumb_lookahead', fallback=3),
+            reencode_options=dict(
+                jobs=config.getint('reencode', 'jobs', fallback=0) or None,
+                threads=config.getint('reencode', 'threads', fallback=0) or None,
+                nice=config.getint('reencode', 'nice', fallback=0),
+                target_size=config.get('reencode', 'target_size', fallback='off'),
+                min_video_kbps=config.getint('reencode', 'min_video_kbps', fallback=400),
+                segment_min_duration=config.getfloat('reencode', 'segment_min_minutes', fallback=0) * 60,
+                delete_corrupted=delete_corrupted,
+            ),
+            pool=pool,
+            watch=args.watch,
+            watch_debounce=config.getfloat('upload', 'watch_debounce', fallback=3.0),
+            watch_poll_interval=config.getfloat('upload', 'watch_poll_interval', fallback=5.0),
+        )
+    if args.action == "down_up":
+        from src.operations.media_downup import MediaDownUp
+        return MediaDownUp(
+            client=client,
+            origin_chat_id=args.origin_id,
+            destination_chat_id=args.dest_id,
+            progress_tracker=progress_tracker,
+        )
+    return None
+
+
+def create_progress_tracker() -> ProgressTracker:
+    return ProgressTracker(
+        flush_interval=config.getfloat('progress', 'flush_interval', fallback=1.0),
+        fsync_interval=config.getfloat('progress', 'fsync_interval', fallback=30.0),
+    )
 
-        # Cria o rastreador de progresso
-        progress_tracker = ProgressTracker()
-
-        if not args.confirm:
-            return await main()
-
-        action = None
-        if args.action == "clone":
-            action = MediaClone(
-                client=client,
-                config=config,
-                origin_chat_id=args.origin_id,
-                destination_chat_id=args.dest_id,
-                progress_tracker=progress_tracker,
-                add_suffix=args.add_suffix,
-                remove_suffix=args.remove_suffix,
-            )
-
-        elif args.action == "download chat":
-            action = MediaDownloader(
-                client=client,
-                origin_chat_id=args.origin_id,
-                progress_tracker=progress_tracker
-            )
-        elif args.action == "download media":
-            action = MediaDownloadSingle(
-                client=client,
-                origin_link=args.origin_id,
-                progress_tracker=progress_tracker
-            )
-        elif args.action == "upload":
-            action = MediaUpload(
-                client=client,
-                upload_path=args.upload_path,
-                destination_chat_id=args.dest_id,
-                progress_tracker=progress_tracker,
-            )
-        elif args.action == "down_up":
-            action = MediaDownUp(
-                client=client,
-                origin_chat_id=args.origin_id,
-                destination_chat_id=args.dest_id,
-                progress_tracker=progress_tracker,
-            )
 
+def describe_job(job: InputModel) -> str:
+    target = job.upload_path or job.origin_id or ""
+    return f"{job.action} {target}" + (f" -> {job.dest_id}" if job.dest_id else "")
+
+
+async def run_jobs(client: "Client", jobs: list[InputModel], max_concurrent: int, delete_corrupted: bool, pool: "ClientPool | None" = None) -> bool:
+    """Executa os jobs ao mesmo tempo (até max_concurrent) no mesmo cliente e imprime o resumo."""
+    progress_tracker = create_progress_tracker()
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+    results: list[tuple[str, float]] = [("pendente", 0.0)] * len(jobs)
+
+    async def run_job(i: int, job: InputModel):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                action = build_action(client, job, progress_tracker, delete_corrupted, pool)
+                if action is None:
+                    raise ValueError(f"ação desconhecida: {job.action}")
+                await action.run()
+                results[i] = ("ok", time.monotonic() - started)
+            except Exception as e:
+                logger.error(f"Job {i + 1} ({describe_job(job)}) falhou: {e}", exc_info=True)
+                results[i] = (f"falhou: {e}", time.monotonic() - started)
+
+    try:
+        await asyncio.gather(*(run_job(i, job) for i, job in enumerate(jobs)))
+    finally:
+        progress_tracker.close()
+
+    print("\nResumo dos jobs:")
+    for i, (job, (status, elapsed)) in enumerate(zip(jobs, results), 1):
+        print(f"  {i:>3}. [{status}] {describe_job(job)} ({elapsed:.0f}s)")
+    failed = sum(1 for status, _ in results if status != "ok")
+    print(f"{len(jobs) - failed}/{len(jobs)} job(s) concluídos.")
+    return failed == 0
+
+
+async def interactive(client: "Client", pool: "ClientPool | None" = None):
+    from src.interface.menu import menu
+
+    me = await client.get_me()
+    session_details = format_session_details(me)
+
+    # Pergunta de novo até o usuário confirmar
+    while True:
+        args: InputModel = await menu(session_details=session_details)
+        if args.confirm:
+            break
+
+    # Cria o rastreador de progresso
+    progress_tracker = create_progress_tracker()
+    try:
+        action = build_action(client, args, progress_tracker, pool=pool)
         if action:
             await action.run()
+    finally:
+        progress_tracker.close()
+
+
+def daemon_socket(cli_args) -> str:
+    from src.daemon import DEFAULT_SOCKET
+    return cli_args.socket or config.get('daemon', 'socket', fallback=DEFAULT_SOCKET)
+
+
+async def run_daemon(client: "Client", pool: "ClientPool | None", cli_args) -> int:
+    """Serviço: a sessão fica conectada e os jobs chegam pelo socket (ver src/daemon.py)."""
+    from src.daemon import DEFAULT_WORKERS, JobDaemon
+
+    # Carrega os diálogos uma vez para que os chats já estejam no cache da sessão
+    # (evita o PEER_ID_INVALID e a recuperação via get_dialogs em cada job)
+    dialogs = 0
+    async for _ in client.get_dialogs():
+        dialogs += 1
+    logger.info(f"Serviço: {dialogs} diálogos carregados")
+
+    progress_tracker = create_progress_tracker()
+
+    async def run_job(job: InputModel):
+        action = build_action(client, job, progress_tracker, cli_args.delete_corrupted, pool)
+        if action is None:
+            raise ValueError(f"ação desconhecida: {job.action}")
+        await action.run()
+
+    daemon = JobDaemon(
+        run_job,
+        parse_job=job_from_dict,
+        socket_path=daemon_socket(cli_args),
+        workers=cli_args.workers or config.getint('daemon', 'workers', fallback=DEFAULT_WORKERS),
+    )
+    try:
+        await daemon.serve()
+    finally:
+        progress_tracker.close()
+    return 0
+
+
+def print_job_event(event: dict):
+    if event.get("ok") is False:
+        print(f"Erro: {event.get('error')}")
+    elif event.get("event") == "log":
+        print(f"[{event['id']}] {event['message']}")
+    elif event.get("event") == "progress":
+        percent = f"{event['percent']:.1f}%" if event.get("percent") is not None else "?"
+        print(f"[{event['id']}] {event['name']}: {percent} ({event['current'] / 1024 / 1024:.2f}/{event['total'] / 1024 / 1024:.2f}MB)")
+    else:
+        error = f": {event['error']}" if event.get("error") else ""
+        print(f"[{event['id']}] {event['event']}{error}")
+
+
+async def daemon_client(cli_args) -> int:
+    """Subcomandos submit/queue: falam com o serviço, sem abrir sessão do Telegram."""
+    from src.daemon import request
+
+    socket_path = daemon_socket(cli_args)
+    try:
+        if cli_args.command == "queue":
+            if cli_args.cancel:
+                [response] = await request(socket_path, {"cmd": "cancel", "id": cli_args.cancel})
+                print("Job cancelado." if response.get("ok") else "Job não encontrado ou já terminado.")
+                return 0 if response.get("ok") else 1
+            [response] = await request(socket_path, {"cmd": "status"})
+            for job in response["jobs"]:
+                fields = job["job"]
+                target = fields.get("upload_path") or fields.get("origin_id") or ""
+                print(f"{job['id']}  {job['status']:<9} p={job['priority']:<3} {fields.get('action')} {target}")
+            return 0
+
+        ids = []
+        for item in read_job_file(cli_args.job_file):
+            [response] = await request(socket_path, {"cmd": "submit", "job": item, "priority": cli_args.priority})
+            if not response.get("ok"):
+                print(f"Job recusado ({item}): {response.get('error')}")
+                return 1
+            ids.append(response["id"])
+            print(f"Job {response['id']} na fila: {item.get('action')}")
+        if not cli_args.follow:
+            return 0
+        results = await asyncio.gather(*(
+            request(socket_path, {"cmd": "watch", "id": job_id}, print_job_event) for job_id in ids
+        ))
+        return 0 if all(events and events[-1].get("event") == "done" for events in results) else 1
+    except (ConnectionRefusedError, FileNotFoundError):
+        print(f"Serviço não encontrado em {socket_path} (inicie com `python main.py daemon`).")
+        return 1
+
+
+async def main(argv: list[str] | None = None) -> int:
+    cli_args = build_parser().parse_args(argv)
+    if cli_args.command in ("submit", "queue"):
+        return await daemon_client(cli_args)
+    jobs: list[InputModel] = []
+    if cli_args.command == "jobs":
+        jobs = load_job_file(cli_args.job_file)
+    elif cli_args.command and cli_args.command != "daemon":
+        jobs = [input_from_args(cli_args)]
+
+    from src.client_pool import ClientPool
+
+    # Sessões Pyrogram ([sessions] names); a primeira atende o menu e cria os chats
+    names = [n.strip() for n in config.get('sessions', 'names', fallback='user').split(',') if n.strip()]
+    per_session = config.getint('sessions', 'per_session', fallback=2)
+    async with ClientPool(names or ["user"], per_session=per_session) as client_pool:
+        client = client_pool.primary
+        pool = client_pool if len(client_pool) > 1 else None
+        if cli_args.command == "daemon":
+            return await run_daemon(client, pool, cli_args)
+        if not jobs:
+            await interactive(client, pool)
+            return 0
+        max_concurrent = getattr(cli_args, "max_concurrent", 1)
+        ok = await run_jobs(client, jobs, max_concurrent, cli_args.delete_corrupted, pool)
+        return 0 if ok else 1
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        sys.exit(asyncio.run(main()))
     except KeyboardInterrupt:
         logger.info("Script interrompido pelo usuário.")
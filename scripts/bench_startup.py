@@ -0,0 +1,65 @@
+###############################################################################
+# Benchmark de inicialização: tempo de import (-X importtime) e de `main.py --help`
+###############################################################################
+# Uso: python scripts/bench_startup.py [--runs 5] [--top 15] [--budget-ms 300]
+# Com --budget-ms, sai com código 1 se a mediana passar do orçamento.
+
+import argparse, os, statistics, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Importa main sem executá-lo e monta o parser: o caminho até o Client ser criado
+STARTUP_CODE = "import main; main.build_parser().parse_args(['upload', '.'])"
+
+
+def import_times(code: str) -> list[tuple[int, int, str]]:
+    """(self_us, cumulative_us, módulo) de cada import, lidos do stderr do -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def wall_time(args: list[str]) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o tempo de inicialização do main.py.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Imports mais caros a listar")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Falha se a mediana passar disso")
+    args = parser.parse_args()
+
+    rows = import_times(STARTUP_CODE)
+    # Módulos de primeiro nível (sem indentação extra) somam o tempo total
+    top_level = [r for r in rows if not r[2][1:].startswith(" ")]
+    total_ms = sum(r[1] for r in top_level) / 1000
+    print(f"Imports até o parser pronto: {total_ms:.1f} ms ({len(rows)} módulos)")
+    print(f"\n{'cumulativo':>12} {'próprio':>10}  módulo")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda r: -r[1])[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name.strip()}")
+
+    samples = [wall_time(["-c", STARTUP_CODE]) for _ in range(args.runs)]
+    help_samples = [wall_time(["main.py", "--help"]) for _ in range(args.runs)]
+    median_ms = statistics.median(samples) * 1000
+    print(f"\nProcesso até o parser pronto: mediana {median_ms:.0f} ms em {args.runs} execuções")
+    print(f"`main.py --help`: mediana {statistics.median(help_samples) * 1000:.0f} ms")
+
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        print(f"Acima do orçamento de {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
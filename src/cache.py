@@ -0,0 +1,68 @@
+###############################################################################
+# Cache persistente em JSON Lines (append-only, última linha de cada chave vence)
+###############################################################################
+
+import json, os
+from src.log import logger
+
+CACHE_DIR = "./cache"
+
+
+def file_key(path: str, st: os.stat_result | None = None) -> str:
+    """Chave estável de um arquivo: caminho absoluto + tamanho + mtime."""
+    st = st or os.stat(path)
+    return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+class JsonlCache:
+    """Dicionário persistido em disco; cada set() acrescenta uma linha ao arquivo."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.data: dict[str, object] = {}
+        parent = os.path.dirname(filename)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        lines = 0
+        if os.path.exists(filename):
+            try:
+                with open(filename, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            item = json.loads(line)
+                        except ValueError:
+                            continue  # linha truncada por interrupção
+                        self.data[item["k"]] = item["v"]
+                        lines += 1
+            except Exception as e:
+                logger.error(f"Erro ao ler cache {filename}: {e}")
+        # Compacta quando o arquivo acumulou muitas versões antigas das mesmas chaves
+        if lines > 2 * len(self.data) + 100:
+            self._compact()
+
+    def get(self, key: str, default=None):
+        return self.data.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.data
+
+    def set(self, key: str, value):
+        self.data[key] = value
+        try:
+            with open(self.filename, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"k": key, "v": value}, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.error(f"Erro ao salvar cache {self.filename}: {e}")
+
+    def _compact(self):
+        tmp = f"{self.filename}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for key, value in self.data.items():
+                    f.write(json.dumps({"k": key, "v": value}, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.filename)
+        except Exception as e:
+            logger.error(f"Erro ao compactar cache {self.filename}: {e}")
@@ -0,0 +1,156 @@
+###############################################################################
+# Pool de sessões do Telegram: transferências vão para a conta com mais folga
+###############################################################################
+
+import time
+from pyrogram import Client
+from pyrogram.errors import (
+    ChannelInvalid,
+    ChannelPrivate,
+    ChatAdminRequired,
+    ChatForbidden,
+    ChatWriteForbidden,
+    FloodWait,
+    PeerIdInvalid,
+    UserBannedInChannel,
+    UserNotParticipant,
+)
+from src.log import logger
+
+CLIENT_OPTIONS = dict(workers=100, max_concurrent_transmissions=10)
+DEFAULT_PER_SESSION = 2  # transferências simultâneas por sessão
+# Erros que indicam que a conta de fato não pode usar o chat
+DENIED_ERRORS = (ChannelPrivate, ChatWriteForbidden, ChatAdminRequired, ChatForbidden,
+                 UserBannedInChannel, UserNotParticipant)
+# Peer ainda não conhecido pela sessão (cache vazio), não falta de permissão
+UNRESOLVED_ERRORS = (PeerIdInvalid, ChannelInvalid, KeyError, ValueError)
+
+
+class Session:
+    """Um cliente do pool e o estado de limite de taxa da sua conta."""
+
+    def __init__(self, name: str, client: Client):
+        self.name = name
+        self.client = client
+        self.me = None
+        self.in_flight = 0          # transferências em andamento
+        self.flood_until = 0.0      # time.monotonic() até o fim do FloodWait
+        self.flood_count = 0
+        self.denied_chats: set = set()  # chats em que esta conta não pode ler/postar
+        self.warmed_up = False          # diálogos já carregados no cache de peers
+
+    @property
+    def account_id(self) -> int | None:
+        return self.me.id if self.me else None
+
+    def flood_remaining(self) -> float:
+        return max(0.0, self.flood_until - time.monotonic())
+
+
+class ClientPool:
+    """Várias sessões (arquivos .session) usadas como uma só.
+
+    A primeira sessão é a principal (menu, criação de chats). Cada chamada em
+    run() vai para a sessão ativa com menos transferências em andamento; um
+    FloodWait tira só aquela sessão de circulação até o prazo e a chamada é
+    refeita em outra. Com todas em espera, o FloodWait de menor prazo sobe
+    para quem chamou (ex.: o RetryScheduler).
+
+    A carga só se espalha se quem chama mantiver até `capacity` chamadas de
+    run() em andamento ao mesmo tempo.
+    """
+
+    def __init__(self, names: list[str], per_session: int = DEFAULT_PER_SESSION, **client_options):
+        options = {**CLIENT_OPTIONS, **client_options}
+        self.sessions = [Session(name, Client(name, **options)) for name in names]
+        self.per_session = max(1, per_session)
+
+    @property
+    def capacity(self) -> int:
+        """Transferências simultâneas que quem usa o pool deve manter em andamento."""
+        return self.per_session * len(self.sessions)
+
+    @property
+    def primary(self) -> Client:
+        return self.sessions[0].client
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    async def __aenter__(self) -> "ClientPool":
+        for session in self.sessions:
+            await session.client.start()
+            session.me = await session.client.get_me()
+        if len(self.sessions) > 1:
+            logger.info(f"Pool com {len(self.sessions)} sessões: {', '.join(s.name for s in self.sessions)}")
+        return self
+
+    async def __aexit__(self, *exc):
+        for session in self.sessions:
+            try:
+                await session.client.stop()
+            except Exception as e:
+                logger.warning(f"Erro ao encerrar sessão {session.name}: {e}")
+
+    @staticmethod
+    async def _warm_up(session: Session):
+        """Carrega os diálogos da sessão para que ids de chats virem peers resolvíveis."""
+        if session.warmed_up:
+            return
+        session.warmed_up = True
+        async for _ in session.client.get_dialogs():
+            pass
+
+    async def check_access(self, *chat_ids):
+        """Resolve os chats em cada sessão; contas sem acesso deixam de ser usadas para eles.
+
+        Uma sessão recém-aberta não conhece o peer (PeerIdInvalid): os diálogos
+        são carregados e a resolução é refeita antes de concluir algo. Só erros
+        de permissão (ou um chat que nem os diálogos da conta têm) tiram a
+        sessão do chat; outros erros são registrados e a sessão segue em uso.
+        """
+        for session in self.sessions[1:]:
+            for chat_id in chat_ids:
+                try:
+                    try:
+                        await session.client.get_chat(chat_id)
+                    except UNRESOLVED_ERRORS:
+                        await self._warm_up(session)
+                        await session.client.get_chat(chat_id)
+                except DENIED_ERRORS + UNRESOLVED_ERRORS as e:
+                    session.denied_chats.add(chat_id)
+                    logger.warning(f"Sessão {session.name} sem acesso ao chat {chat_id}: {e}")
+                except Exception as e:
+                    logger.warning(f"Não foi possível verificar o acesso da sessão {session.name} ao chat {chat_id}: {e}")
+
+    def _candidates(self, chat_ids: tuple) -> list[Session]:
+        return [s for s in self.sessions if not s.denied_chats.intersection(chat_ids)]
+
+    def pick(self, *chat_ids) -> Session | None:
+        """Sessão com mais folga (fora de FloodWait, menos transferências), ou None se todas esperam."""
+        ready = [s for s in self._candidates(chat_ids) if s.flood_remaining() == 0]
+        if not ready:
+            return None
+        return min(ready, key=lambda s: (s.in_flight, s.flood_count))
+
+    async def run(self, fn, *chat_ids, session: Session | None = None):
+        """Executa `await fn(session)` na melhor sessão, contornando as que estão em FloodWait.
+
+        `session` fixa a conta (ex.: reenviar um file_id que só vale para ela).
+        """
+        while True:
+            chosen = session or self.pick(*chat_ids)
+            if chosen is None:
+                wait = min(s.flood_remaining() for s in self._candidates(chat_ids))
+                raise FloodWait(value=max(1, int(wait + 0.999)))
+            chosen.in_flight += 1
+            try:
+                return await fn(chosen)
+            except FloodWait as e:
+                chosen.flood_until = time.monotonic() + e.value
+                chosen.flood_count += 1
+                logger.warning(f"Sessão {chosen.name} em FloodWait por {e.value}s; usando outra sessão.")
+                if session is not None or len(self.sessions) == 1:
+                    raise
+            finally:
+                chosen.in_flight -= 1
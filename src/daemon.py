@@ -0,0 +1,320 @@
+###############################################################################
+# Modo serviço: cliente conectado o tempo todo, jobs recebidos por um socket local
+###############################################################################
+# Protocolo: uma requisição JSON por linha, respostas JSON por linha.
+#   {"cmd": "submit", "job": {"action": "upload", ...}, "priority": 0} -> {"ok": true, "id": "..."}
+#   {"cmd": "status", "id": "..."} (sem id = todos)                   -> {"ok": true, "jobs": [...]}
+#   {"cmd": "cancel", "id": "..."}                                    -> {"ok": true}
+#   {"cmd": "watch", "id": "..."} -> eventos {"id", "event", ...} até o job terminar
+#     event: queued/running/done/failed/cancelled, log {level, message} ou
+#            progress {name, current, total, percent}
+
+import asyncio, contextvars, heapq, itertools, json, logging, os, time, uuid
+from src.cache import CACHE_DIR
+from src.log import logger
+
+DEFAULT_SOCKET = "./tgturbo.sock"  # ou tcp://127.0.0.1:8765
+DEFAULT_WORKERS = 2
+JOBS_FILE = os.path.join(CACHE_DIR, "daemon_jobs.json")
+KEEP_FINISHED = 200  # jobs terminados mantidos para consulta
+PROGRESS_INTERVAL = 0.5  # segundos entre eventos de progresso de uma mesma transferência
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Job em execução na task atual; os logs emitidos nela são repassados a quem acompanha o job
+current_job: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_job", default=None)
+# Serviço em execução (definido em serve()); fora do modo serviço report_progress não faz nada
+_active: "JobDaemon | None" = None
+
+
+def report_progress(name: str, current: int, total: int):
+    """Publica o progresso de uma transferência do job da task atual.
+
+    Chamado dos callbacks de progresso das operações (upload/download).
+    """
+    job_id = current_job.get()
+    if _active is not None and job_id is not None:
+        _active.publish_progress(job_id, name, current, total)
+
+
+class JobStore:
+    """Jobs do serviço persistidos num JSON; os que estavam rodando voltam para a fila ao reiniciar."""
+
+    def __init__(self, path: str = JOBS_FILE):
+        self.path = path
+        self.jobs: dict[str, dict] = {}
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.jobs = {job["id"]: job for job in json.load(f)}
+            except Exception as e:
+                logger.error(f"Erro ao carregar fila do serviço {path}: {e}")
+        for job in self.jobs.values():
+            if job["status"] == RUNNING:
+                # As operações retomam pelo progresso salvo
+                job["status"] = QUEUED
+
+    def save(self):
+        finished = sorted((j for j in self.jobs.values() if j["status"] in FINISHED), key=lambda j: j["finished"])
+        for job in finished[:-KEEP_FINISHED]:
+            del self.jobs[job["id"]]
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(sorted(self.jobs.values(), key=lambda j: j["created"]), f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.error(f"Erro ao salvar fila do serviço {self.path}: {e}")
+
+    def add(self, fields: dict, priority: int) -> dict:
+        job = {
+            "id": uuid.uuid4().hex[:12], "job": fields, "priority": priority, "status": QUEUED,
+            "error": None, "created": time.time(), "started": None, "finished": None,
+        }
+        self.jobs[job["id"]] = job
+        self.save()
+        return job
+
+    def set_status(self, job_id: str, status: str, error: str | None = None):
+        job = self.jobs[job_id]
+        job["status"] = status
+        job["error"] = error
+        if status == RUNNING:
+            job["started"] = time.time()
+        elif status in FINISHED:
+            job["finished"] = time.time()
+        self.save()
+
+
+class _JobLogHandler(logging.Handler):
+    """Repassa os logs emitidos dentro de um job para os clientes que o acompanham."""
+
+    def __init__(self, daemon: "JobDaemon"):
+        super().__init__(logging.INFO)
+        self.daemon = daemon
+
+    def emit(self, record: logging.LogRecord):
+        job_id = current_job.get()
+        if job_id is not None:
+            self.daemon.publish(job_id, {"event": "log", "level": record.levelname, "message": record.getMessage()})
+
+
+class JobDaemon:
+    """Fila com prioridade (maior primeiro, depois ordem de chegada) atendida por `workers` tarefas.
+
+    `run_job(job)` executa um job já validado; `parse_job(fields)` valida o
+    dicionário recebido (ex.: cli.job_from_dict) e levanta ValueError se inválido.
+    """
+
+    def __init__(self, run_job, parse_job, socket_path: str = DEFAULT_SOCKET,
+                 workers: int = DEFAULT_WORKERS, store: JobStore | None = None):
+        self.run_job = run_job
+        self.parse_job = parse_job
+        self.socket_path = socket_path
+        self.workers = max(1, workers)
+        self.store = store or JobStore()
+        self._queue: list[tuple[int, int, str]] = []
+        self._order = itertools.count()
+        self._ready = asyncio.Event()
+        self._running: dict[str, asyncio.Task] = {}
+        # Jobs em execução cancelados por um cliente (e não pelo encerramento do serviço)
+        self._user_cancelled: set[str] = set()
+        self._watchers: dict[str, set[asyncio.Queue]] = {}
+        # (job, transferência) -> instante do último evento de progresso publicado
+        self._progress_sent: dict[tuple[str, str], float] = {}
+        for job in sorted(self.store.jobs.values(), key=lambda j: j["created"]):
+            if job["status"] == QUEUED:
+                self._push(job)
+
+    def _push(self, job: dict):
+        heapq.heappush(self._queue, (-job["priority"], next(self._order), job["id"]))
+        self._ready.set()
+
+    def submit(self, fields: dict, priority: int = 0) -> str:
+        self.parse_job(fields)
+        job = self.store.add(fields, priority)
+        self._push(job)
+        logger.info(f"Job {job['id']} na fila (prioridade {priority}): {fields.get('action')}")
+        return job["id"]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.store.jobs.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return False
+        task = self._running.get(job_id)
+        if task is not None:
+            self._user_cancelled.add(job_id)
+            task.cancel()
+        else:
+            # Sai do heap quando for retirado pelo worker
+            self._finish(job_id, CANCELLED)
+        return True
+
+    def publish(self, job_id: str, event: dict):
+        for queue in self._watchers.get(job_id, ()):
+            queue.put_nowait({"id": job_id, **event})
+
+    def publish_progress(self, job_id: str, name: str, current: int, total: int):
+        key = (job_id, name)
+        now = time.monotonic()
+        done = total > 0 and current >= total
+        if not done and now - self._progress_sent.get(key, 0.0) < PROGRESS_INTERVAL:
+            return
+        self._progress_sent[key] = now
+        if done:
+            self._progress_sent.pop(key, None)
+        if self._watchers.get(job_id):
+            self.publish(job_id, {
+                "event": "progress", "name": name, "current": current, "total": total,
+                "percent": round(current * 100 / total, 1) if total else None,
+            })
+
+    def _finish(self, job_id: str, status: str, error: str | None = None):
+        for key in [k for k in self._progress_sent if k[0] == job_id]:
+            del self._progress_sent[key]
+        self.store.set_status(job_id, status, error)
+        self.publish(job_id, {"event": status, "error": error})
+
+    async def _worker(self):
+        while True:
+            while not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+            _, _, job_id = heapq.heappop(self._queue)
+            job = self.store.jobs.get(job_id)
+            if job is None or job["status"] != QUEUED:
+                continue
+            self.store.set_status(job_id, RUNNING)
+            self.publish(job_id, {"event": RUNNING})
+            current_job.set(job_id)
+            try:
+                task = asyncio.ensure_future(self.run_job(self.parse_job(job["job"])))
+                self._running[job_id] = task
+                await task
+                self._finish(job_id, DONE)
+            except asyncio.CancelledError:
+                if job_id not in self._user_cancelled:
+                    # O serviço está encerrando: o job fica como running e o JobStore
+                    # o devolve à fila no próximo início; o worker termina aqui
+                    raise
+                self._user_cancelled.discard(job_id)
+                self._finish(job_id, CANCELLED)
+            except Exception as e:
+                logger.error(f"Job {job_id} falhou: {e}", exc_info=True)
+                self._finish(job_id, FAILED, str(e))
+            finally:
+                self._running.pop(job_id, None)
+                current_job.set(None)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(payload: dict):
+            writer.write((json.dumps(payload, ensure_ascii=False) + "\n").encode())
+            await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    cmd = request.get("cmd")
+                    if cmd == "submit":
+                        job_id = self.submit(request.get("job") or {}, int(request.get("priority", 0)))
+                        await reply({"ok": True, "id": job_id})
+                    elif cmd == "status":
+                        job_id = request.get("id")
+                        if job_id and job_id not in self.store.jobs:
+                            await reply({"ok": False, "error": f"job desconhecido: {job_id}"})
+                        else:
+                            jobs = [self.store.jobs[job_id]] if job_id else list(self.store.jobs.values())
+                            await reply({"ok": True, "jobs": jobs})
+                    elif cmd == "cancel":
+                        await reply({"ok": self.cancel(request.get("id"))})
+                    elif cmd == "watch":
+                        await self._watch(request.get("id"), reply)
+                    else:
+                        await reply({"ok": False, "error": f"comando desconhecido: {cmd}"})
+                except (ValueError, TypeError) as e:
+                    await reply({"ok": False, "error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _watch(self, job_id: str, reply):
+        job = self.store.jobs.get(job_id)
+        if job is None:
+            await reply({"ok": False, "error": f"job desconhecido: {job_id}"})
+            return
+        queue: asyncio.Queue = asyncio.Queue()
+        self._watchers.setdefault(job_id, set()).add(queue)
+        try:
+            await reply({"id": job_id, "event": job["status"], "error": job["error"]})
+            status = job["status"]
+            while status not in FINISHED:
+                event = await queue.get()
+                await reply(event)
+                status = event["event"]
+        finally:
+            self._watchers[job_id].discard(queue)
+            if not self._watchers[job_id]:
+                del self._watchers[job_id]
+
+    async def _start_server(self) -> asyncio.AbstractServer:
+        if self.socket_path.startswith("tcp://"):
+            host, port = self.socket_path[len("tcp://"):].rsplit(":", 1)
+            return await asyncio.start_server(self._handle, host, int(port))
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # socket de uma execução anterior
+        return await asyncio.start_unix_server(self._handle, self.socket_path)
+
+    async def serve(self):
+        global _active
+        _active = self
+        handler = _JobLogHandler(self)
+        logger.addHandler(handler)
+        server = await self._start_server()
+        workers = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Serviço ouvindo em {self.socket_path} com {self.workers} worker(s)")
+        print(f"Serviço ouvindo em {self.socket_path} ({len(self._queue)} job(s) na fila). Ctrl+C encerra.")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            logger.removeHandler(handler)
+            _active = None
+            if not self.socket_path.startswith("tcp://") and os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+async def _connect(socket_path: str):
+    if socket_path.startswith("tcp://"):
+        host, port = socket_path[len("tcp://"):].rsplit(":", 1)
+        return await asyncio.open_connection(host, int(port))
+    return await asyncio.open_unix_connection(socket_path)
+
+
+async def request(socket_path: str, payload: dict, on_event=None) -> list[dict]:
+    """Envia uma requisição ao serviço e devolve as respostas; em watch, on_event recebe cada evento."""
+    reader, writer = await _connect(socket_path)
+    try:
+        writer.write((json.dumps(payload, ensure_ascii=False) + "\n").encode())
+        await writer.drain()
+        if payload.get("cmd") != "watch":
+            return [json.loads(await reader.readline())]
+        events = []
+        while line := await reader.readline():
+            event = json.loads(line)
+            events.append(event)
+            if on_event is not None:
+                on_event(event)
+            if event.get("ok") is False or event.get("event") in FINISHED:
+                break
+        return events
+    finally:
+        writer.close()
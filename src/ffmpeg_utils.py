@@ -1,9 +1,17 @@
 """Funções utilitárias assíncronas para operações com FFmpeg/FFprobe."""
 
 import os
+import json
+import bisect
+import shutil
+import tempfile
 import asyncio
+from dataclasses import dataclass, asdict
 from pathlib import Path
+from typing import AsyncIterator, Iterable
 from src.log import logger
+from src.cache import CACHE_DIR, JsonlCache, file_key
+from src.limits import SAFE_SIZE_LIMIT
 
 VIDEO_EXTENSIONS = [
     '.mp4', '.ts', '.mpg', '.mpeg', '.avi', '.mkv', '.flv', '.3gp',
@@ -16,83 +24,182 @@ VIDEO_EXTENSIONS = [
 TARGET_VIDEO_CODEC = "h264"
 TARGET_AUDIO_CODEC = "aac"
 TARGET_EXTENSION = ".mp4"
+# Threads do libx264 por job quando só o número de jobs é automático;
+# acima disso o ganho por thread cai e vale mais rodar outro ffmpeg em paralelo
+DEFAULT_ENCODE_THREADS = 4
+# Modo tamanho-alvo: bitrate calculado para o arquivo caber no limite de envio
+TARGET_SIZE_MODES = ("off", "vbr", "2pass")
+TARGET_SIZE_PRESET = "veryfast"   # com bitrate fixo, preset melhor rende mais qualidade por bit
+TARGET_AUDIO_KBPS = 128
+TARGET_SIZE_MARGIN = 0.03         # folga para overhead do container e desvio do VBR
+MIN_TARGET_VIDEO_KBPS = 400       # abaixo disso a qualidade não compensa; melhor dividir
+REENCODE_MAX_VIDEO_KBPS = 4000    # -maxrate do reencode normal (CRF 23)
 
 
-async def get_codec(file_path: str, stream_type: str) -> str:
-    """Obtém o codec de um stream (v=video, a=audio) usando ffprobe."""
+@dataclass(frozen=True)
+class ProbeResult:
+    """Resultado tipado de uma única chamada ffprobe (-show_format -show_streams)."""
+    ok: bool = False
+    duration: float = 0.0
+    video_codec: str = ""
+    audio_codec: str = ""
+    width: int = 0
+    height: int = 0
+    bit_rate: int = 0
+
+    @property
+    def corrupted(self) -> bool:
+        return not self.ok
+
+    @property
+    def has_duration(self) -> bool:
+        return self.duration > 0
+
+
+_probe_cache: JsonlCache | None = None
+_probes_in_flight: dict[str, asyncio.Future] = {}
+
+
+def _get_probe_cache() -> JsonlCache:
+    global _probe_cache
+    if _probe_cache is None:
+        _probe_cache = JsonlCache(os.path.join(CACHE_DIR, "probe.jsonl"))
+    return _probe_cache
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _parse_probe(stdout: bytes, stderr: bytes, returncode: int) -> ProbeResult:
+    try:
+        data = json.loads(stdout.decode('utf-8') or '{}')
+    except ValueError:
+        data = {}
+    fmt = data.get('format', {})
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    return ProbeResult(
+        ok=returncode == 0 and b'moov atom not found' not in stderr,
+        duration=_to_float(fmt.get('duration')),
+        video_codec=video.get('codec_name', ''),
+        audio_codec=audio.get('codec_name', ''),
+        width=_to_int(video.get('width')),
+        height=_to_int(video.get('height')),
+        bit_rate=_to_int(fmt.get('bit_rate')),
+    )
+
+
+async def _run_probe(file_path: str) -> ProbeResult:
     cmd = [
         'ffprobe', '-v', 'error',
-        '-select_streams', f'{stream_type}:0',
-        '-show_entries', 'stream=codec_name',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
+        '-show_format', '-show_streams',
+        '-of', 'json',
         file_path
     ]
     proc = await asyncio.create_subprocess_exec(
         *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
     )
-    stdout, _ = await proc.communicate()
-    return stdout.decode('utf-8').strip()
+    stdout, stderr = await proc.communicate()
+    return _parse_probe(stdout, stderr, proc.returncode)
+
+
+async def probe(file_path: str) -> ProbeResult:
+    """Sonda o arquivo uma única vez; o resultado fica em cache por (path, tamanho, mtime)."""
+    try:
+        key = file_key(file_path)
+    except OSError:
+        return ProbeResult()
+
+    cache = _get_probe_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return ProbeResult(**cached)
+
+    # Chamadas simultâneas para o mesmo arquivo compartilham o mesmo processo
+    pending = _probes_in_flight.get(key)
+    if pending is not None:
+        return await pending
+
+    future = asyncio.get_running_loop().create_future()
+    _probes_in_flight[key] = future
+    try:
+        result = await _run_probe(file_path)
+        cache.set(key, asdict(result))
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # evita aviso de exceção não consumida
+        raise
+    finally:
+        _probes_in_flight.pop(key, None)
+
+
+def default_probe_concurrency() -> int:
+    """Limite padrão de ffprobe simultâneos: um por núcleo (ffprobe é curto e I/O-bound)."""
+    return max(2, os.cpu_count() or 1)
+
+
+async def probe_many(
+    file_paths: Iterable[str], concurrency: int | None = None
+) -> AsyncIterator[tuple[str, ProbeResult]]:
+    """Sonda vários arquivos com concorrência limitada, entregando (path, resultado) à medida que terminam."""
+    semaphore = asyncio.Semaphore(concurrency or default_probe_concurrency())
+
+    async def _probe_one(path: str) -> tuple[str, ProbeResult]:
+        async with semaphore:
+            try:
+                return path, await probe(path)
+            except Exception as e:
+                logger.error(f"Erro ao sondar {path}: {e}")
+                return path, ProbeResult()
+
+    tasks = [asyncio.create_task(_probe_one(path)) for path in file_paths]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def get_codec(file_path: str, stream_type: str) -> str:
+    """Obtém o codec de um stream (v=video, a=audio) usando ffprobe."""
+    result = await probe(file_path)
+    return result.video_codec if stream_type == 'v' else result.audio_codec
 
 
 async def has_duration(file_path: str) -> bool:
     """Verifica se o arquivo de vídeo possui duração válida."""
-    cmd = [
-        'ffprobe', '-v', 'error',
-        '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
-        file_path
-    ]
-    proc = await asyncio.create_subprocess_exec(
-        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    stdout, _ = await proc.communicate()
-    return stdout.decode('utf-8').strip() != ''
+    return (await probe(file_path)).has_duration
 
 
 async def get_video_duration(file_path: str) -> float:
     """Obtém a duração do vídeo em segundos."""
-    cmd = [
-        'ffprobe', '-v', 'error',
-        '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
-        file_path
-    ]
-    proc = await asyncio.create_subprocess_exec(
-        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    stdout, _ = await proc.communicate()
-    try:
-        return float(stdout.decode('utf-8').strip())
-    except ValueError:
-        return 0.0
+    return (await probe(file_path)).duration
 
 
 async def get_video_dimensions(file_path: str) -> tuple[int, int]:
     """Retorna (largura, altura) do primeiro stream de vídeo; (0, 0) se não houver."""
-    cmd = [
-        'ffprobe', '-v', 'error',
-        '-select_streams', 'v:0',
-        '-show_entries', 'stream=width,height',
-        '-of', 'csv=p=0',
-        file_path,
-    ]
-    proc = await asyncio.create_subprocess_exec(
-        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    stdout, _ = await proc.communicate()
-    line = stdout.decode('utf-8').strip()
-    if not line or ',' not in line:
-        return 0, 0
-    w, _, h = line.partition(',')
-    try:
-        return int(w), int(h)
-    except ValueError:
-        return 0, 0
+    result = await probe(file_path)
+    return result.width, result.height
 
 
-async def extract_video_thumbnail_jpeg(video_path: str, output_jpeg: str) -> bool:
+async def extract_video_thumbnail_jpeg(video_path: str, output_jpeg: str, duration: float | None = None) -> bool:
     """Extrai um frame como JPEG (<=320px de lado) para usar como thumb no Telegram."""
-    dur = await get_video_duration(video_path)
+    dur = duration if duration is not None else await get_video_duration(video_path)
     if dur and dur > 0:
         ss = min(1.0, max(0.05, dur * 0.1))
     else:
@@ -121,12 +228,7 @@ async def extract_video_thumbnail_jpeg(video_path: str, output_jpeg: str) -> boo
 
 async def file_is_corrupted(file_path: str) -> bool:
     """Verifica se o arquivo de vídeo está corrompido."""
-    cmd = ['ffprobe', '-v', 'error', '-i', file_path]
-    proc = await asyncio.create_subprocess_exec(
-        *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
-    )
-    _, stderr = await proc.communicate()
-    return b'moov atom not found' in stderr or proc.returncode != 0
+    return (await probe(file_path)).corrupted
 
 
 def is_video_file(file_path: str) -> bool:
@@ -143,13 +245,191 @@ def needs_reencode(video_codec: str, audio_codec: str, file_path: str) -> bool:
     return not (is_target_codecs and is_target_ext)
 
 
+@dataclass(frozen=True)
+class FfmpegProgress:
+    """Um bloco de `-progress pipe:1` do ffmpeg, com ETA estimado pela duração total."""
+    out_time: float = 0.0   # segundos de mídia já escritos
+    fps: float = 0.0
+    speed: float = 0.0      # múltiplo do tempo real (2.0 = 2x)
+    bitrate: float = 0.0    # kbit/s
+    size: int = 0           # bytes escritos até agora
+    duration: float = 0.0   # duração total da entrada (0 = desconhecida)
+    done: bool = False
+
+    @property
+    def percent(self) -> float | None:
+        if self.duration <= 0:
+            return None
+        return min(100.0, 100.0 * self.out_time / self.duration)
+
+    @property
+    def eta(self) -> float | None:
+        """Segundos de relógio restantes, se duração e velocidade forem conhecidas."""
+        if self.duration <= 0 or self.speed <= 0:
+            return None
+        return max(0.0, self.duration - self.out_time) / self.speed
+
+    def describe(self) -> str:
+        parts = []
+        if self.percent is not None:
+            parts.append(f"{self.percent:.0f}%")
+        parts.append(f"{self.fps:.0f}fps {self.speed:.1f}x")
+        if self.eta is not None:
+            parts.append(f"ETA {_format_clock(self.eta)}")
+        return " ".join(parts)
+
+
+def _format_clock(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+def _parse_progress(fields: dict[str, str], duration: float) -> FfmpegProgress:
+    # out_time_us é o campo exato; out_time_ms tem o mesmo valor (em µs) em builds antigos
+    out_us = fields.get('out_time_us', fields.get('out_time_ms', ''))
+    bitrate = fields.get('bitrate', '').removesuffix('kbits/s')
+    return FfmpegProgress(
+        out_time=max(0.0, _to_float(out_us) / 1_000_000),
+        fps=_to_float(fields.get('fps')),
+        speed=_to_float(fields.get('speed', '').rstrip('x')),
+        bitrate=_to_float(bitrate),
+        size=_to_int(fields.get('total_size')),
+        duration=duration,
+        done=fields.get('progress') == 'end',
+    )
+
+
+async def run_ffmpeg(cmd: list[str], duration: float = 0.0, on_progress=None) -> tuple[int, str]:
+    """Executa o ffmpeg com `-progress pipe:1`, chamando on_progress(FfmpegProgress) a cada bloco.
+
+    Retorna (returncode, stderr). O stderr é lido em paralelo para o processo
+    nunca travar com o pipe cheio.
+    """
+    # As opções de progresso entram logo após o executável (que pode vir depois de `nice`)
+    at = next((i for i, arg in enumerate(cmd) if os.path.basename(arg) == 'ffmpeg'), 0) + 1
+    cmd = [*cmd[:at], '-nostats', '-progress', 'pipe:1', *(a for a in cmd[at:] if a != '-stats')]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stderr_task = asyncio.create_task(proc.stderr.read())
+    fields: dict[str, str] = {}
+    try:
+        async for raw in proc.stdout:
+            key, _, value = raw.decode('utf-8', errors='replace').strip().partition('=')
+            fields[key] = value.strip()
+            if key == 'progress':
+                if on_progress is not None:
+                    on_progress(_parse_progress(fields, duration))
+                fields = {}
+        await proc.wait()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    finally:
+        stderr = await stderr_task if not stderr_task.cancelled() else b''
+    return proc.returncode, stderr.decode(errors='replace')
+
+
+def available_cores() -> int:
+    """Núcleos que este processo pode usar (respeita affinity/cgroups via sched_getaffinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def encode_budget(jobs: int | None = None, threads: int | None = None) -> tuple[int, int]:
+    """(ffmpeg simultâneos, threads por ffmpeg) que cabem nos núcleos disponíveis.
+
+    O que vier None é derivado do outro; sem nenhum dos dois, usa
+    DEFAULT_ENCODE_THREADS por job e tantos jobs quanto couberem.
+    """
+    cores = available_cores()
+    if jobs and threads:
+        return jobs, threads
+    if jobs:
+        return jobs, max(1, cores // jobs)
+    threads = threads or min(DEFAULT_ENCODE_THREADS, cores)
+    return max(1, cores // threads), threads
+
+
+def with_nice(cmd: list[str], nice: int = 0) -> list[str]:
+    """Prefixa o comando com `nice -n` (POSIX) para não disputar CPU com o resto da máquina."""
+    if nice and shutil.which("nice"):
+        return ["nice", "-n", str(nice), *cmd]
+    return cmd
+
+
+def target_video_bitrate(
+    duration: float, size_limit: int,
+    audio_kbps: int = TARGET_AUDIO_KBPS, margin: float = TARGET_SIZE_MARGIN,
+) -> int:
+    """Bitrate de vídeo (kbit/s) para que duração x (vídeo + áudio) caiba em size_limit."""
+    if duration <= 0:
+        return 0
+    total_kbps = size_limit * 8 * (1 - margin) / duration / 1000
+    return max(0, int(total_kbps - audio_kbps))
+
+
+def estimate_output_size(
+    duration: float, source_size: int, source_kbps: int, video_codec: str,
+) -> int:
+    """Tamanho previsto (bytes) do reencode normal (sem tamanho-alvo): duração x (vídeo + áudio).
+
+    Vídeo copiado mantém o bitrate da origem; reencodado em CRF fica limitado
+    pelo -maxrate. source_kbps é o bitrate total da origem (0 = desconhecido).
+    """
+    if duration <= 0:
+        return source_size
+    if not source_kbps:
+        source_kbps = int(source_size * 8 / duration / 1000)
+    audio_kbps = TARGET_AUDIO_KBPS  # aac a 128k, ou a faixa copiada (aproximação)
+    source_video_kbps = max(0, source_kbps - audio_kbps)
+    if video_codec == TARGET_VIDEO_CODEC:
+        video_kbps = source_video_kbps
+    else:
+        video_kbps = min(REENCODE_MAX_VIDEO_KBPS, source_video_kbps) if source_video_kbps else REENCODE_MAX_VIDEO_KBPS
+    return int(duration * (video_kbps + audio_kbps) * 1000 / 8)
+
+
 def build_ffmpeg_cmd(
     file_path: str, output_path: str,
-    video_codec: str, audio_codec: str
+    video_codec: str, audio_codec: str,
+    threads: int = 2,
+    target_kbps: int | None = None,
+    pass_num: int | None = None,
+    passlog: str | None = None,
+    audio: bool = True,
 ) -> list[str]:
-    """Constrói o comando ffmpeg para conversão do vídeo."""
+    """Constrói o comando ffmpeg para conversão do vídeo.
+
+    Com target_kbps, o vídeo é sempre reencodado em VBR limitado a esse
+    bitrate médio; pass_num/passlog fazem do comando uma das passadas de um
+    encode em 2 passes (a 1ª só analisa e descarta a saída). audio=False
+    gera só o vídeo (trechos de um encode segmentado).
+    """
+    if target_kbps:
+        cmd = [
+            'ffmpeg', '-v', 'error', '-y', '-hide_banner',
+            '-i', file_path,
+            '-c:v', 'libx264', '-preset', TARGET_SIZE_PRESET, '-threads', str(threads),
+            '-b:v', f'{target_kbps}k',
+            '-maxrate', f'{target_kbps * 3 // 2}k', '-bufsize', f'{target_kbps * 2}k',
+        ]
+        if pass_num:
+            cmd.extend(['-pass', str(pass_num), '-passlogfile', passlog])
+        if pass_num == 1:
+            cmd.extend(['-an', '-f', 'mp4', os.devnull])
+            return cmd
+        cmd.extend(['-c:a', 'aac', '-b:a', f'{TARGET_AUDIO_KBPS}k'] if audio else ['-an'])
+        cmd.append(output_path)
+        return cmd
+
     cmd = [
-        'ffmpeg', '-v', 'quiet', '-stats', '-y',
+        'ffmpeg', '-v', 'error', '-y',
         '-i', file_path,
         '-b:a', '128k',
         '-hide_banner'
@@ -164,85 +444,168 @@ def build_ffmpeg_cmd(
     elif needs_video and not needs_audio:
         cmd.extend([
             '-c:v', 'libx264', '-preset', 'ultrafast',
-            '-threads', '2', '-c:a', 'copy',
-            '-crf', '23', '-maxrate', '4M',
+            '-threads', str(threads), '-c:a', 'copy',
+            '-crf', '23', '-maxrate', f'{REENCODE_MAX_VIDEO_KBPS}k',
         ])
     elif not needs_video and needs_audio:
         cmd.extend(['-c:v', 'copy', '-c:a', 'aac'])
     else:
         cmd.extend([
             '-c:v', 'libx264', '-c:a', 'aac',
-            '-preset', 'ultrafast', '-threads', '2',
-            '-crf', '23', '-maxrate', '4M',
+            '-preset', 'ultrafast', '-threads', str(threads),
+            '-crf', '23', '-maxrate', f'{REENCODE_MAX_VIDEO_KBPS}k',
         ])
 
+    if not audio:
+        cmd.append('-an')
     cmd.append(output_path)
     return cmd
 
 
-async def split_video(file_path: str, segment_time: str = "00:59:00", output_pattern: str = "part%03d.mp4") -> list[str]:
-    """Divide o vídeo em partes de tamanho específico ou tempo."""
-    # Como o usuário pediu split por tamanho de 2GB, podemos usar -fs (file size limit)
-    # Mas o ffmpeg split por tamanho é meio chato (não preciso do segment muxer se for só cortar).
-    # O user pediu "Divide vídeos muito grandes respeitando os limites de tamanho de 2GB".
-    # O melhor jeito é com segment muxer mas calcular o tempo é difícil sem reencode.
-    # Vamos tentar dividir por tempo estimado ou usar o fs do segment muxer (que não funciona sempre bem com copy).
-    # Vou implementar uma lógica simplificada que usa reencode se necessário ou copy se possível.
-    # Para ser seguro e simples: vamos dividir em pedaços de ~1.9GB se o arquivo for > 2GB.
-    
-    # Actually, simpler approach for now: just split in 2 parts if > 2GB? No, maybe multiple parts.
-    # Let's use `segment` muxer with reset timestamps.
-    
-    file_dir = os.path.dirname(file_path)
-    file_name = os.path.splitext(os.path.basename(file_path))[0]
-    output_template = os.path.join(file_dir, f"{file_name}_part%03d.mp4")
-
-    # Limit to ~1.9GB (approx 2000000000 bytes) to be safe for Telegram (2GB limit is strict, 2048MB)
-    # 2GB = 2 * 1024 * 1024 * 1024 = 2147483648 bytes. Telegram limit is actually 2000MB or 4000MB depending on premium.
-    # Let's assume 2GB = 2000MB for safety.
-    
-    # We can't easily split by size with `copy` codec without losing keyframes or precise cuts.
-    # But re-encoding everything just to split is slow.
-    # Strategy: IF video is > 2GB, we split using segment muxer with a time duration that results in < 2GB chunks roughly.
-    # Or just use -fs with segment muxer (requires re-encode usually to be precise, but maybe copy works ok-ish).
-    # User requirement is "Divide vídeos muito grandes respeitando os limites de tamanho de 2GB".
-    
-    # Let's try splitting by time (e.g. 30 min chunks) implicitly or better:
-    # Use `segment_time` default to something reasonable if not provided.
-    
+async def get_keyframe_index(file_path: str) -> tuple[list[tuple[float, int]], int]:
+    """Lê os pacotes do arquivo (sem decodificar) e retorna os keyframes de vídeo.
+
+    Retorna ([(pts_time, bytes_antes_do_keyframe), ...], total_de_bytes), onde os
+    bytes contam os pacotes de todos os streams na ordem em que estão no arquivo.
+    """
     cmd = [
-        'ffmpeg', '-i', file_path,
-        '-c', 'copy',
-        '-map', '0',
-        '-f', 'segment',
-        '-segment_time', '1800',  # 30 minutos default
-        '-reset_timestamps', '1',
-        output_template
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'packet=codec_type,pts_time,size,flags',
+        '-of', 'csv=p=0',
+        file_path
     ]
-
-    # Note: This doesn't guarantee size < 2GB if existing bitrate is huge. 
-    # But usually 30min of 1080p is < 2GB. 
-    # If the user has really high bitrate videos, this might fail the size check.
-    # A more robust way is scanning the duration and bitrate and calculating split times.
-    
-    # For now I will implement the function signature and a basic implementation.
-    # The calling code (MediaUpload) will handle the logic of "when to call this".
-    
     proc = await asyncio.create_subprocess_exec(
-        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
     )
-    _, stderr = await proc.communicate()
-    
+    keyframes: list[tuple[float, int]] = []
+    total = 0
+    # Long videos have millions of packets: parse line by line instead of buffering the output
+    async for raw in proc.stdout:
+        fields = raw.decode('utf-8', errors='replace').strip().split(',')
+        if len(fields) < 4:
+            continue
+        codec_type, pts_time, size, flags = fields[:4]
+        if codec_type == 'video' and 'K' in flags and pts_time != 'N/A':
+            keyframes.append((_to_float(pts_time), total))
+        total += _to_int(size)
+    await proc.wait()
     if proc.returncode != 0:
-        logger.error(f"Erro ao dividir vídeo {file_path}: {stderr.decode()}")
-        return []
-
-    # List generated files
-    generated_files = []
-    # This is tricky because we don't know exactly how many parts. 
-    # We can listdir and filter.
-    for f in os.listdir(file_dir):
-        if f.startswith(f"{file_name}_part") and f.endswith(".mp4"):
-            generated_files.append(os.path.join(file_dir, f))
-    
-    return sorted(generated_files)
+        return [], 0
+    return keyframes, total
+
+
+def plan_split_points(
+    keyframes: list[tuple[float, int]], total_bytes: int, size_limit: int, margin: float = 0.02
+) -> list[float]:
+    """Escolhe os cortes (em keyframes) para que cada parte fique logo abaixo do limite.
+
+    Guloso: cada parte vai até o último keyframe que ainda cabe no orçamento,
+    o que produz o menor número de partes possível com cortes em keyframes.
+    margin reserva espaço para o overhead do container.
+    """
+    budget = size_limit * (1 - margin)
+    cuts: list[float] = []
+    start_bytes = 0
+    candidate: tuple[float, int] | None = None
+    for time_s, offset in keyframes:
+        if offset - start_bytes <= budget:
+            candidate = (time_s, offset)
+            continue
+        # Sem keyframe que caiba (GOP maior que o orçamento): corta no próximo disponível
+        cut = candidate if candidate and candidate[1] > start_bytes else (time_s, offset)
+        cuts.append(cut[0])
+        start_bytes = cut[1]
+        candidate = (time_s, offset) if offset - start_bytes <= budget else None
+    if total_bytes - start_bytes > budget and candidate and candidate[1] > start_bytes:
+        cuts.append(candidate[0])
+    return cuts
+
+
+def plan_time_cuts(keyframe_times: list[float], duration: float, parts: int) -> list[float]:
+    """Cortes em keyframes que dividem a duração em até `parts` trechos de tamanho parecido."""
+    cuts: list[float] = []
+    for i in range(1, parts):
+        j = bisect.bisect_left(keyframe_times, duration * i / parts)
+        if j >= len(keyframe_times):
+            break
+        t = keyframe_times[j]
+        if t > (cuts[-1] if cuts else 0.0) and t < duration:
+            cuts.append(t)
+    return cuts
+
+
+async def split_video(file_path: str, size_limit: int = SAFE_SIZE_LIMIT, on_progress=None) -> list[str]:
+    """Divide o vídeo em keyframes para que cada parte fique abaixo de size_limit.
+
+    Os cortes vêm do índice de pacotes (tamanho real até cada keyframe). Se o
+    índice não estiver disponível, estima pelo bitrate médio. Se alguma parte
+    ainda passar do limite, refaz o plano com margem maior. As partes são
+    gravadas numa pasta temporária e só as desta execução são movidas para o
+    lado do original; arquivos que já existiam nunca são apagados. Retorna []
+    se falhar ou se após 3 tentativas alguma parte ainda passar do limite.
+    """
+    # Import local: manifest importa este módulo
+    from src.manifest import SEGMENT_DIR_PREFIX
+
+    file_dir = os.path.dirname(file_path)
+    file_name = os.path.splitext(os.path.basename(file_path))[0]
+
+    keyframes, total_bytes = await get_keyframe_index(file_path)
+    duration = (await probe(file_path)).duration
+    margin = 0.02
+    for attempt in range(3):
+        work_dir = tempfile.mkdtemp(prefix=SEGMENT_DIR_PREFIX, dir=file_dir or None)
+        try:
+            if keyframes:
+                cuts = plan_split_points(keyframes, total_bytes, size_limit, margin)
+                split_args = ['-segment_times', ','.join(f"{max(t - 0.001, 0):.3f}" for t in cuts)] if cuts else []
+            else:
+                # Sem índice: tempo por parte estimado pelo bitrate médio
+                size = os.path.getsize(file_path)
+                seconds = duration * size_limit * (1 - margin) / size if size and duration else 1800
+                split_args = ['-segment_time', f"{max(seconds, 1):.3f}"]
+
+            cmd = [
+                'ffmpeg', '-v', 'error', '-y', '-i', file_path,
+                '-c', 'copy',
+                '-map', '0',
+                '-f', 'segment',
+                *split_args,
+                '-reset_timestamps', '1',
+                os.path.join(work_dir, f"{file_name}_part%03d.mp4")
+            ]
+            returncode, stderr = await run_ffmpeg(cmd, duration, on_progress)
+
+            if returncode != 0:
+                logger.error(f"Erro ao dividir vídeo {file_path}: {stderr}")
+                return []
+
+            generated = sorted(os.listdir(work_dir))
+            oversized = [f for f in generated if os.path.getsize(os.path.join(work_dir, f)) > size_limit]
+            if not oversized:
+                parts = []
+                for f in generated:
+                    target = _free_path(os.path.join(file_dir, f))
+                    os.replace(os.path.join(work_dir, f), target)
+                    parts.append(target)
+                return parts
+            logger.warning(
+                f"{len(oversized)} parte(s) de {file_path} acima do limite (tentativa {attempt + 1}/3); "
+                "refazendo com margem maior."
+            )
+            margin = margin * 2 + 0.02
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    logger.error(f"{file_path}: partes ainda acima de {size_limit} bytes após 3 tentativas; divisão abandonada.")
+    return []
+
+
+def _free_path(path: str) -> str:
+    """path, ou "nome (n).ext" se já existe um arquivo com esse nome."""
+    stem, ext = os.path.splitext(path)
+    candidate, n = path, 1
+    while os.path.exists(candidate):
+        candidate = f"{stem} ({n}){ext}"
+        n += 1
+    return candidate
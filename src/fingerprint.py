@@ -0,0 +1,97 @@
+###############################################################################
+# Impressão digital de conteúdo para evitar reenviar bytes já enviados
+###############################################################################
+
+import os, mmap, hashlib, asyncio
+from src.cache import CACHE_DIR, JsonlCache, file_key
+
+SAMPLE_SIZE = 1024 * 1024      # bytes lidos em cada amostra (início, meio, fim)
+READ_BUFFER_SIZE = 4 * 1024 * 1024
+
+_fingerprint_cache: JsonlCache | None = None
+
+
+def _get_fingerprint_cache() -> JsonlCache:
+    global _fingerprint_cache
+    if _fingerprint_cache is None:
+        _fingerprint_cache = JsonlCache(os.path.join(CACHE_DIR, "fingerprints.jsonl"))
+    return _fingerprint_cache
+
+
+def _hash_full(path: str, h) -> None:
+    # readinto reutiliza o mesmo buffer: nenhuma cópia por bloco lido
+    buffer = bytearray(READ_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while n := f.readinto(buffer):
+            h.update(view[:n])
+
+
+def _hash_sampled(path: str, size: int, h) -> None:
+    # mmap expõe as amostras direto do page cache, sem ler o resto do arquivo
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            middle = (size - SAMPLE_SIZE) // 2
+            for start in (0, middle, size - SAMPLE_SIZE):
+                h.update(view[start:start + SAMPLE_SIZE])
+        finally:
+            view.release()
+
+
+def compute_fingerprint(path: str, mode: str = "full") -> str:
+    """Tamanho + blake2b do conteúdo inteiro (full) ou de 3 amostras (sample).
+
+    Arquivos pequenos (até 3 amostras) sempre usam o hash completo. sample não
+    distingue arquivos do mesmo tamanho que diferem fora das amostras; só é
+    seguro onde uma colisão não troca o conteúdo enviado (ex.: cache de thumbs).
+    """
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(size.to_bytes(8, "little"))
+    if mode == "full" or size <= 3 * SAMPLE_SIZE:
+        _hash_full(path, h)
+        kind = "f"
+    else:
+        _hash_sampled(path, size, h)
+        kind = "s"
+    return f"{kind}:{size}:{h.hexdigest()}"
+
+
+async def fingerprint(path: str, mode: str = "full") -> str:
+    """Impressão digital com cache por (path, tamanho, mtime), calculada fora do event loop."""
+    key = f"{mode}|{file_key(path)}"
+    cache = _get_fingerprint_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    value = await asyncio.to_thread(compute_fingerprint, path, mode)
+    cache.set(key, value)
+    return value
+
+
+class UploadIndex:
+    """Mapa persistente impressão digital -> file_id já enviado, por conta do Telegram."""
+
+    def __init__(self, filename: str = os.path.join(CACHE_DIR, "uploads.jsonl")):
+        self.cache = JsonlCache(filename)
+
+    @staticmethod
+    def _key(account_id: int, fp: str) -> str:
+        # file_id só pode ser reutilizado pela mesma conta que enviou
+        return f"{account_id}|{fp}"
+
+    def get(self, account_id: int, fp: str) -> dict | None:
+        return self.cache.get(self._key(account_id, fp))
+
+    def set(self, account_id: int, fp: str, file_id: str, media: str):
+        self.cache.set(self._key(account_id, fp), {"file_id": file_id, "media": media})
+
+
+def sent_media_file_id(message) -> tuple[str, str] | None:
+    """(file_id, tipo) da mídia de uma mensagem enviada."""
+    for media in ("video", "document", "photo", "audio", "animation"):
+        item = getattr(message, media, None)
+        if item is not None:
+            return item.file_id, media
+    return None
@@ -0,0 +1,145 @@
+###############################################################################
+# Modo não interativo: argumentos de linha de comando e arquivo de jobs
+###############################################################################
+
+import argparse, json, os
+from src.schemas import InputModel
+
+# Nome do subcomando -> action usada pelo menu/InputModel
+ACTIONS = {
+    "clone": "clone",
+    "download-chat": "download chat",
+    "download-media": "download media",
+    "upload": "upload",
+    "down-up": "down_up",
+}
+# Campos sem os quais a action não tem o que fazer (validados já no envio do job)
+REQUIRED_FIELDS = {
+    "clone": ("origin_id",),
+    "download chat": ("origin_id",),
+    "download media": ("origin_id",),
+    "upload": ("upload_path",),
+    "down_up": ("origin_id",),
+}
+ID_FIELDS = ("origin_id", "dest_id")  # ids numéricos do JSON/YAML viram texto, como no menu
+DEFAULT_MAX_CONCURRENT = 2
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="tgturbo",
+        description="Sem argumentos abre o menu interativo.",
+    )
+    parser.add_argument(
+        "--delete-corrupted", action="store_true",
+        help="Apaga vídeos corrompidos sem perguntar (sem a flag, eles são mantidos)",
+    )
+    sub = parser.add_subparsers(dest="command")
+
+    clone = sub.add_parser("clone", help="Clona um chat para outro")
+    clone.add_argument("origin_id")
+    clone.add_argument("--dest", dest="dest_id", default="", help="Chat de destino (vazio = criar)")
+    clone.add_argument("--add-suffix", default="")
+    clone.add_argument("--remove-suffix", default="")
+    clone.add_argument("--mirror", action="store_true", help="Depois do histórico, continua espelhando mensagens novas e editadas")
+
+    download_chat = sub.add_parser("download-chat", help="Baixa as mídias de um chat")
+    download_chat.add_argument("origin_id")
+
+    download_media = sub.add_parser("download-media", help="Baixa uma mídia pelo link")
+    download_media.add_argument("origin_id", metavar="link")
+
+    upload = sub.add_parser("upload", help="Envia uma pasta")
+    upload.add_argument("upload_path")
+    upload.add_argument("--dest", dest="dest_id", default="", help="Chat de destino (vazio = canal com o nome da pasta)")
+    upload.add_argument("--watch", action="store_true", help="Depois do envio, continua observando a pasta e envia os arquivos novos")
+
+    down_up = sub.add_parser("down-up", help="Baixa de um chat e envia para outro")
+    down_up.add_argument("origin_id")
+    down_up.add_argument("--dest", dest="dest_id", default="", help="Chat de destino (vazio = criar)")
+
+    jobs = sub.add_parser("jobs", help="Executa uma lista de jobs de um arquivo JSON/YAML")
+    jobs.add_argument("job_file")
+    jobs.add_argument(
+        "--max-concurrent", type=int, default=DEFAULT_MAX_CONCURRENT,
+        help=f"Jobs rodando ao mesmo tempo (padrão: {DEFAULT_MAX_CONCURRENT})",
+    )
+
+    daemon = sub.add_parser("daemon", help="Mantém a sessão conectada e recebe jobs por um socket local")
+    daemon.add_argument("--socket", default=None, help="Caminho do socket Unix ou tcp://host:porta ([daemon] socket)")
+    daemon.add_argument("--workers", type=int, default=None, help="Jobs rodando ao mesmo tempo ([daemon] workers)")
+
+    submit = sub.add_parser("submit", help="Envia os jobs de um arquivo JSON/YAML para o serviço")
+    submit.add_argument("job_file")
+    submit.add_argument("--priority", type=int, default=0, help="Maior roda primeiro (padrão: 0)")
+    submit.add_argument("--follow", action="store_true", help="Acompanha os jobs até terminarem")
+    submit.add_argument("--socket", default=None)
+
+    queue = sub.add_parser("queue", help="Lista os jobs do serviço")
+    queue.add_argument("--cancel", metavar="ID", default=None, help="Cancela um job")
+    queue.add_argument("--socket", default=None)
+    return parser
+
+
+def input_from_args(args: argparse.Namespace) -> InputModel:
+    """InputModel equivalente ao que o menu montaria para um subcomando."""
+    fields = {
+        name: getattr(args, name)
+        for name in ("origin_id", "dest_id", "upload_path", "add_suffix", "remove_suffix", "watch", "mirror")
+        if getattr(args, name, None) is not None
+    }
+    return InputModel(action=ACTIONS[args.command], confirm=True, **fields)
+
+
+def _normalize_action(action: str) -> str:
+    key = str(action).strip().lower().replace("_", "-").replace(" ", "-")
+    if key not in ACTIONS:
+        raise ValueError(f"Ação desconhecida: {action!r} (use {', '.join(ACTIONS)})")
+    return ACTIONS[key]
+
+
+def job_from_dict(item: dict) -> InputModel:
+    """InputModel de um job {action, origin_id, dest_id, upload_path, ...}; ValueError se inválido."""
+    if not isinstance(item, dict) or "action" not in item:
+        raise ValueError("job precisa de 'action'")
+    action = _normalize_action(item["action"])
+    # null = valor padrão; os demais campos passam como vieram (o InputModel valida os tipos)
+    fields = {
+        k: (str(v) if k in ID_FIELDS else v)
+        for k, v in item.items()
+        if k != "action" and v is not None
+    }
+    missing = [k for k in REQUIRED_FIELDS[action] if not str(fields.get(k, "")).strip()]
+    if missing:
+        raise ValueError(f"job '{action}' precisa de {', '.join(missing)}")
+    return InputModel(action=action, confirm=True, **fields)
+
+
+def read_job_file(path: str) -> list[dict]:
+    """Lista de jobs, ainda sem validar, de um arquivo JSON ou YAML."""
+    with open(path, "r", encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("Arquivos YAML exigem o pacote PyYAML (pip install pyyaml).")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    if isinstance(data, dict):
+        data = data.get("jobs", [])
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: esperado uma lista de jobs")
+    return data
+
+
+def load_job_file(path: str) -> list[InputModel]:
+    """Lê e valida uma lista de jobs ({action, origin_id, dest_id, upload_path, ...}) em JSON ou YAML."""
+    jobs = []
+    for i, item in enumerate(read_job_file(path), 1):
+        try:
+            jobs.append(job_from_dict(item))
+        except ValueError as e:
+            raise ValueError(f"{path}: job {i}: {e}")
+    return jobs
@@ -0,0 +1,11 @@
+"""Limites de envio do Telegram por tipo de conta."""
+
+# Telegram allows up to 2GB (2000MB) or 4GB (4000MB) for premium accounts.
+# We stay a little below the real limit to be safe for everyone.
+SAFE_SIZE_LIMIT = 2000 * 1024 * 1024
+PREMIUM_SAFE_SIZE_LIMIT = 4000 * 1024 * 1024
+
+
+def get_upload_size_limit(is_premium: bool) -> int:
+    """Tamanho máximo de arquivo a enviar para a sessão atual."""
+    return PREMIUM_SAFE_SIZE_LIMIT if is_premium else SAFE_SIZE_LIMIT
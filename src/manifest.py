@@ -0,0 +1,140 @@
+###############################################################################
+# Manifesto de arquivos: uma única varredura (os.scandir) compartilhada pelas etapas
+###############################################################################
+
+import os
+from natsort import natsorted
+from src.ffmpeg_utils import is_video_file
+
+# Arquivos de controle que nunca são enviados
+META_FILES = {".processed_files", "video_details.csv"}
+# Sobras temporárias (volume zip incompleto, thumb gerada para envio)
+TEMP_SUFFIXES = (".partial", ".tgthumb.jpg")
+# Pastas de trabalho temporárias (encode segmentado) que a varredura ignora
+SEGMENT_DIR_PREFIX = ".tgturbo-seg-"
+
+
+class ManifestEntry:
+    """Um arquivo do manifesto com os dados de stat e o que as etapas descobriram."""
+
+    __slots__ = ("path", "size", "mtime", "kind", "tag", "probe")
+
+    def __init__(self, path: str, size: int, mtime: float, kind: str):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.kind = kind  # video | zip | document | meta
+        self.tag = None   # hashtag sequencial (#F001)
+        self.probe = None # ProbeResult, preenchido sob demanda
+
+
+def classify(path: str) -> str:
+    name = os.path.basename(path)
+    if name.startswith(".") or name in META_FILES or name.endswith(TEMP_SUFFIXES):
+        return "meta"
+    if name.lower().endswith(".zip"):
+        return "zip"
+    if is_video_file(path):
+        return "video"
+    return "document"
+
+
+class FileManifest:
+    """Índice em memória de uma pasta, atualizado incrementalmente pelas etapas."""
+
+    def __init__(self, root: str):
+        self.root = os.path.normpath(root)
+        self.entries: dict[str, ManifestEntry] = {}
+        self.dirs: set[str] = set()
+        self._sorted: list[str] | None = None
+        self._children: dict[str, set[str]] | None = None
+
+    def scan(self) -> "FileManifest":
+        """Varre a pasta inteira uma única vez com os.scandir."""
+        self.entries.clear()
+        self.dirs.clear()
+        self._invalidate()
+        stack = [self.root]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for item in it:
+                        if item.is_dir(follow_symlinks=False):
+                            if item.name.startswith(SEGMENT_DIR_PREFIX):
+                                continue
+                            self.dirs.add(item.path)
+                            stack.append(item.path)
+                        elif item.is_file():
+                            st = item.stat()
+                            self.entries[item.path] = ManifestEntry(
+                                item.path, st.st_size, st.st_mtime, classify(item.path)
+                            )
+            except OSError:
+                continue
+        return self
+
+    def add(self, path: str) -> ManifestEntry | None:
+        """Inclui (ou atualiza) um arquivo criado/alterado por alguma etapa."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.remove(path)
+            return None
+        entry = self.entries.get(path)
+        if entry is None:
+            entry = ManifestEntry(path, st.st_size, st.st_mtime, classify(path))
+            self.entries[path] = entry
+            self._invalidate()
+        else:
+            entry.size = st.st_size
+            entry.mtime = st.st_mtime
+        return entry
+
+    def add_virtual(self, path: str, size: int, mtime: float = 0.0) -> ManifestEntry:
+        """Inclui um arquivo que só existe no envio (ex.: volume zip em stream)."""
+        entry = ManifestEntry(path, size, mtime, classify(path))
+        if path not in self.entries:
+            self._invalidate()
+        self.entries[path] = entry
+        return entry
+
+    def remove(self, path: str):
+        if self.entries.pop(path, None) is not None:
+            self._invalidate()
+
+    def _invalidate(self):
+        self._sorted = None
+        self._children = None
+
+    def get(self, path: str) -> ManifestEntry | None:
+        return self.entries.get(path)
+
+    def size(self, path: str) -> int:
+        entry = self.entries.get(path)
+        return entry.size if entry else os.path.getsize(path)
+
+    def relpath(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def files(self, *kinds: str) -> list[str]:
+        """Caminhos em ordem natural, opcionalmente filtrados por tipo."""
+        if self._sorted is None:
+            self._sorted = natsorted(self.entries)
+        if not kinds:
+            return list(self._sorted)
+        return [p for p in self._sorted if self.entries[p].kind in kinds]
+
+    def upload_files(self) -> list[str]:
+        """Tudo que deve ser enviado (exclui arquivos de controle)."""
+        return self.files("video", "zip", "document")
+
+    def listdir(self, path: str) -> list[str]:
+        """Nomes (diretórios e arquivos) diretamente dentro de path, como os.listdir."""
+        if self._children is None:
+            children: dict[str, set[str]] = {}
+            for p in self.dirs.union(self.entries):
+                parent, name = os.path.split(p)
+                children.setdefault(parent, set()).add(name)
+            self._children = children
+        return list(self._children.get(os.path.normpath(path), ()))
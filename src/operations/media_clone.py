@@ -1,6 +1,8 @@
-import os, time, asyncio
+import os, time, asyncio, copy
 from .base import BaseOperation
+from pyrogram import filters
 from pyrogram.client import Client
+from pyrogram.handlers import EditedMessageHandler, MessageHandler
 from pyrogram.types import ChatPrivileges
 from pyrogram.errors import (
     MessageIdInvalid,
@@ -8,21 +10,29 @@ from pyrogram.errors import (
     PeerIdInvalid,
     MessageNotModified,
     FileReferenceExpired,
+    FloodWait,
 )
 from halo import Halo
+from src.cache import CACHE_DIR, JsonlCache
 from src.progress_tracker import ProgressTracker
 from src.log import logger
+from src.daemon import report_progress
 from src.utils import create_path, get_chat_history
 from src.ffmpeg_utils import (
     needs_reencode,
     build_ffmpeg_cmd,
-    get_codec,
+    run_ffmpeg,
+    probe,
     extract_video_thumbnail_jpeg,
-    get_video_dimensions,
-    get_video_duration,
     is_video_file,
 )
 
+# Grupo de handlers próprio do espelhamento, para não interferir em outros handlers do cliente
+MIRROR_HANDLER_GROUP = 7
+DEFAULT_MIRROR_BATCH_DELAY = 1.5  # segundos juntando mensagens de uma rajada num único envio
+MIRROR_RETRY_DELAY = 30.0  # segundos até tentar de novo mensagens que falharam, sem esperar nova rajada
+MIRROR_MAX_ATTEMPTS = 5    # depois disso a mensagem fica como lacuna até o próximo início
+
 
 class MediaClone(BaseOperation):
     """Operação: Mover mensagens de um grupo para outro"""
@@ -36,6 +46,8 @@ class MediaClone(BaseOperation):
         progress_tracker: ProgressTracker,
         add_suffix: str,
         remove_suffix: str,
+        mirror: bool = False,
+        mirror_batch_delay: float = DEFAULT_MIRROR_BATCH_DELAY,
     ):
         super().__init__(client, progress_tracker)
         self.client = client
@@ -44,6 +56,11 @@ class MediaClone(BaseOperation):
         self.destination_chat_id = destination_chat_id
         self.add_suffix = add_suffix
         self.remove_suffix = remove_suffix
+        # Depois do histórico, segue espelhando mensagens novas/editadas da origem
+        self.mirror = mirror
+        self.mirror_batch_delay = mirror_batch_delay
+        # origem:destino:id -> id da cópia no destino, para repassar edições
+        self.copies = JsonlCache(os.path.join(CACHE_DIR, "mirror_copies.jsonl")) if mirror else None
         self.spinner = Halo(
             text="Preparando operação de mover mensagens...", spinner="dots"
         )
@@ -143,13 +160,13 @@ class MediaClone(BaseOperation):
             if v.supports_streaming is not None:
                 extras["supports_streaming"] = v.supports_streaming
         elif message and message.document and message.document.mime_type.startswith("video/"):
-            w, h = await get_video_dimensions(file_path)
-            dur = int(await get_video_duration(file_path))
+            result = await probe(file_path)
+            dur = int(result.duration)
             if dur > 0:
                 extras["duration"] = dur
-            if w > 0 and h > 0:
-                extras["width"] = w
-                extras["height"] = h
+            if result.width > 0 and result.height > 0:
+                extras["width"] = result.width
+                extras["height"] = result.height
         return extras
 
     async def _download_clone_media(
@@ -191,6 +208,127 @@ class MediaClone(BaseOperation):
             raise last_exc
         return None, None
 
+    def _apply_suffix(self, message):
+        """Aplica add_suffix/remove_suffix ao texto e à legenda da mensagem."""
+        ## Adicionar ou remover sufixo
+        if self.add_suffix:
+            logger.debug(f"Adicionando sufixo: {self.add_suffix}")
+            message.text = f"{message.text} {self.add_suffix}"
+            message.caption = f"{message.caption} {self.add_suffix}"
+            logger.debug(f"Texto final: {message.text}")
+            logger.debug(f"Caption final: {message.caption}")
+        if self.remove_suffix:
+            logger.debug(f"Removendo sufixo: {self.remove_suffix}")
+            message.text = message.text.replace(self.remove_suffix, "") if message.text else None
+            message.caption = message.caption.replace(self.remove_suffix, "") if message.caption else None
+            logger.debug(f"Texto final: {message.text}")
+            logger.debug(f"Caption final: {message.caption}")
+
+    async def _process_message(self, message, origin_chat_id: int, protected: bool, path_download: str) -> bool:
+        """Encaminha (ou copia, se protegido) uma mensagem; False se falhou e o progresso não deve avançar."""
+        try:
+            # Ignora mensagens de serviço
+            # if isinstance(message, MessageService):
+            #     continue
+
+            self._apply_suffix(message)
+            # Se o chat de destino tiver conteúdo protegido, não é possível encaminhar;
+            # portanto, copiamos o conteúdo manualmente.
+            if protected:
+                if message.media:
+                    # Baixa o arquivo da mídia
+                    def progress(current, total, args):
+                        total_mb = (total / 1024) / 1024
+                        current_mb = (current / 1024) / 1024
+                        self.spinner.text = (
+                            f"{args[0]} {current_mb:.2f}/{total_mb:.2f}MB"
+                        )
+                        report_progress(args[0].rstrip(' |'), current, total)
+                    media_for_file, file_path = await self._download_clone_media(
+                        origin_chat_id,
+                        message.id,
+                        path_download,
+                        progress,
+                        ([f"Baixando mensagem ID{message.id} |"],),
+                    )
+                    if file_path is None:
+                        logger.warning(
+                            f"Falha ao baixar mídia da mensagem {message.id}"
+                        )
+                        return False
+                            
+                    send_extras: dict = {}
+                    if self._is_clone_video_message(media_for_file):
+                        logger.info("Verificando se o vídeo precisa de reencode")
+                        result = await probe(file_path)
+                        video_codec = result.video_codec
+                        audio_codec = result.audio_codec
+                        logger.debug(f"Video codec: {video_codec}")
+                        logger.debug(f"Audio codec: {audio_codec}")
+                        if needs_reencode(
+                            video_codec, audio_codec, file_path
+                        ):
+                            self.spinner.text = "Reencodando vídeo..."
+                            cmd = build_ffmpeg_cmd(
+                                file_path=file_path,
+                                output_path=file_path,
+                                video_codec=video_codec,
+                                audio_codec=audio_codec,
+                            )
+                            def reencode_progress(p):
+                                self.spinner.text = f"Reencodando vídeo... {p.describe()}"
+
+                            returncode, stderr = await run_ffmpeg(
+                                cmd, result.duration, reencode_progress
+                            )
+                            if returncode != 0:
+                                logger.error(
+                                    f"Erro ao reencodar vídeo: {stderr}"
+                                )
+                                return False
+                            self.spinner.succeed("Vídeo reencodado com sucesso.")
+                        send_extras = await self._video_send_extras(
+                            media_for_file, file_path, path_download
+                        )
+                    sent = await super().send(
+                        chat_id=self.destination_chat_id,
+                        message=media_for_file,
+                        document=file_path,
+                        caption=message.caption or "",
+                        progress=progress,
+                        progress_args=(
+                            [f"Enviando mensagem ID{message.id} |"],
+                        ),
+                        **send_extras,
+                    )
+
+                else:
+                    # Se for apenas texto, envia a mensagem
+                    sent = await self.client.send_message(
+                        self.destination_chat_id,
+                        message.text or message.caption or "",
+                    )
+            else:
+                # Se o chat não tiver conteúdo protegido, encaminha a mensagem
+                sent = await self.client.forward_messages(
+                    chat_id=self.destination_chat_id,
+                    from_chat_id=origin_chat_id,
+                    message_ids=message.id,
+                    drop_author=True,
+                )
+                if self.add_suffix or self.remove_suffix:
+                    await self._edit_forwarded_caption(sent, message.text or message.caption or "")
+                        
+            self._remember_copy(origin_chat_id, message.id, sent)
+            logger.info(f"Mensagem {message.id} processada com sucesso.")
+            return True
+        except (MessageIdInvalid, MessageEmpty):
+            return True
+        except Exception as msg_err:
+            logger.error(f"Erro ao processar mensagem {message.id}: {msg_err}")
+            # Pode-se registrar o erro e continuar
+            raise
+
     async def run(self):
         self.spinner.start()
         try:
@@ -251,117 +389,13 @@ class MediaClone(BaseOperation):
             total_movidos = 0
             if messages is None or len(messages) == 0:
                 self.spinner.warn(f"Nenhuma mensagem encontrada em {origin_chat.id}")
-                return
+                messages = []
             total_messages = len(messages)
             self.spinner.text = f"Clonando mensagens 0/{total_messages}"
             for message in messages:
-                try:
-                    # Ignora mensagens de serviço
-                    # if isinstance(message, MessageService):
-                    #     continue
-
-                    ## Adicionar ou remover sufixo
-                    if self.add_suffix:
-                        logger.debug(f"Adicionando sufixo: {self.add_suffix}")
-                        message.text = f"{message.text} {self.add_suffix}"
-                        message.caption = f"{message.caption} {self.add_suffix}"
-                        logger.debug(f"Texto final: {message.text}")
-                        logger.debug(f"Caption final: {message.caption}")
-                    if self.remove_suffix:
-                        logger.debug(f"Removendo sufixo: {self.remove_suffix}")
-                        message.text = message.text.replace(self.remove_suffix, "") if message.text else None
-                        message.caption = message.caption.replace(self.remove_suffix, "") if message.caption else None
-                        logger.debug(f"Texto final: {message.text}")
-                        logger.debug(f"Caption final: {message.caption}")
-                    # Se o chat de destino tiver conteúdo protegido, não é possível encaminhar;
-                    # portanto, copiamos o conteúdo manualmente.
-                    if protected:
-                        if message.media:
-                            # Baixa o arquivo da mídia
-                            def progress(current, total, args):
-                                total_mb = (total / 1024) / 1024
-                                current_mb = (current / 1024) / 1024
-                                self.spinner.text = (
-                                    f"{args[0]} {current_mb:.2f}/{total_mb:.2f}MB"
-                                )
-                            media_for_file, file_path = await self._download_clone_media(
-                                origin_chat.id,
-                                message.id,
-                                path_download,
-                                progress,
-                                ([f"Baixando mensagem ID{message.id} |"],),
-                            )
-                            if file_path is None:
-                                logger.warning(
-                                    f"Falha ao baixar mídia da mensagem {message.id}"
-                                )
-                                continue
-                            
-                            send_extras: dict = {}
-                            if self._is_clone_video_message(media_for_file):
-                                logger.info("Verificando se o vídeo precisa de reencode")
-                                video_codec = await get_codec(file_path, "v")
-                                audio_codec = await get_codec(file_path, "a")
-                                logger.debug(f"Video codec: {video_codec}")
-                                logger.debug(f"Audio codec: {audio_codec}")
-                                if needs_reencode(
-                                    video_codec, audio_codec, file_path
-                                ):
-                                    self.spinner.text = "Reencodando vídeo..."
-                                    cmd = build_ffmpeg_cmd(
-                                        file_path=file_path,
-                                        output_path=file_path,
-                                        video_codec=video_codec,
-                                        audio_codec=audio_codec,
-                                    )
-                                    proc = await asyncio.create_subprocess_exec(*cmd)
-                                    await proc.communicate()
-                                    if proc.returncode != 0:
-                                        logger.error(
-                                            f"Erro ao reencodar vídeo: {proc.stderr.decode()}"
-                                        )
-                                        continue
-                                    self.spinner.succeed("Vídeo reencodado com sucesso.")
-                                send_extras = await self._video_send_extras(
-                                    media_for_file, file_path, path_download
-                                )
-                            await super().send(
-                                chat_id=self.destination_chat_id,
-                                message=media_for_file,
-                                document=file_path,
-                                caption=message.caption or "",
-                                progress=progress,
-                                progress_args=(
-                                    [f"Enviando mensagem ID{message.id} |"],
-                                ),
-                                **send_extras,
-                            )
-
-                        else:
-                            # Se for apenas texto, envia a mensagem
-                            await self.client.send_message(
-                                self.destination_chat_id,
-                                message.text or message.caption or "",
-                            )
-                    else:
-                        # Se o chat não tiver conteúdo protegido, encaminha a mensagem
-                        forwarded_message = await self.client.forward_messages(
-                            chat_id=self.destination_chat_id,
-                            from_chat_id=origin_chat.id,
-                            message_ids=message.id,
-                            drop_author=True,
-                        )
-                        if self.add_suffix or self.remove_suffix:
-                            await self._edit_forwarded_caption(forwarded_message, message.text or message.caption or "")
-                        
-                    logger.info(f"Mensagem {message.id} processada com sucesso.")
-                    time.sleep(2)
-                except (MessageIdInvalid, MessageEmpty):
-                    pass
-                except Exception as msg_err:
-                    logger.error(f"Erro ao processar mensagem {message.id}: {msg_err}")
-                    # Pode-se registrar o erro e continuar
-                    raise
+                if not await self._process_message(message, origin_chat.id, protected, path_download):
+                    continue
+                time.sleep(2)
 
                 # Atualiza o progresso (para retomar no caso de interrupção)
                 self.progress_tracker.update(
@@ -378,3 +412,224 @@ class MediaClone(BaseOperation):
             raise
         finally:
             self.spinner.succeed("Operação de mover mensagens concluída.")
+
+        if self.mirror:
+            await self._mirror(origin_chat.id, protected, path_download)
+
+    ###########################################################################
+    # Modo espelho: mensagens novas chegam por handlers de update, sem polling
+    ###########################################################################
+
+    def _copy_key(self, origin_chat_id: int, message_id: int) -> str:
+        return f"{origin_chat_id}:{self.destination_chat_id}:{message_id}"
+
+    def _remember_copy(self, origin_chat_id: int, message_id: int, sent):
+        if self.copies is None or sent is None:
+            return
+        sent = sent[0] if isinstance(sent, list) else sent
+        if getattr(sent, "id", None):
+            self.copies.set(self._copy_key(origin_chat_id, message_id), sent.id)
+
+    async def _mirror(self, origin_chat_id: int, protected: bool, path_download: str):
+        """Espelha a origem até o usuário interromper, juntando rajadas em um único envio."""
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def on_message(_, message):
+            queue.put_nowait((False, message))
+
+        async def on_edited(_, message):
+            queue.put_nowait((True, message))
+
+        chat_filter = filters.chat(origin_chat_id)
+        handlers = [MessageHandler(on_message, chat_filter), EditedMessageHandler(on_edited, chat_filter)]
+        for handler in handlers:
+            self.client.add_handler(handler, group=MIRROR_HANDLER_GROUP)
+        try:
+            # O que chegou entre a leitura do histórico e o registro dos handlers
+            # (e lacunas de falhas anteriores, que seguram o checkpoint)
+            last_msg_id = self.progress_tracker.get_last_message_id(
+                op="clone", chat_id=origin_chat_id, dest_chat_id=self.destination_chat_id
+            )
+            self._mirror_seen = last_msg_id
+            holes = self.progress_tracker.holes("clone", origin_chat_id, self.destination_chat_id)
+            if holes:
+                ranges = ", ".join(f"{start}-{end}" if start != end else f"{start}" for start, end in holes)
+                logger.info(f"Espelho: ids não espelhados na execução anterior, tentados de novo: {ranges}")
+            self._mirror_retry: dict[int, object] = {}
+            self._mirror_attempts: dict[int, int] = {}
+            for message in await get_chat_history(self.client, origin_chat_id, last_msg_id):
+                queue.put_nowait((False, message))
+
+            self.spinner.info(f"Espelhando {origin_chat_id} -> {self.destination_chat_id}. Ctrl+C encerra.").start()
+            loop = asyncio.get_running_loop()
+            while True:
+                try:
+                    batch = [await asyncio.wait_for(
+                        queue.get(), MIRROR_RETRY_DELAY if self._mirror_retry else None
+                    )]
+                except asyncio.TimeoutError:
+                    batch = []  # só as falhas pendentes
+                deadline = loop.time() + self.mirror_batch_delay
+                while (timeout := deadline - loop.time()) > 0:
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                while True:
+                    try:
+                        await self._mirror_batch(batch, origin_chat_id, protected, path_download)
+                        break
+                    except FloodWait as e:
+                        # Mensagens já espelhadas não se repetem: o lote é filtrado pelo progresso
+                        logger.warning(f"FloodWait de {e.value} segundos no espelho; aguardando.")
+                        await asyncio.sleep(e.value)
+                    except Exception as e:
+                        # Falhas por mensagem já vão para a fila de novas tentativas; o que
+                        # não foi marcado com mark_done segura o checkpoint para o próximo início
+                        logger.error(f"Erro ao espelhar lote: {e}", exc_info=True)
+                        break
+                self.spinner.text = f"Espelhando {origin_chat_id} -> {self.destination_chat_id}..."
+        finally:
+            for handler in handlers:
+                self.client.remove_handler(handler, group=MIRROR_HANDLER_GROUP)
+
+    async def _mirror_batch(self, batch: list, origin_chat_id: int, protected: bool, path_download: str):
+        """Espelha as mensagens novas do lote (e as que falharam antes), registrando cada uma ao concluir.
+
+        O progresso usa mark_done: uma mensagem que falha fica como lacuna e
+        segura get_last_message_id, então a recuperação do próximo início a
+        encontra mesmo que mensagens mais novas já tenham sido espelhadas.
+        """
+        dest = self.destination_chat_id
+        new = dict(self._mirror_retry)  # falhas anteriores voltam junto
+        for edited, message in batch:
+            if edited:
+                await self._mirror_edit(origin_chat_id, message)
+            elif not self.progress_tracker.is_done("clone", origin_chat_id, dest, message.id):
+                new[message.id] = message  # a recuperação inicial pode repetir um id
+        ordered = [new[i] for i in sorted(new)]
+        pending = [message for message in ordered if not message.service]
+        done_ids: set[int] = set()
+        flood = None
+        try:
+            if pending and not protected:
+                # Uma única chamada para a rajada (mantém álbuns juntos)
+                try:
+                    sent = await self.client.forward_messages(
+                        chat_id=dest,
+                        from_chat_id=origin_chat_id,
+                        message_ids=[message.id for message in pending],
+                        drop_author=True,
+                    )
+                    for message, forwarded in self._match_forwarded(pending, sent):
+                        done_ids.add(message.id)
+                        self._remember_copy(origin_chat_id, message.id, forwarded)
+                        if self.add_suffix or self.remove_suffix:
+                            message = copy.copy(message)
+                            self._apply_suffix(message)
+                            await self._edit_forwarded_caption(forwarded, message.text or message.caption or "")
+                except FloodWait:
+                    raise
+                except Exception as e:
+                    # Ex.: uma mensagem apagada (MESSAGE_ID_INVALID) derruba a chamada inteira
+                    logger.warning(f"Encaminhamento em lote falhou ({e}); encaminhando uma a uma.")
+
+            for message in pending:
+                if message.id in done_ids:
+                    continue
+                try:
+                    # Cópia: _process_message aplica o sufixo na própria mensagem
+                    if await self._process_message(copy.copy(message), origin_chat_id, protected, path_download):
+                        done_ids.add(message.id)
+                except FloodWait:
+                    raise
+                except Exception as e:
+                    logger.error(f"Erro ao espelhar mensagem {message.id}: {e}")
+        except FloodWait as e:
+            flood = e
+        finally:
+            self._record_mirrored(ordered, done_ids, origin_chat_id, count_failures=flood is None)
+        if flood is not None:
+            raise flood
+        if done_ids:
+            logger.info(f"Espelho: {len(done_ids)} mensagem(ns) espelhada(s) até {max(done_ids)}.")
+
+    @staticmethod
+    def _content_signature(message) -> tuple:
+        """Mídia (file_unique_id) + texto: iguais na origem e na cópia encaminhada."""
+        media = getattr(message, message.media.value, None) if message.media else None
+        return getattr(media, "file_unique_id", None), str(message.text or message.caption or "")
+
+    def _match_forwarded(self, pending: list, sent) -> list[tuple]:
+        """Pares (origem, cópia) de um forward_messages em lote.
+
+        Mensagens apagadas/indisponíveis ficam fora do resultado, então a lista
+        pode ser menor que `pending` e a posição não basta: cada cópia é
+        casada, em ordem, com a próxima origem de mesmo conteúdo. Origens sem
+        par não entram (seguem para o envio uma a uma).
+        """
+        sent = sent if isinstance(sent, list) else [sent] if sent else []
+        if len(sent) == len(pending):
+            return list(zip(pending, sent))
+        pairs, i = [], 0
+        for forwarded in sent:
+            signature = self._content_signature(forwarded)
+            j = i
+            while j < len(pending) and self._content_signature(pending[j]) != signature:
+                j += 1
+            if j == len(pending):
+                logger.warning(f"Espelho: cópia {forwarded.id} sem origem correspondente; não registrada.")
+                continue
+            pairs.append((pending[j], forwarded))
+            i = j + 1
+        return pairs
+
+    def _record_mirrored(self, ordered: list, done_ids: set[int], origin_chat_id: int, count_failures: bool):
+        """mark_done das concluídas; as demais vão para a fila de novas tentativas."""
+        seen = self._mirror_seen
+        previous = seen
+        for message in ordered:
+            if message.service or message.id in done_ids:
+                # Ids entre a anterior e esta não chegaram ao espelho (inexistentes/apagados)
+                after_id = max(previous, seen) if message.id > seen else None
+                self.progress_tracker.mark_done("clone", origin_chat_id, self.destination_chat_id, message.id, after_id)
+                self._mirror_retry.pop(message.id, None)
+                self._mirror_attempts.pop(message.id, None)
+            elif count_failures:
+                attempts = self._mirror_attempts.get(message.id, 0) + 1
+                if attempts >= MIRROR_MAX_ATTEMPTS:
+                    logger.error(
+                        f"Mensagem {message.id} não espelhada após {attempts} tentativas; "
+                        "fica pendente até o próximo início."
+                    )
+                    self._mirror_retry.pop(message.id, None)
+                    self._mirror_attempts.pop(message.id, None)
+                else:
+                    self._mirror_attempts[message.id] = attempts
+                    self._mirror_retry[message.id] = message
+            else:
+                self._mirror_retry[message.id] = message
+            previous = message.id
+        if ordered:
+            self._mirror_seen = max(seen, ordered[-1].id)
+
+    async def _mirror_edit(self, origin_chat_id: int, message):
+        """Repassa a edição de texto/legenda para a cópia, se ela é conhecida."""
+        copy_id = self.copies.get(self._copy_key(origin_chat_id, message.id))
+        if copy_id is None:
+            logger.debug(f"Edição da mensagem {message.id} ignorada: cópia desconhecida.")
+            return
+        self._apply_suffix(message)
+        try:
+            if message.media:
+                await self.client.edit_message_caption(
+                    chat_id=self.destination_chat_id, message_id=copy_id, caption=message.caption or "",
+                )
+            elif message.text:
+                await self.client.edit_message_text(
+                    chat_id=self.destination_chat_id, message_id=copy_id, text=message.text,
+                )
+        except MessageNotModified:
+            pass
+        except Exception as e:
+            logger.warning(f"Não foi possível repassar a edição da mensagem {message.id}: {e}")
@@ -4,6 +4,7 @@ from pyrogram.errors import FileReferenceExpired
 from halo import Halo
 from src.progress_tracker import ProgressTracker
 from src.log import logger
+from src.daemon import report_progress
 from src.utils import create_path, get_chat_history
 import asyncio
 
@@ -27,6 +28,7 @@ class MediaDownloadSingle(BaseOperation):
                 self.spinner.text = (
                     f"{args[0]} {current_mb:.2f}/{total_mb:.2f}MB"
                 )
+                report_progress(args[0].rstrip(' |'), current, total)
 
             chat_id, message_id = self.origin_link.split('/')[-2:]
             chat_id = f"-100{chat_id}"
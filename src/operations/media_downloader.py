@@ -1,18 +1,22 @@
+import asyncio
 from .base import BaseOperation
 from pyrogram.client import Client
 from pyrogram.errors import FileReferenceExpired
 from halo import Halo
 from src.progress_tracker import ProgressTracker
 from src.log import logger
+from src.daemon import report_progress
 from src.utils import create_path, get_chat_history
 
 
 class MediaDownloader(BaseOperation):
     """Operação: Baixar mídias de um grupo"""
 
-    def __init__(self, client: Client, origin_chat_id: int, progress_tracker: ProgressTracker):
+    def __init__(self, client: Client, origin_chat_id: int, progress_tracker: ProgressTracker, pool=None):
         super().__init__(client, progress_tracker)
         self.origin_chat_id = origin_chat_id
+        # ClientPool opcional: cada download vai para a sessão com mais folga
+        self.pool = pool
         self.is_media_downloaded = [
             "audio",
             "document",
@@ -29,6 +33,8 @@ class MediaDownloader(BaseOperation):
     async def run(self):
 
         chat = await self.client.get_chat(self.origin_chat_id)
+        if self.pool is not None:
+            await self.pool.check_access(self.origin_chat_id)
         path_download = create_path(f"./downloads/{chat.title}")
 
         # Recupera o último message_id processado (para retomar)
@@ -40,6 +46,11 @@ class MediaDownloader(BaseOperation):
             msg = f"Retomando download a partir do message_id: {last_msg_id}"
             self.spinner.info(msg).start()
             logger.info(msg)
+        # Downloads paralelos de uma execução anterior podem ter deixado lacunas
+        holes = self.progress_tracker.holes("download", self.origin_chat_id)
+        if holes:
+            ranges = ", ".join(f"{start}-{end}" if start != end else f"{start}" for start, end in holes)
+            logger.info(f"Ids pendentes da execução anterior (os concluídos depois deles são pulados): {ranges}")
 
         try:
             messages = await get_chat_history(
@@ -57,46 +68,33 @@ class MediaDownloader(BaseOperation):
                 return
 
             self.spinner.text = f"Baixando mensagens 0/{total_messages}"
-            for message in messages:
+            # Com um pool, até pool.capacity downloads simultâneos; cada mensagem é marcada
+            # como concluída ao terminar (fora de ordem) e a retomada parte da lacuna mais antiga
+            semaphore = asyncio.Semaphore(self.pool.capacity if self.pool is not None else 1)
+
+            async def process(message, after_id: int):
+                nonlocal total_download
+                if self.progress_tracker.is_done("download", self.origin_chat_id, None, message.id):
+                    return
                 if getattr(message.media, "value", None) in self.is_media_downloaded:
-                    try:
-                        def progress(current, total, args):
-                            total_mb = (total / 1024) / 1024
-                            current_mb = (current / 1024) / 1024
-                            self.spinner.text = (
-                                f"{args[0]} {current_mb:.2f}/{total_mb:.2f}MB"
-                            )
-                        media_name = await super().get_media_name(message)
-                        
-                        #Atualizar mensagem para obter o caminho do arquivo
-                        message = await self.client.get_messages(
-                            chat_id=self.origin_chat_id,
-                            message_ids=message.id,
-                        )
-                        file_path = await self.client.download_media(
-                            message=message,
-                            file_name=f'{path_download}/{message.id}-{media_name}',
-                            progress=progress,
-                            progress_args=([f"Baixando mensagem ID{message.id} |"],),
-                        )
-                        if file_path:
-                            logger.info(
-                                f"Mídia da mensagem {message.id} baixada em {file_path}"
-                            )
-                        else:
-                            logger.warning(
-                                f"Falha ao baixar mídia da mensagem {message.id}"
-                            )
-                    except Exception as media_err:
-                        logger.error(
-                            f"Erro ao baixar mídia da mensagem {message.id}: {media_err}"
-                        )
-                        raise media_err
+                    async with semaphore:
+                        await self._download_message(message, path_download)
                 # Atualiza o progresso
-                self.progress_tracker.update(
-                    "download", self.origin_chat_id, None, message.id
+                self.progress_tracker.mark_done(
+                    "download", self.origin_chat_id, None, message.id, after_id
                 )
                 total_download += 1
+                self.spinner.text = f"Baixando mensagens {total_download}/{total_messages}"
+
+            after_ids = [last_msg_id] + [message.id for message in messages[:-1]]
+            tasks = [asyncio.ensure_future(process(m, after_id)) for m, after_id in zip(messages, after_ids)]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
         except FileReferenceExpired as e:
             logger.error(f"Erro ao baixar mídia: {e}")
         except Exception as e:
@@ -104,3 +102,48 @@ class MediaDownloader(BaseOperation):
             raise e
         finally:
             self.spinner.succeed("Operação de download de mídias concluída.")
+
+    async def _download_message(self, message, path_download: str):
+        def progress(current, total, args):
+            total_mb = (total / 1024) / 1024
+            current_mb = (current / 1024) / 1024
+            self.spinner.text = (
+                f"{args[0]} {current_mb:.2f}/{total_mb:.2f}MB"
+            )
+            report_progress(args[0].rstrip(' |'), current, total)
+
+        try:
+            media_name = await super().get_media_name(message)
+
+            async def download(client: Client):
+                #Atualizar mensagem para obter o caminho do arquivo (na mesma sessão que baixa)
+                fresh = await client.get_messages(
+                    chat_id=self.origin_chat_id,
+                    message_ids=message.id,
+                )
+                return await client.download_media(
+                    message=fresh,
+                    file_name=f'{path_download}/{message.id}-{media_name}',
+                    progress=progress,
+                    progress_args=([f"Baixando mensagem ID{message.id} |"],),
+                )
+
+            if self.pool is None:
+                file_path = await download(self.client)
+            else:
+                file_path = await self.pool.run(
+                    lambda session: download(session.client), self.origin_chat_id
+                )
+            if file_path:
+                logger.info(
+                    f"Mídia da mensagem {message.id} baixada em {file_path}"
+                )
+            else:
+                logger.warning(
+                    f"Falha ao baixar mídia da mensagem {message.id}"
+                )
+        except Exception as media_err:
+            logger.error(
+                f"Erro ao baixar mídia da mensagem {message.id}: {media_err}"
+            )
+            raise media_err
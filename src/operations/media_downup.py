@@ -3,6 +3,7 @@ from pyrogram.client import Client
 from halo import Halo
 from src.progress_tracker import ProgressTracker
 from src.log import logger
+from src.daemon import report_progress
 from src.utils import create_path, get_chat_history
 
 
@@ -58,6 +59,7 @@ class MediaDownUp(BaseOperation):
                             self.spinner.text = (
                                 f"{args[0]} {current_mb:.2f}/{total_mb:.2f}MB"
                             )
+                            report_progress(args[0].rstrip(' |'), current, total)
                         media_name = await super().get_media_name(message)
                         #Atualizar mensagem para obter o caminho do arquivo
                         message = await self.client.get_messages(
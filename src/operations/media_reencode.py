@@ -1,16 +1,26 @@
 import os
+import time
+import shutil
 import asyncio
+import tempfile
+from dataclasses import replace
 from pathlib import Path
 from .base import BaseOperation
 from pyrogram.client import Client
 from halo import Halo
 from src.progress_tracker import ProgressTracker
+from src.manifest import FileManifest
 from src.log import logger
 from src.ffmpeg_utils import (
     TARGET_EXTENSION,
-    get_codec, has_duration, file_is_corrupted,
-    is_video_file, needs_reencode, build_ffmpeg_cmd,
+    probe, probe_many, is_video_file, needs_reencode, build_ffmpeg_cmd,
+    encode_budget, with_nice, run_ffmpeg, FfmpegProgress,
+    target_video_bitrate, estimate_output_size, MIN_TARGET_VIDEO_KBPS,
+    TARGET_AUDIO_CODEC, TARGET_AUDIO_KBPS, TARGET_VIDEO_CODEC,
+    get_keyframe_index, plan_time_cuts,
 )
+from src.manifest import SEGMENT_DIR_PREFIX
+from src.limits import SAFE_SIZE_LIMIT
 
 
 class MediaReencode(BaseOperation):
@@ -21,36 +31,79 @@ class MediaReencode(BaseOperation):
         client: Client,
         folder_path: str,
         progress_tracker: ProgressTracker,
+        manifest: FileManifest | None = None,
+        probe_concurrency: int | None = None,
+        on_converted=None,
+        jobs: int | None = None,
+        threads: int | None = None,
+        nice: int = 0,
+        target_size: str = "off",
+        size_limit: int = SAFE_SIZE_LIMIT,
+        min_video_kbps: int = MIN_TARGET_VIDEO_KBPS,
+        segment_min_duration: float = 0,
+        delete_corrupted: bool | None = None,
     ):
         super().__init__(client, progress_tracker)
         self.folder_path = folder_path
+        # Shared manifest (e.g. from MediaUpload) avoids walking the folder again
+        self.manifest = manifest
+        # Simultaneous ffprobe jobs while scanning; None = one per core
+        self.probe_concurrency = probe_concurrency
+        # Called with the output path after each successful conversion
+        self.on_converted = on_converted
+        # Concurrent ffmpeg jobs x threads per job, derived from the available cores when None
+        self.jobs, self.threads = encode_budget(jobs, threads)
+        # Optional niceness for the ffmpeg processes (0 = unchanged)
+        self.nice = nice
+        # Target-size mode (off | vbr | 2pass): videos above size_limit are encoded at the
+        # bitrate that makes them fit, unless that falls below min_video_kbps (then they get split)
+        self.target_size = target_size
+        self.size_limit = size_limit
+        self.min_video_kbps = min_video_kbps
+        # Videos at least this long (seconds) are cut at keyframes and encoded as `jobs`
+        # chunks in parallel, then joined with the concat demuxer (0 = off)
+        self.segment_min_duration = segment_min_duration
+        # Corrupted videos: True/False decide without asking (headless runs); None asks on stdin
+        self.delete_corrupted = delete_corrupted
+        # Every ffmpeg encode takes a slot, so whole files and chunks share the same core budget
+        self._slots = asyncio.Semaphore(self.jobs)
         self.spinner = Halo(
             text="Preparando operação de reencode de vídeos...", spinner="dots"
         )
 
+    def _video_paths(self) -> list[str]:
+        """Vídeos da pasta, vindos do manifesto quando disponível."""
+        if self.manifest is not None:
+            return self.manifest.files('video')
+        return [
+            str(path) for path in Path(self.folder_path).rglob('*')
+            if path.is_file() and is_video_file(str(path))
+        ]
+
     async def _delete_corrupted_videos(self) -> int:
         """Remove vídeos corrompidos ou sem duração válida da pasta."""
-        folder = Path(self.folder_path)
         removed = 0
-        list_invalid_videos = []            
-        for path in folder.rglob('*'):
-            if not path.is_file() or not is_video_file(str(path)):
-                continue
-
-            valid_duration = await has_duration(str(path))
-            corrupted = await file_is_corrupted(str(path))
-
-            if not valid_duration or corrupted:
-                list_invalid_videos.append(str(path))
+        invalid: set[str] = set()
+        paths = self._video_paths()
+        async for path, result in probe_many(paths, self.probe_concurrency):
+            if not result.has_duration or result.corrupted:
+                invalid.add(path)
+        list_invalid_videos = [path for path in paths if path in invalid]
 
         if list_invalid_videos:
-            answer = input("Existem vídeos corrompidos, deseja pagar? (s/n) ")
-            if answer.lower() == "s":
+            delete = self.delete_corrupted
+            if delete is None:
+                delete = input("Existem vídeos corrompidos, deseja pagar? (s/n) ").lower() == "s"
+            elif not delete:
+                logger.warning(f"{len(list_invalid_videos)} vídeo(s) corrompido(s) mantidos: {list_invalid_videos}")
+            if delete:
                 for video in list_invalid_videos:
                     os.remove(video)
+                    if self.manifest is not None:
+                        self.manifest.remove(video)
                     removed += 1
                     logger.warning(f"Removendo vídeo inválido: {video}")
-                    self.spinner.text = f"Removendo vídeo corrompido: {video.name}"
+                    self.spinner.text = f"Removendo vídeo corrompido: {os.path.basename(video)}"
         if removed > 0:
             self.spinner.info(
                 f"{removed} vídeo(s) corrompido(s) removido(s)"
@@ -60,54 +113,218 @@ class MediaReencode(BaseOperation):
 
     async def _scan_videos_to_convert(self) -> list[dict]:
         """Escaneia a pasta e retorna lista de vídeos que precisam de conversão."""
-        videos: list[dict] = []
+        paths = self._video_paths()
+        found: dict[str, dict] = {}
+        scanned = 0
+
+        async for file_path, result in probe_many(paths, self.probe_concurrency):
+            scanned += 1
+            self.spinner.text = f"Verificando vídeos para conversão {scanned}/{len(paths)}..."
+            target_kbps = self._target_kbps(file_path, result)
+            if target_kbps or needs_reencode(result.video_codec, result.audio_codec, file_path):
+                found[file_path] = {
+                    'path': file_path,
+                    'video_codec': result.video_codec,
+                    'audio_codec': result.audio_codec,
+                    'duration': result.duration,
+                    'target_kbps': target_kbps,
+                }
+
+        # Results arrive out of order; convert in folder order
+        return [found[path] for path in paths if path in found]
+
+    def _target_kbps(self, file_path: str, result) -> int | None:
+        """Bitrate de vídeo para caber no limite, ou None se o modo está desligado ou não compensa.
+
+        Decide pelo tamanho previsto da saída do reencode normal, não pelo da
+        origem: um arquivo grande que já cabe depois do CRF não vai para VBR/2
+        passes nem é dividido, e um pequeno que cresceria é limitado.
+        """
+        if self.target_size == "off":
+            return None
+        size = self.manifest.size(file_path) if self.manifest is not None else os.path.getsize(file_path)
+        if needs_reencode(result.video_codec, result.audio_codec, file_path):
+            size = estimate_output_size(result.duration, size, result.bit_rate // 1000, result.video_codec)
+        if size <= self.size_limit:
+            return None
+        kbps = target_video_bitrate(result.duration, self.size_limit)
+        if kbps < self.min_video_kbps:
+            logger.info(
+                f"{file_path} precisaria de {kbps} kbit/s para caber no limite "
+                f"(mínimo {self.min_video_kbps}); será dividido."
+            )
+            return None
+        return kbps
 
-        for subdir, _, files in os.walk(self.folder_path):
-            for file in files:
-                file_path = os.path.join(subdir, file)
-                if not is_video_file(file_path):
-                    continue
-                try:
-                    video_codec = await get_codec(file_path, 'v')
-                    audio_codec = await get_codec(file_path, 'a')
-
-                    if needs_reencode(video_codec, audio_codec, file_path):
-                        videos.append({
-                            'path': file_path,
-                            'video_codec': video_codec,
-                            'audio_codec': audio_codec,
-                        })
-                except Exception as e:
-                    logger.error(f"Erro ao verificar codec de {file_path}: {e}")
+    def _build_commands(self, file_info: dict, output_path: str, passlog: str | None) -> list[list[str]]:
+        args = dict(
+            file_path=file_info['path'], output_path=output_path,
+            video_codec=file_info['video_codec'], audio_codec=file_info['audio_codec'],
+            threads=self.threads, target_kbps=file_info.get('target_kbps'),
+        )
+        if passlog is None:
+            commands = [build_ffmpeg_cmd(**args)]
+        else:
+            commands = [build_ffmpeg_cmd(**args, pass_num=n, passlog=passlog) for n in (1, 2)]
+        return [with_nice(cmd, self.nice) for cmd in commands]
+
+    async def _run(self, cmd: list[str], duration: float, on_progress=None) -> tuple[int, str]:
+        async with self._slots:
+            return await run_ffmpeg(cmd, duration, on_progress)
+
+    def _should_segment(self, file_info: dict) -> bool:
+        # Only worth it when the video stream is actually encoded; 2-pass stays whole
+        return (
+            self.segment_min_duration > 0
+            and self.jobs > 1
+            and file_info.get('duration', 0.0) >= self.segment_min_duration
+            and (file_info['video_codec'] != TARGET_VIDEO_CODEC or bool(file_info.get('target_kbps')))
+            and not (file_info.get('target_kbps') and self.target_size == "2pass")
+        )
 
-        return videos
+    async def _encode_segmented(self, file_info: dict, output_path: str, on_progress=None) -> tuple[int, str] | None:
+        """Encoda o vídeo em trechos paralelos cortados em keyframes e junta com o concat demuxer.
 
-    async def _convert_file(self, file_info: dict) -> str | None:
-        """Converte um único arquivo de vídeo para H264/AAC MP4."""
+        O áudio é extraído uma única vez do arquivo inteiro (sem emendas) e
+        multiplexado no final. Retorna None quando não há onde cortar.
+        """
         file_path = file_info['path']
-        video_codec = file_info['video_codec']
-        audio_codec = file_info['audio_codec']
+        duration = file_info['duration']
+        keyframes, _ = await get_keyframe_index(file_path)
+        cuts = plan_time_cuts([t for t, _ in keyframes], duration, self.jobs)
+        if not cuts:
+            return None
 
-        file_name, _ = os.path.splitext(file_path)
-        output_path = f"{file_name}{TARGET_EXTENSION}"
+        work_dir = tempfile.mkdtemp(prefix=SEGMENT_DIR_PREFIX, dir=os.path.dirname(output_path) or None)
+        try:
+            # 1. Video stream cut at the keyframes, without decoding
+            returncode, stderr = await run_ffmpeg([
+                'ffmpeg', '-v', 'error', '-y', '-i', file_path,
+                '-map', '0:v:0', '-c', 'copy',
+                '-f', 'segment', '-segment_times', ','.join(f"{max(t - 0.001, 0):.3f}" for t in cuts),
+                '-reset_timestamps', '1',
+                os.path.join(work_dir, 'src%03d.mkv'),
+            ], duration)
+            if returncode != 0:
+                return returncode, stderr
+            chunks = sorted(f for f in os.listdir(work_dir) if f.startswith('src'))
+
+            # 2. Chunks encoded in parallel with identical settings; audio once, end to end
+            chunk_progress: dict[int, FfmpegProgress] = {}
+
+            def report(i: int, progress: FfmpegProgress):
+                chunk_progress[i] = progress
+                if on_progress is not None:
+                    parts = chunk_progress.values()
+                    on_progress(FfmpegProgress(
+                        out_time=sum(p.out_time for p in parts),
+                        fps=sum(p.fps for p in parts),
+                        speed=sum(p.speed for p in parts if not p.done),
+                        size=sum(p.size for p in parts),
+                        duration=duration,
+                    ))
+
+            jobs = [
+                self._run(
+                    with_nice(build_ffmpeg_cmd(
+                        os.path.join(work_dir, chunk), os.path.join(work_dir, f'enc{i:03d}.mkv'),
+                        file_info['video_codec'], TARGET_AUDIO_CODEC, threads=self.threads,
+                        target_kbps=file_info.get('target_kbps'), audio=False,
+                    ), self.nice),
+                    duration, lambda progress, i=i: report(i, progress),
+                )
+                for i, chunk in enumerate(chunks)
+            ]
+            audio_path = None
+            if file_info['audio_codec']:
+                audio_path = os.path.join(work_dir, 'audio.m4a')
+                codec = ['-c:a', 'copy'] if file_info['audio_codec'] == TARGET_AUDIO_CODEC else ['-c:a', 'aac', '-b:a', f'{TARGET_AUDIO_KBPS}k']
+                jobs.append(self._run(with_nice([
+                    'ffmpeg', '-v', 'error', '-y', '-i', file_path,
+                    '-map', '0:a:0', '-vn', *codec, audio_path,
+                ], self.nice), duration))
+            for returncode, stderr in await asyncio.gather(*jobs):
+                if returncode != 0:
+                    return returncode, stderr
+
+            # 3. Concat demuxer (stream copy) + the continuous audio track
+            concat_list = os.path.join(work_dir, 'concat.txt')
+            with open(concat_list, 'w', encoding='utf-8') as f:
+                for i in range(len(chunks)):
+                    f.write(f"file 'enc{i:03d}.mkv'\n")
+            cmd = ['ffmpeg', '-v', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list]
+            if audio_path:
+                cmd += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0']
+            cmd += ['-c', 'copy', '-movflags', '+faststart', output_path]
+            logger.info(f"{file_path} encodado em {len(chunks)} trechos paralelos.")
+            return await run_ffmpeg(cmd, duration)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def _encode(self, file_info: dict, output_path: str, on_progress=None) -> tuple[int, str]:
+        """Roda o(s) ffmpeg da conversão: segmentado, 2 passes ou passe único."""
+        if self._should_segment(file_info):
+            segmented = await self._encode_segmented(file_info, output_path, on_progress)
+            if segmented is not None:
+                return segmented
+
+        duration = file_info.get('duration', 0.0)
+        target_kbps = file_info.get('target_kbps')
+        passlog_dir = tempfile.mkdtemp(prefix="tgturbo-2pass-") if target_kbps and self.target_size == "2pass" else None
+        commands = self._build_commands(
+            file_info, output_path, os.path.join(passlog_dir, "x264") if passlog_dir else None
+        )
+        try:
+            for n, cmd in enumerate(commands):
+                def pass_progress(progress: FfmpegProgress, n=n):
+                    # Both passes shown as one timeline (0-50% / 50-100% for 2 passes)
+                    if on_progress is not None:
+                        on_progress(replace(
+                            progress,
+                            out_time=n * duration + progress.out_time,
+                            duration=len(commands) * duration,
+                        ))
+
+                returncode, stderr = await self._run(cmd, duration, pass_progress)
+                if returncode != 0:
+                    break
+        finally:
+            if passlog_dir:
+                shutil.rmtree(passlog_dir, ignore_errors=True)
+        return returncode, stderr
+
+    @staticmethod
+    def _free_output_path(stem: str) -> str:
+        """stem.mp4, ou "stem (n).mp4" se já existe um arquivo com esse nome."""
+        output_path = f"{stem}{TARGET_EXTENSION}"
+        n = 1
+        while os.path.exists(output_path):
+            output_path = f"{stem} ({n}){TARGET_EXTENSION}"
+            n += 1
+        if n > 1:
+            logger.warning(f"{stem}{TARGET_EXTENSION} já existe; vídeo convertido salvo como {output_path}")
+        return output_path
 
-        # Se o output é o mesmo que o input, usar arquivo temporário
-        temp_output = None
-        if output_path == file_path:
-            temp_output = f"{file_name}_reencode{TARGET_EXTENSION}"
-            output_path = temp_output
+    async def _convert_file(self, file_info: dict, on_progress=None) -> str | None:
+        """Converte um único arquivo de vídeo para H264/AAC MP4.
 
-        cmd = build_ffmpeg_cmd(file_path, output_path, video_codec, audio_codec)
+        on_progress recebe um FfmpegProgress a cada atualização do ffmpeg.
+        """
+        file_path = file_info['path']
 
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        _, stderr = await proc.communicate()
+        # Temporário oculto por origem: a.mkv e a.avi convertidos ao mesmo tempo
+        # não escrevem no mesmo a.mp4 (e o "." o mantém fora do manifest/watcher)
+        folder, base = os.path.split(file_path)
+        output_path = os.path.join(folder, f".{base}.reencode{TARGET_EXTENSION}")
+
+        target_kbps = file_info.get('target_kbps')
+        duration = file_info.get('duration', 0.0)
+        started = time.monotonic()
+        returncode, stderr = await self._encode(file_info, output_path, on_progress)
+        elapsed = time.monotonic() - started
 
-        if proc.returncode != 0:
-            logger.error(f"Erro ao converter {file_path}: {stderr.decode()}")
+        if returncode != 0:
+            logger.error(f"Erro ao converter {file_path}: {stderr}")
             if os.path.exists(output_path):
                 os.remove(output_path)
             return None
@@ -116,15 +333,84 @@ class MediaReencode(BaseOperation):
         if os.path.exists(file_path):
             os.remove(file_path)
 
-        # Se usou arquivo temporário, renomear para o path final
-        if temp_output and os.path.exists(temp_output):
-            final_path = f"{file_name}{TARGET_EXTENSION}"
-            os.rename(temp_output, final_path)
-            output_path = final_path
-
-        logger.info(f"Vídeo convertido: {output_path}")
+        # Nome final escolhido sem await no meio: outra conversão não pega o mesmo
+        final_path = self._free_output_path(os.path.splitext(file_path)[0])
+        os.replace(output_path, final_path)
+        output_path = final_path
+
+        if self.manifest is not None:
+            self.manifest.remove(file_path)
+            self.manifest.add(output_path)
+        if self.on_converted is not None:
+            self.on_converted(output_path)
+
+        if target_kbps and self.manifest is not None and self.manifest.size(output_path) > self.size_limit:
+            logger.warning(f"{output_path} ficou acima do limite mesmo a {target_kbps} kbit/s; será dividido.")
+        speed = f", {duration / elapsed:.2f}x tempo real" if duration and elapsed else ""
+        logger.info(f"Vídeo convertido: {output_path} ({elapsed:.0f}s{speed})")
         return output_path
 
+    async def _convert_all(self, videos: list[dict]) -> tuple[int, int]:
+        """Converte com até self.jobs ffmpeg simultâneos; a falha de um não interrompe os outros."""
+        total = len(videos)
+        semaphore = asyncio.Semaphore(self.jobs)
+        # Jobs in flight -> latest ffmpeg progress (None until the first block arrives)
+        running: dict[str, FfmpegProgress | None] = {}
+        done = 0
+        converted = 0
+
+        def report():
+            jobs = [
+                f"{name[:25]} {progress.describe()}" if progress else name[:25]
+                for name, progress in list(running.items())[:2]
+            ]
+            more = f" +{len(running) - 2}" if len(running) > 2 else ""
+            self.spinner.text = f"Convertendo {done}/{total} | " + " | ".join(jobs) + more
+
+        async def worker(video_info: dict) -> str | None:
+            async with semaphore:
+                file_name = os.path.basename(video_info['path'])
+                running[file_name] = None
+
+                def on_progress(progress: FfmpegProgress):
+                    running[file_name] = progress
+                    report()
+
+                report()
+                try:
+                    return await self._convert_file(video_info, on_progress)
+                except Exception as e:
+                    logger.error(f"Erro ao converter {video_info['path']}: {e}")
+                    return None
+                finally:
+                    running.pop(file_name, None)
+
+        for task in asyncio.as_completed([worker(video) for video in videos]):
+            if await task:
+                converted += 1
+            done += 1
+            report()
+        return converted, total - converted
+
+    async def prepare_file(self, file_path: str) -> str | None:
+        """Valida e converte um único vídeo; retorna o path final ou None se inválido."""
+        result = await probe(file_path)
+        if not result.has_duration or result.corrupted:
+            logger.warning(f"Ignorando vídeo inválido: {file_path}")
+            return None
+
+        target_kbps = self._target_kbps(file_path, result)
+        if not target_kbps and not needs_reencode(result.video_codec, result.audio_codec, file_path):
+            return file_path
+
+        return await self._convert_file({
+            'path': file_path,
+            'video_codec': result.video_codec,
+            'audio_codec': result.audio_codec,
+            'duration': result.duration,
+            'target_kbps': target_kbps,
+        })
+
     async def run(self):
         self.spinner.start()
 
@@ -150,24 +436,12 @@ class MediaReencode(BaseOperation):
                 return
 
             self.spinner.info(
-                f"{total} vídeo(s) precisam ser convertidos."
+                f"{total} vídeo(s) precisam ser convertidos "
+                f"({self.jobs} em paralelo, {self.threads} thread(s) cada)."
             ).start()
 
-            # 3. Converter cada vídeo
-            converted = 0
-            errors = 0
-
-            for video_info in videos_to_convert:
-                file_name = os.path.basename(video_info['path'])
-                self.spinner.text = (
-                    f"Convertendo {converted + 1}/{total}: {file_name}"
-                )
-
-                result = await self._convert_file(video_info)
-                if result:
-                    converted += 1
-                else:
-                    errors += 1
+            # 3. Converter os vídeos num pool de jobs ffmpeg
+            converted, errors = await self._convert_all(videos_to_convert)
 
             # 4. Relatório final
             msg = f"Reencode concluído: {converted}/{total} convertidos"
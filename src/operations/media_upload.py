@@ -1,89 +1,183 @@
 import os
-import zipfile
 import csv
 import asyncio
 import time
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 from pathlib import Path
 from halo import Halo
 from natsort import natsorted
 from pyrogram.client import Client
 from pyrogram.errors import FloodWait
+from pyrogram.types import InputMediaAudio, InputMediaDocument, InputMediaPhoto
 from tqdm import tqdm
 
 from .base import BaseOperation
 from .media_reencode import MediaReencode
 from src.progress_tracker import ProgressTracker
+from src.manifest import FileManifest
+from src.limits import SAFE_SIZE_LIMIT, get_upload_size_limit
+from src.upload_journal import (
+    LEGACY_LOG_NAME, REENCODED, SPLIT, UPLOADED, UPLOAD_JOURNAL_NAME, ZIPPED,
+    UploadJournal, read_legacy_log,
+)
+from src.thumbnails import DEFAULT_LOOKAHEAD, ThumbnailCache, ThumbnailPrefetcher
+from src.watcher import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, FolderWatcher
+from src.retry import DEFAULT_MAX_ATTEMPTS, RetryScheduler
+from src.staged_upload import SendTurns, send_uploaded, upload_document, upload_video
+from src.fingerprint import UploadIndex, fingerprint, sent_media_file_id
+from src.zip_utils import (
+    ZIP_MANIFEST_NAME,
+    ZipVolumeStream,
+    build_zip_volumes,
+    can_stream,
+    load_zip_manifest,
+    measure_zip_volumes,
+    plan_zip_volumes,
+    save_zip_manifest,
+    zip_stream_size,
+)
 from src.log import logger
+from src.daemon import report_progress
 from src.utils import create_path
 from src.ffmpeg_utils import (
+    TARGET_EXTENSION,
     is_video_file,
-    get_video_duration,
-    get_video_dimensions,
-    extract_video_thumbnail_jpeg,
+    probe,
+    probe_many,
     split_video,
 )
 
+if TYPE_CHECKING:
+    from src.client_pool import ClientPool, Session
+
 MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024 - 1024  # ~2GB safe limit (2048 MB - safety margin)
-# Telegram allows up to 2GB (2000MB or 4000MB for premium). 
-# We'll use 2000MB (approx 1.95GB) to be safe for everyone.
-SAFE_SIZE_LIMIT = 2000 * 1024 * 1024 
+
+# Albums (send_media_group) for photos and small documents of the same folder
+ALBUM_SIZE = 10  # Telegram limit per media group
+ALBUM_MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
+PHOTO_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+# Telegram rejects albums mixing audio with other documents: audio gets its own albums
+AUDIO_EXTENSIONS = {'.mp3', '.m4a', '.aac', '.ogg', '.oga', '.opus', '.flac', '.wav'}
+ALBUM_MEDIA_TYPES = {"photo": InputMediaPhoto, "audio": InputMediaAudio, "document": InputMediaDocument}
+PHOTO_MAX_SIZE = 10 * 1024 * 1024  # larger images are sent as documents
 
 class MediaUpload(BaseOperation):
     """Operação: Enviar mídias para um chat com fluxo complexo"""
 
-    def __init__(self, client: Client, upload_path: str, destination_chat_id: str | int, progress_tracker: ProgressTracker):
+    def __init__(
+        self,
+        client: Client,
+        upload_path: str,
+        destination_chat_id: str | int,
+        progress_tracker: ProgressTracker,
+        pipeline: bool = False,
+        probe_concurrency: int | None = None,
+        zip_workers: int | None = None,
+        stream_zip: bool = False,
+        fingerprint_mode: str = "full",
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        thumb_lookahead: int = DEFAULT_LOOKAHEAD,
+        reencode_options: dict | None = None,
+        pool: "ClientPool | None" = None,
+        watch: bool = False,
+        watch_debounce: float = DEFAULT_DEBOUNCE,
+        watch_poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ):
         super().__init__(client, progress_tracker)
-        self.upload_path = upload_path
+        self.upload_path = os.path.normpath(upload_path)
         self.destination_chat_id = destination_chat_id
-        # Also patch client if needed, or rely on self.destination_chat_id
-        self.client.destination_chat_id = destination_chat_id  # Monkey patch to satisfy existing references if any
+        # Pipeline mode: each file is uploaded as soon as it is ready instead of per-step barriers
+        self.pipeline = pipeline
+        # Simultaneous ffprobe jobs for folder scans; None = one per core
+        self.probe_concurrency = probe_concurrency
+        # Worker processes building zip volumes; None = one per core
+        self.zip_workers = zip_workers
+        # Inputs (path, size, mtime) of each zip volume, so resumes only rebuild what changed
+        self.zip_manifest_path = os.path.join(self.upload_path, ZIP_MANIFEST_NAME)
+        # Stream zip volumes straight into the upload instead of writing them to disk
+        self.stream_zip = stream_zip
+        self.zip_streams: dict[str, list[dict]] = {} # Map virtual zip path -> measured entries
+        # Per-file size limit; raised to the premium limit in run() when the session allows it
+        self.size_limit = SAFE_SIZE_LIMIT
+        # Content fingerprints (sample | full | off) -> file_id, to re-send duplicates without uploading
+        self.fingerprint_mode = fingerprint_mode
+        self.upload_index = UploadIndex() if fingerprint_mode != "off" else None
+        self.account_id = None
+        # Tentativas por lote antes de entrar na lista de falhas definitivas
+        self.max_attempts = max_attempts
+        # Thumbs + duration/dimensions prepared ahead of the upload cursor, cached by content
+        self.thumbnails = ThumbnailCache()
+        self.thumb_lookahead = thumb_lookahead
+        self.thumb_prefetcher: ThumbnailPrefetcher | None = None
+        # jobs / threads / nice / target_size / min_video_kbps / segment_min_duration for MediaReencode
+        self.reencode_options = reencode_options or {}
+        # Optional ClientPool: uploads go to the session with the most headroom
+        self.pool = pool
+        # Posting order of the current upload queue (bytes may upload in parallel)
+        self.send_turns = SendTurns()
+        # After the initial run, keep watching upload_path and send new files as they settle
+        self.watch = watch
+        self.watch_debounce = watch_debounce
+        self.watch_poll_interval = watch_poll_interval
         self.spinner = Halo(
             text="Preparando operação de envio de mídias...", spinner="dots"
         )
         self.spinner.start()
-        # Tracking file for resumability
-        self.processed_files_log = os.path.join(self.upload_path, ".processed_files")
-        self.processed_files = self._load_processed_files()
-        self.file_tags = {} # Map file path -> hashtag (e.g. #F001)
-
-    def _load_processed_files(self) -> set:
-        processed = set()
-        if os.path.exists(self.processed_files_log):
-            with open(self.processed_files_log, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line: continue
-                    if line.startswith("CHAT_ID:"):
-                        saved_id = line.replace("CHAT_ID:", "").strip()
-                        if saved_id:
-                            # Try to convert to int if it's a numeric ID
-                            try:
-                                self.destination_chat_id = int(saved_id)
-                            except ValueError:
-                                self.destination_chat_id = saved_id
-                    else:
-                        processed.add(line)
-        return processed
+        # Per-file state (zipped/reencoded/split/uploaded) keyed by relative path + size + mtime
+        self.journal = UploadJournal(os.path.join(self.upload_path, UPLOAD_JOURNAL_NAME))
+        # Pre-journal progress log, migrated after the first scan
+        self.legacy_log = os.path.join(self.upload_path, LEGACY_LOG_NAME)
+        self._load_saved_chat_id()
+        # Single scan of upload_path shared (and updated) by every step; entries carry the #Fnnn tag
+        self.manifest = FileManifest(self.upload_path)
+
+    def _load_saved_chat_id(self):
+        saved_id = self.journal.get_meta("chat_id")
+        if saved_id is None and os.path.exists(self.legacy_log):
+            saved_id, _ = read_legacy_log(self.legacy_log)
+        if saved_id:
+            # Try to convert to int if it's a numeric ID
+            try:
+                self.destination_chat_id = int(saved_id)
+            except ValueError:
+                self.destination_chat_id = saved_id
+
+    def _migrate_legacy_log(self):
+        """Importa o .processed_files antigo (por nome de arquivo) para o journal."""
+        if not os.path.exists(self.legacy_log):
+            return
+        try:
+            chat_id, names = read_legacy_log(self.legacy_log)
+            if chat_id and self.journal.get_meta("chat_id") is None:
+                self.journal.set_meta("chat_id", chat_id)
+            for file_path in self.manifest.upload_files():
+                if os.path.basename(file_path) in names:
+                    self._set_state(file_path, UPLOADED)
+            self.journal.commit()
+            os.replace(self.legacy_log, f"{self.legacy_log}.migrated")
+            logger.info(f"{len(names)} registro(s) de {self.legacy_log} importados para o journal de envio.")
+        except Exception as e:
+            logger.error(f"Erro ao migrar {self.legacy_log}: {e}")
 
     def _save_chat_id(self, chat_id: str | int):
-        """Salva o ID do chat no log de progresso se ainda não estiver lá."""
-        content = ""
-        if os.path.exists(self.processed_files_log):
-            with open(self.processed_files_log, "r", encoding="utf-8") as f:
-                content = f.read()
-        
-        if f"CHAT_ID:{chat_id}" not in content:
-            with open(self.processed_files_log, "a", encoding="utf-8") as f:
-                f.write(f"CHAT_ID:{chat_id}\n")
+        """Salva o ID do chat no journal de envio."""
+        self.journal.set_meta("chat_id", str(chat_id))
+        self.journal.commit()
+
+    def _set_state(self, file_path: str, state: str, message_id: int | None = None):
+        entry = self.manifest.get(file_path) or self.manifest.add(file_path)
+        if entry is None:
+            return
+        self.journal.set_state(self.manifest.relpath(file_path), entry.size, entry.mtime, state, message_id)
 
-    def _mark_as_processed(self, filename: str):
-        with open(self.processed_files_log, "a", encoding="utf-8") as f:
-            f.write(f"{filename}\n")
-        self.processed_files.add(filename)
+    def _mark_as_processed(self, file_path: str, sent=None):
+        self._set_state(file_path, UPLOADED, getattr(sent, "id", None))
 
-    def _is_processed(self, filename: str) -> bool:
-        return filename in self.processed_files
+    def _is_processed(self, file_path: str) -> bool:
+        entry = self.manifest.get(file_path)
+        if entry is None:
+            return False
+        return self.journal.state(self.manifest.relpath(file_path), entry.size, entry.mtime) == UPLOADED
 
     def _is_destination_empty(self) -> bool:
         """Verifica se destination_chat_id está vazio ou inválido."""
@@ -104,191 +198,254 @@ class MediaUpload(BaseOperation):
         return new_channel
 
     async def run(self):
+        watcher = None
         try:
             # Se destino vazio, tenta carregar do log ou cria novo
             if self._is_destination_empty():
                 if self.destination_chat_id:
-                    self.client.destination_chat_id = self.destination_chat_id
-                    print(self.destination_chat_id)
                     self.spinner.info(f"Retomando no chat salvo: {self.destination_chat_id}").start()
                 else:
                     new_channel = await self._create_channel_from_folder_name()
                     self.destination_chat_id = new_channel.id
-                    self.client.destination_chat_id = new_channel.id
             
             # Salva o chat_id no log para garantir resumibilidade
             if self.destination_chat_id:
                 self._save_chat_id(self.destination_chat_id)
 
-            # Step 1: Zip non-video files
-            await self._step2_zip_non_videos()
+            me = await self.client.get_me()
+            self.account_id = me.id
+            premium = getattr(me, "is_premium", False)
+            if self.pool is not None:
+                await self.pool.check_access(self.destination_chat_id)
+                # Any session may send any file, so the limit is the smallest among them
+                premium = all(getattr(s.me, "is_premium", False) for s in self.pool.sessions)
+            self.size_limit = get_upload_size_limit(premium)
 
-            # Step 3: Reencode videos (Step 2 seems skipped in user prompt numbering or it is Step 3)
-            # User said "Etapa 3 (p3) — Reencode de vídeos"
-            await self._step3_reencode_videos()
+            if self.watch:
+                # Snapshot before indexing: files dropped during the initial run are delivered later
+                watcher = FolderWatcher(self.upload_path, self.watch_debounce, self.watch_poll_interval)
+                watcher.start()
 
-            # Step 4: Split large videos
-            await self._step4_split_large_videos()
+            self.spinner.text = "Indexando arquivos..."
+            self.manifest.scan()
+            self._migrate_legacy_log()
 
-            # Step 5: Metadata generation e Header
-            summary_tree, header_info, footer_info, video_metadata = await self._step5_generate_metadata()
+            if self.pipeline:
+                await self._run_pipeline()
+            else:
+                # Step 1: Zip non-video files
+                await self._step2_zip_non_videos()
 
-            # Step 6: Upload content
-            await self._step6_upload_content(header_info, footer_info, video_metadata, summary_tree)
+                # Step 3: Reencode videos (Step 2 seems skipped in user prompt numbering or it is Step 3)
+                # User said "Etapa 3 (p3) — Reencode de vídeos"
+                await self._step3_reencode_videos()
+
+                # Step 4: Split large videos
+                await self._step4_split_large_videos()
+
+                # Step 5: Metadata generation e Header
+                summary_tree, header_info, footer_info, video_metadata = await self._step5_generate_metadata()
+
+                # Step 6: Upload content
+                await self._step6_upload_content(header_info, footer_info, video_metadata, summary_tree)
 
             self.spinner.succeed("Operação de envio concluída com sucesso!")
 
+            # Watch mode: from here on only new/changed files are processed
+            if watcher is not None:
+                await self._watch_folder(watcher)
+
         except Exception as e:
             self.spinner.fail(f"Erro na operação de envio: {e}")
             logger.error(f"Erro detalhado: {e}", exc_info=True)
             raise e
+        finally:
+            if watcher is not None:
+                watcher.stop()
+            self.journal.close()
+
+    def _collect_non_video_files(self) -> list[str]:
+        """Lista os arquivos não-vídeo que vão para os volumes ZIP."""
+        # Metadata, hidden files, videos and already zipped chunks are excluded by kind
+        return self.manifest.files("document")
+
+    def _plan_zip_volumes(self, files_to_zip: list[str]) -> list[dict]:
+        """Agrupa os arquivos em volumes Documentos_PartNNN.zip respeitando o limite da sessão.
+
+        Reaproveita a atribuição registrada em .zip_manifest.json: volumes cujos
+        arquivos (path, tamanho, mtime) não mudaram saem com dirty=False e não
+        precisam ser refeitos. Volumes que ficaram vazios são removidos.
+        """
+        current = {}
+        for file_path in files_to_zip:
+            entry = self.manifest.get(file_path)
+            current[self.manifest.relpath(file_path)] = (entry.size, entry.mtime)
+
+        previous = load_zip_manifest(self.zip_manifest_path)
+        existing = {
+            name for name in previous
+            if self.manifest.get(os.path.join(self.upload_path, name)) is not None
+        }
+        plan, stale = plan_zip_volumes(current, previous, self.size_limit, existing)
+
+        for name in stale:
+            stale_path = os.path.join(self.upload_path, name)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+            self.manifest.remove(stale_path)
+
+        return [
+            {
+                'path': os.path.join(self.upload_path, volume['name']),
+                'files': [os.path.join(self.upload_path, rel) for rel in volume['rels']],
+                'dirty': volume['dirty'],
+            }
+            for volume in plan
+        ]
+
+    def _save_zip_manifest(self, volumes: list[dict], built: set[str]):
+        """Registra os volumes prontos; os que falharam ficam de fora e serão refeitos."""
+        data = {}
+        for volume in volumes:
+            if volume['path'] not in built:
+                continue
+            data[os.path.basename(volume['path'])] = [
+                [self.manifest.relpath(p), self.manifest.get(p).size, self.manifest.get(p).mtime]
+                for p in volume['files']
+            ]
+        try:
+            save_zip_manifest(self.zip_manifest_path, data)
+        except Exception as e:
+            logger.error(f"Erro ao salvar manifesto de zip: {e}")
+
+    async def _build_or_measure_volumes(self, volumes: list[tuple[str, list[str]]]):
+        """Grava os volumes em disco ou, no modo stream, só mede as entradas para gerar o zip no envio."""
+        if not self.stream_zip:
+            async for zip_path, ok in build_zip_volumes(volumes, self.upload_path, self.zip_workers):
+                if ok:
+                    self.manifest.add(zip_path)
+                    self._set_state(zip_path, ZIPPED)
+                yield zip_path, ok
+            return
+
+        files_by_path = dict(volumes)
+        async for zip_path, entries in measure_zip_volumes(volumes, self.upload_path, self.zip_workers):
+            if entries is not None and can_stream(entries):
+                self.zip_streams[zip_path] = entries
+                # Newest input mtime stands in for the volume's, so content changes invalidate its journal row
+                mtime = max((self.manifest.get(p).mtime for p in files_by_path[zip_path]), default=0.0)
+                self.manifest.add_virtual(zip_path, zip_stream_size(entries), mtime)
+                self._set_state(zip_path, ZIPPED)
+                yield zip_path, True
+                continue
+            # Fallback to a regular file (ZIP64-sized volumes or measuring errors)
+            async for built_path, ok in build_zip_volumes(
+                [(zip_path, files_by_path[zip_path])], self.upload_path, 1
+            ):
+                if ok:
+                    self.manifest.add(built_path)
+                    self._set_state(built_path, ZIPPED)
+                yield built_path, ok
 
     async def _step2_zip_non_videos(self):
         self.spinner.text = "Etapa 1: Compactando arquivos não-vídeo..."
-        # Collect non-video files
-        files_to_zip = []
-        video_extensions = ['.mp4', '.mkv', '.avi', '.mov', '.ts', '.flv'] # Add more if needed or use ffmpeg_utils
-        
-        # Helper to check if video
-        def is_video(f):
-            return any(f.lower().endswith(ext) for ext in video_extensions)
-
-        # Walk safely
-        for root, dirs, files in os.walk(self.upload_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                # Ignore metadata files, hidden files, or already zipped chunks
-                if file.startswith(".") or file == "video_details.csv" or is_video(file) or file.endswith(".zip"):
-                    continue
-                
-                # Check if it's strictly inside the path and not in a 'media_reencode' temp folder if any
-                files_to_zip.append(file_path)
+        files_to_zip = self._collect_non_video_files()
+        # Planned even when empty so volumes left over from a previous run are cleaned up
+        volumes = self._plan_zip_volumes(files_to_zip)
 
         if not files_to_zip:
+            self._save_zip_manifest(volumes, set())
             self.spinner.succeed("2/6 - Nenhum arquivo não-vídeo para compactar.")
             return
 
-        # Create zip volumes
-        zip_base_name = os.path.join(self.upload_path, "Documentos.zip")
-        # We need to handle splitting if total size > safe limit, OR just standard zip split.
-        # Python zipfile doesn't support creating multi-volume zips easily natively.
-        # Alternativa: criar zip unificado e se ficar grande, dividir? 
-        # Ou criar zips separados por pasta?
-        # User said: "compactar todos os arquivos que NÃO são vídeo em partes ZIP, respeitando o limite de tamanho definido"
-        
-        # Strategy: Iterate files and add to current zip. If current zip size + next file > limit, close and start new zip.
-        
-        current_part = 1
-        current_zip_path = f"{zip_base_name}.{current_part:03d}" if current_part > 1 else zip_base_name # Actually user probably wants .zip, .z01 etc or Part1.zip
-        # Let's use simple naming: Extras_Part001.zip
-        
-        current_zip_path = os.path.join(self.upload_path, f"Documentos_Part{current_part:03d}.zip")
-        
-        # Check if zips already exist (resumability) - simply skip zipping if "Extras_Part*.zip" exists?
-        # Better: assume if we find zips, step 1 is done? 
-        # To be safe, we re-verify or just skip if any zip exists?
-        # Let's simple try to create.
-        
-        # If files are already zipped, we might be double zipping. 
-        # I will assume "Extras_Part*.zip" are the target.
-        
-        # To implement robust "chunking":
-        current_zip_size = 0
-        current_zip = zipfile.ZipFile(current_zip_path, 'w', zipfile.ZIP_DEFLATED)
-        
-        created_zips = [current_zip_path]
-        
-        for file_path in files_to_zip:
-            fsize = os.path.getsize(file_path)
-            if current_zip_size + fsize > SAFE_SIZE_LIMIT:
-                current_zip.close()
-                current_part += 1
-                current_zip_path = os.path.join(self.upload_path, f"Documentos_Part{current_part:03d}.zip")
-                current_zip = zipfile.ZipFile(current_zip_path, 'w', zipfile.ZIP_DEFLATED)
-                created_zips.append(current_zip_path)
-                current_zip_size = 0
-            
-            # Add file handling relative path to preserve structure inside zip
-            rel_path = os.path.relpath(file_path, self.upload_path)
-            current_zip.write(file_path, rel_path)
-            current_zip_size += fsize
-            
-            # Remove original file after zipping? "compactar (...) ignorando as extensões de vídeo" 
-            # Usually implies replacing files with zip or just creating zip.
-            # I will NOT delete original files unless explicitly asked to "Move" or "Clean". 
-            # User didn't say delete. But typically "compactar" implies grouping.
-            # I will keep them for now.
-        
-        current_zip.close()
-        # Remove empty zip if any
-        if os.path.exists(current_zip_path) and os.path.getsize(current_zip_path) <= 22: # Empty zip is 22 bytes
-            os.remove(current_zip_path)
-            if current_zip_path in created_zips:
-                created_zips.remove(current_zip_path)
-        self.spinner.succeed(f"2/6 - Arquivos não-vídeo compactados em {len(created_zips)} partes.")
+        # Originals are kept; the user didn't ask to move or clean them.
+        built = {v['path'] for v in volumes if not v['dirty']}
+        reused = len(built)
+        to_build = [(v['path'], v['files']) for v in volumes if v['dirty']]
+        async for zip_path, ok in self._build_or_measure_volumes(to_build):
+            if ok:
+                built.add(zip_path)
+            self.spinner.text = f"Etapa 1: Compactando arquivos não-vídeo ({len(built)}/{len(volumes)})..."
+        self._save_zip_manifest(volumes, built - set(self.zip_streams))
+        self.spinner.succeed(
+            f"2/6 - Arquivos não-vídeo compactados em {len(built)} partes ({reused} reaproveitadas)."
+        )
 
     async def _step3_reencode_videos(self):
         self.spinner.text = "Etapa 3: Verificando reencode de vídeos..."
         self.spinner.stop()
         # Create instance and run. 
         # Note: MediaReencode expects a folder_path.
-        reencoder = MediaReencode(self.client, self.upload_path, self.progress_tracker)
+        reencoder = MediaReencode(
+            self.client, self.upload_path, self.progress_tracker,
+            manifest=self.manifest, probe_concurrency=self.probe_concurrency,
+            on_converted=lambda path: self._set_state(path, REENCODED),
+            size_limit=self.size_limit,
+            **self.reencode_options,
+        )
         await reencoder.run() # This handles its own errors and spinner logic mostly
         self.spinner.start()
         self.spinner.succeed("3/6 - Vídeos reencodados com sucesso.")
 
+    async def _split_if_needed(self, video_path: str) -> list[str]:
+        """Divide o vídeo se passar do limite; retorna os arquivos resultantes."""
+        if self.manifest.size(video_path) <= self.size_limit:
+            return [video_path]
+
+        name = os.path.basename(video_path)
+        self.spinner.text = f"Dividindo vídeo grande: {name}"
+
+        def on_progress(progress):
+            self.spinner.text = f"Dividindo vídeo grande: {name} {progress.describe()}"
+
+        parts = await split_video(video_path, size_limit=self.size_limit, on_progress=on_progress)
+        if not parts:
+            logger.error(f"Falha ao dividir vídeo: {video_path}")
+            return [video_path]
+
+        logger.info(f"Vídeo {video_path} dividido em {len(parts)} partes.")
+        # Remove the original so it isn't uploaded alongside its parts.
+        try:
+            os.remove(video_path)
+            self.manifest.remove(video_path)
+        except Exception as e:
+            logger.error(f"Erro ao remover arquivo original {video_path}: {e}")
+        for part in parts:
+            self.manifest.add(part)
+            self._set_state(part, SPLIT)
+        return parts
+
     async def _step4_split_large_videos(self):
         self.spinner.text = "Etapa 4: Dividindo vídeos grandes..."
         
-        # Find all videos
-        videos = []
-        for root, dirs, files in os.walk(self.upload_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if is_video_file(file_path):
-                    videos.append(file_path)
-        
-        for video_path in videos:
-            if os.path.getsize(video_path) > SAFE_SIZE_LIMIT:
-                self.spinner.text = f"Dividindo vídeo grande: {os.path.basename(video_path)}"
-                # Split
-                parts = await split_video(video_path)
-                if parts:
-                    logger.info(f"Vídeo {video_path} dividido em {len(parts)} partes.")
-                    # Optionally delete original if split successful? 
-                    # Usually yes to avoid uploading original.
-                    try:
-                        os.remove(video_path)
-                    except Exception as e:
-                        logger.error(f"Erro ao remover arquivo original {video_path}: {e}")
-                else:
-                    logger.error(f"Falha ao dividir vídeo: {video_path}")
-        self.spinner.succeed("4/6 - Vídeos grandes divididos com sucesso.")
+        videos = self.manifest.files("video")
         if not videos:
             self.spinner.succeed("4/6 - Nenhum vídeo grande para dividir.")
             return
 
-    async def _step5_generate_metadata(self):
-        self.spinner.text = "Etapa 5: Gerando metadados e sumário..."
-        
-        total_size = 0
-        total_duration = 0.0
-        project_name = os.path.basename(self.upload_path.rstrip(os.sep))
+        for video_path in videos:
+            await self._split_if_needed(video_path)
+        self.spinner.succeed("4/6 - Vídeos grandes divididos com sucesso.")
+
+    async def _get_invite_link(self) -> str:
         invite_link = "https://t.me/placeholder" # Should be retrieved from chat if possible, or placeholder
         try:
-            chat = await self.client.get_chat(self.client.destination_chat_id) # Assuming destination_chat_id is set in base or somewhere
+            chat = await self.client.get_chat(self.destination_chat_id)
             invite_link = chat.invite_link or invite_link
         except:
             pass
+        return invite_link
+
+    def _load_csv_metadata(self) -> dict:
+        """Lê os video_details.csv da pasta: filename -> {duration, description, title, path}."""
+        video_metadata = {}
 
-        video_metadata = {} # Map filename -> {duration, description, title}
-        
         # Locate all video_details.csv
-        csv_files = []
-        for root, dirs, files in os.walk(self.upload_path):
-            if "video_details.csv" in files:
-                csv_files.append(os.path.join(root, "video_details.csv"))
-        
+        csv_files = [
+            path for path in self.manifest.files("meta")
+            if os.path.basename(path) == "video_details.csv"
+        ]
+
         # Parse CSVs
         for csv_file in csv_files:
             try:
@@ -296,49 +453,71 @@ class MediaUpload(BaseOperation):
                     reader = csv.DictReader(f)
                     for row in reader:
                         # Expecting 'filename', 'duration', 'title' or similar
-                        # Adjust based on flexible reading or column names
                         fname = row.get('filename') or row.get('File Name')
                         if fname:
-                            # Try to find full path
                             # Assuming csv is in same dir as files usually
                             csv_dir = os.path.dirname(csv_file)
                             full_path = os.path.join(csv_dir, fname)
-                            
-                            dur = row.get('duration', '0')
-                            # Parse duration if string "HH:MM:SS" or seconds
-                            # For now store as is or try conversion
                             video_metadata[fname] = {
-                                'duration': dur,
+                                'duration': row.get('duration', '0'),
                                 'description': row.get('description', fname), # Default desc = filename
                                 'title': row.get('title', fname),
                                 'path': full_path
                             }
             except Exception as e:
                 logger.error(f"Erro ao ler CSV {csv_file}: {e}")
+        return video_metadata
+
+    def _build_header(self, total_size: int, total_duration: float, invite_link: str) -> tuple[str, str]:
+        project_name = os.path.basename(self.upload_path.rstrip(os.sep))
+        size_gb = total_size / (1024 ** 3)
+        hours = int(total_duration // 3600)
+        minutes = int((total_duration % 3600) // 60)
+        seconds = int(total_duration % 60)
+        duration_str = f"{hours}h {minutes}m {seconds}s"
+
+        header_info = f"""{project_name}
+
+Tamanho: {size_gb:.2f} GB
+Duração: {duration_str}
+Convite: {invite_link}"""
 
-        files_to_process = []
-        all_found = []
-        for root, dirs, files in os.walk(self.upload_path):
-            for file in files:
-                if file.startswith(".") or file == ".processed_files" or file == "video_details.csv": continue
-                all_found.append(os.path.join(root, file))
+        footer_info = f"""Enviado usando [TgTurbo](https://github.com/paulovisam/tgturbo)"""
+        return header_info, footer_info
+
+    async def _step5_generate_metadata(self):
+        self.spinner.text = "Etapa 5: Gerando metadados e sumário..."
         
+        total_size = 0
+        total_duration = 0.0
+        invite_link = await self._get_invite_link()
+        video_metadata = self._load_csv_metadata()
+
         # Generate sequential hashtags with natsort
-        all_sorted = natsorted(all_found)
+        all_sorted = self.manifest.upload_files()
         for i, file_path in enumerate(all_sorted, 1):
-            self.file_tags[file_path] = f"#F{i:03d}"
+            self.manifest.get(file_path).tag = f"#F{i:03d}"
+        # Watch mode continues numbering from here
+        self.journal.set_meta("last_tag", str(len(all_sorted)))
+
+        # Probe every video up front with bounded concurrency
+        to_probe = [
+            p for p in all_sorted
+            if self.manifest.get(p).kind == "video" and self.manifest.get(p).probe is None
+        ]
+        async for file_path, result in probe_many(to_probe, self.probe_concurrency):
+            self.manifest.get(file_path).probe = result
         
         for file_path in all_sorted:
             file = os.path.basename(file_path)
-            
-            size = os.path.getsize(file_path)
-            total_size += size
-            
-            files_to_process.append(file_path)
+            entry = self.manifest.get(file_path)
+            total_size += entry.size
                 
-            if is_video_file(file_path):
+            if entry.kind == "video":
                 # Calculate duration if not in metadata or confirm
-                dur = await get_video_duration(file_path)
+                if entry.probe is None:
+                    entry.probe = await probe(file_path)
+                dur = entry.probe.duration
                 total_duration += dur
                 
                 # Update metadata if missing
@@ -350,23 +529,10 @@ class MediaUpload(BaseOperation):
                         'path': file_path
                     }
 
-        # Format totals
-        size_gb = total_size / (1024 ** 3)
-        hours = int(total_duration // 3600)
-        minutes = int((total_duration % 3600) // 60)
-        seconds = int(total_duration % 60)
-        duration_str = f"{hours}h {minutes}m {seconds}s"
-
-        header_info = f"""{project_name}
-
-Tamanho: {size_gb:.2f} GB
-Duração: {duration_str}
-Convite: {invite_link}"""
-
-        footer_info = f"""Enviado usando [TgTurbo](https://github.com/paulovisam/tgturbo)"""
+        header_info, footer_info = self._build_header(total_size, total_duration, invite_link)
 
         # Generate Summary Tree
-        summary_tree = self._generate_summary_tree(self.upload_path)
+        summary_tree = self._generate_summary_tree(self.manifest.root)
         
         self.spinner.succeed("5/6 - Metadados e sumário gerados com sucesso.")
         return summary_tree, header_info, footer_info, video_metadata
@@ -378,24 +544,20 @@ Convite: {invite_link}"""
         
         def add_to_tree(path, prefix=""):
             # Get contents
-            try:
-                contents = os.listdir(path)
-            except OSError:
-                return
-            
-            contents = natsorted(contents)
+            contents = natsorted(self.manifest.listdir(path))
             pointers = [("├── ", "│   ")] * (len(contents) - 1) + [("└── ", "    ")]
             
             for pointer, content in zip(pointers, contents):
                 if content.startswith(".") or content == ".processed_files": continue
                 
                 full_path = os.path.join(path, content)
-                is_dir = os.path.isdir(full_path)
+                is_dir = full_path in self.manifest.dirs
                 
                 connector, next_prefix = pointer
                 
                 icon = "📁" if is_dir else "📄"
-                tag = f" `{self.file_tags.get(full_path, '')}`" if not is_dir and full_path in self.file_tags else ""
+                entry = self.manifest.get(full_path)
+                tag = f" `{entry.tag}`" if entry and entry.tag else ""
                 line = f"{prefix}{connector}{icon}{tag} {content}"
                 if is_dir:
                     line += "/"
@@ -410,15 +572,18 @@ Convite: {invite_link}"""
         add_to_tree(start_path)
         return "\n".join(tree_lines)
 
-    async def _send_local_video_file(
+    async def _upload_local_video_file(
         self,
+        client: Client,
         file_path: str,
         file_name: str,
-        caption: str,
         video_metadata: dict,
         progress,
-    ) -> None:
-        """Envia vídeo como player nativo: thumb JPEG + duração/dimensões (evita preview preto)."""
+    ):
+        """Sobe o vídeo como player nativo: thumb JPEG + duração/dimensões (evita preview preto).
+
+        Só a etapa de bytes; a postagem é feita depois, na vez do arquivo.
+        """
         meta = video_metadata.get(file_name, {})
         dur_sec = 0
         raw_dur = meta.get("duration", 0)
@@ -427,116 +592,300 @@ Convite: {invite_link}"""
                 dur_sec = int(float(raw_dur))
             except (ValueError, TypeError):
                 dur_sec = 0
+        if self.thumb_prefetcher is not None:
+            self.thumb_prefetcher.advance(file_path)
+        # Usually already prepared by the prefetch stage; otherwise built (and cached) now
+        preview = await self.thumbnails.get(file_path)
         if dur_sec <= 0:
-            dur_sec = int(await get_video_duration(file_path))
+            dur_sec = int(preview.duration)
+
+        return await upload_video(
+            client,
+            file_path,
+            duration=dur_sec,
+            width=preview.width,
+            height=preview.height,
+            thumb=preview.thumb or None,
+            progress=progress,
+        )
+
+    def _build_caption(self, file_path: str, video_metadata: dict) -> str:
+        file_name = os.path.basename(file_path)
+        entry = self.manifest.get(file_path)
+        tag = entry.tag if entry and entry.tag else ""
+        prefix_tag = f"{tag} - " if tag else ""
+
+        if is_video_file(file_path) and file_name in video_metadata:
+            meta = video_metadata[file_name]
+            desc = meta.get('description', file_name)
+            if len(desc) > 999:
+                desc = desc[:996] + "..."
+            return f"{prefix_tag}{desc}"
+        if file_name.endswith(".zip"):
+            return f"📦 {prefix_tag}Arquivos Extras: {file_name}"
+        return f"{prefix_tag}{file_name}"
+
+    async def _upload_file(self, file_path: str, video_metadata: dict, turn: int):
+        """Envia um arquivo (vídeo nativo ou documento) e o marca como processado.
+
+        Os bytes sobem em paralelo com outros arquivos; a postagem espera a vez
+        `turn`, mantendo a ordem no chat. Erros são propagados para o
+        RetryScheduler decidir se tenta de novo.
+        """
+        file_name = os.path.basename(file_path)
+        file_size = self.manifest.size(file_path)
+        caption = self._build_caption(file_path, video_metadata)
+
+        # Progress bar for the current file
+        pbar_file = tqdm(total=file_size, unit="B", unit_scale=True, desc=f"Enviando {file_name[:20]}...", position=1, leave=False, dynamic_ncols=True)
+
+        def progress(current, total):
+            pbar_file.n = current
+            pbar_file.refresh()
+            report_progress(file_name, current, total)
+
+        async def send(client: Client, account_id: int | None):
+            hit = self.upload_index.get(account_id, fp) if fp else None
+            if hit:
+                # Same content already uploaded by this account: re-send by file_id, no bytes
+                await self.send_turns.wait(turn)
+                sent = await client.send_cached_media(
+                    chat_id=self.destination_chat_id,
+                    file_id=hit["file_id"],
+                    caption=caption,
+                )
+                logger.info(f"{file_name} reenviado por file_id (conteúdo duplicado).")
+                return sent
+
+            if is_video_file(file_path):
+                uploaded = await self._upload_local_video_file(
+                    client,
+                    file_path,
+                    file_name,
+                    video_metadata,
+                    progress,
+                )
+            elif file_path in self.zip_streams:
+                # close() stops the stream's deflate thread if the upload is interrupted
+                with ZipVolumeStream(file_name, self.zip_streams[file_path]) as stream:
+                    uploaded = await upload_document(client, stream, file_name, progress)
+            else:
+                uploaded = await upload_document(client, file_path, file_name, progress)
+            # Bytes are on the server; posting waits for every earlier file in the queue
+            await self.send_turns.wait(turn)
+            sent = await send_uploaded(client, self.destination_chat_id, uploaded, caption)
+            self._remember_upload(account_id, fp, sent)
+            return sent
 
-        w, h = await get_video_dimensions(file_path)
-        thumb_path = f"{file_path}.tgthumb.jpg"
-        has_thumb = await extract_video_thumbnail_jpeg(file_path, thumb_path)
         try:
-            kwargs = dict(
-                chat_id=self.destination_chat_id,
-                video=file_path,
-                caption=caption,
-                duration=dur_sec,
-                width=w or 0,
-                height=h or 0,
-                supports_streaming=True,
-                progress=progress,
-            )
-            if has_thumb:
-                kwargs["thumb"] = thumb_path
-            await self.client.send_video(**kwargs)
+            fp = await self._fingerprint(file_path)
+            sent = await self._send_with_session(send, fp)
+            self._mark_as_processed(file_path, sent)
+        finally:
+            pbar_file.close()
+
+    async def _send_with_session(self, send, *fps: str | None):
+        """Executa `await send(client, account_id)` no cliente principal ou na melhor sessão do pool.
+
+        file_ids só valem para a conta que os enviou: se alguma sessão livre já
+        tem o conteúdo, o envio fica nela para reaproveitar o file_id.
+        """
+        if self.pool is None:
+            return await send(self.client, self.account_id)
+        return await self.pool.run(
+            lambda session: send(session.client, session.account_id),
+            self.destination_chat_id,
+            session=self._session_with_upload(fps),
+        )
+
+    def _session_with_upload(self, fps) -> "Session | None":
+        if self.upload_index is None:
+            return None
+        for session in self.pool.sessions:
+            if session.flood_remaining() or self.destination_chat_id in session.denied_chats:
+                continue
+            if any(fp and self.upload_index.get(session.account_id, fp) for fp in fps):
+                return session
+        return None
+
+    async def _fingerprint(self, file_path: str) -> str | None:
+        """Impressão digital do arquivo, ou None se o dedupe está desligado ou não se aplica."""
+        if self.upload_index is None or file_path in self.zip_streams:
+            return None
+        try:
+            return await fingerprint(file_path, self.fingerprint_mode)
+        except OSError as e:
+            logger.warning(f"Não foi possível calcular a impressão digital de {file_path}: {e}")
+            return None
+
+    def _remember_upload(self, account_id: int | None, fp: str | None, sent):
+        if not fp or sent is None:
+            return
+        media = sent_media_file_id(sent)
+        if media:
+            self.upload_index.set(account_id, fp, *media)
+
+    def _album_key(self, file_path: str) -> tuple[str, str] | None:
+        """(tipo, pasta) de itens que podem ir juntos num álbum; None se vai sozinho."""
+        entry = self.manifest.get(file_path)
+        if entry is None or entry.kind != "document" or file_path in self.zip_streams:
+            return None
+        folder = os.path.dirname(file_path)
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in PHOTO_EXTENSIONS and entry.size <= PHOTO_MAX_SIZE:
+            return "photo", folder
+        if entry.size <= ALBUM_MAX_DOCUMENT_SIZE:
+            return ("audio" if ext in AUDIO_EXTENSIONS else "document"), folder
+        return None
+
+    def _group_batches(self, files: list[str]) -> list[list[str]]:
+        """Agrupa itens consecutivos compatíveis em lotes de até ALBUM_SIZE."""
+        batches: list[list[str]] = []
+        batch_key = None
+        for file_path in files:
+            key = self._album_key(file_path)
+            if key is not None and key == batch_key and len(batches[-1]) < ALBUM_SIZE:
+                batches[-1].append(file_path)
+                continue
+            batches.append([file_path])
+            batch_key = key
+        return batches
+
+    async def _upload_batch(self, batch: tuple[str, ...], video_metadata: dict):
+        """Envia um lote (arquivo ou álbum), postando na ordem em que os lotes começaram."""
+        # Taken before the first await, so turns follow the scheduler's dispatch order
+        turn = self.send_turns.take()
+        try:
+            # Items already sent one by one after a rejected album are not sent again
+            batch = tuple(file_path for file_path in batch if not self._is_processed(file_path))
+            if not batch:
+                return
+            if len(batch) == 1:
+                return await self._upload_file(batch[0], video_metadata, turn)
+            return await self._upload_album(batch, video_metadata, turn)
         finally:
-            if has_thumb and os.path.isfile(thumb_path):
+            await self.send_turns.release(turn)
+
+    async def _upload_album(self, batch: tuple[str, ...], video_metadata: dict, turn: int):
+        """Envia um lote como álbum; os itens são marcados como processados juntos.
+
+        Itens de álbum são pequenos (ver _album_key): sobem dentro da própria vez.
+        Se o Telegram recusar o álbum, os itens vão um a um, e só os que falharem
+        voltam para o RetryScheduler.
+        """
+
+        kind, _ = self._album_key(batch[0])
+        media_type = ALBUM_MEDIA_TYPES[kind]
+        fps = [await self._fingerprint(file_path) for file_path in batch]
+
+        async def send(client: Client, account_id: int | None):
+            media = []
+            for file_path, fp in zip(batch, fps):
+                hit = self.upload_index.get(account_id, fp) if fp else None
+                # Duplicates go into the album by file_id, without uploading their bytes
+                media.append(media_type(
+                    media=hit["file_id"] if hit and hit["media"] == kind else file_path,
+                    caption=self._build_caption(file_path, video_metadata),
+                ))
+            await self.send_turns.wait(turn)
+            sent = await client.send_media_group(chat_id=self.destination_chat_id, media=media)
+            messages = list(sent or [])
+            for fp, message in zip(fps, messages):
+                self._remember_upload(account_id, fp, message)
+            return messages
+
+        try:
+            messages = await self._send_with_session(send, *fps)
+        except FloodWait:
+            raise
+        except Exception as e:
+            logger.warning(f"Álbum de {len(batch)} itens recusado ({e}); enviando um a um.")
+            errors = []
+            for file_path in batch:
                 try:
-                    os.remove(thumb_path)
-                except OSError:
-                    pass
+                    await self._upload_file(file_path, video_metadata, turn)
+                except FloodWait:
+                    raise
+                except Exception as item_error:
+                    logger.error(f"Falha ao enviar {os.path.basename(file_path)}: {item_error}")
+                    errors.append(item_error)
+            if errors:
+                raise errors[0]
+            return
+        for i, file_path in enumerate(batch):
+            self._mark_as_processed(file_path, messages[i] if i < len(messages) else None)
+
+    def _retry_scheduler(self, video_metadata: dict, pbar_total: tqdm) -> RetryScheduler:
+        """Fila de envio com novas tentativas; a barra total avança a cada lote enviado."""
+        self.send_turns = SendTurns()
+        return RetryScheduler(
+            send=lambda batch: self._upload_batch(batch, video_metadata),
+            on_success=lambda batch: pbar_total.update(len(batch)),
+            describe=lambda batch: os.path.basename(batch[0]) + (f" (+{len(batch) - 1})" if len(batch) > 1 else ""),
+            max_attempts=self.max_attempts,
+            # With a session pool, several uploads run at once so every account is used;
+            # only the bytes overlap, posting still follows the queue (see SendTurns)
+            concurrency=self.pool.capacity if self.pool is not None else 1,
+            # A single account waits out a FloodWait as a whole; the pool reroutes per session
+            flood_gate=self.pool is None,
+        )
+
+    def _report_failures(self, scheduler: RetryScheduler) -> bool:
+        """Lista os arquivos que não foram enviados após todas as tentativas."""
+        failed = [
+            (file_path, error) for batch, error in scheduler.failures for file_path in batch
+            if not self._is_processed(file_path)
+        ]
+        if not failed:
+            return True
+        self.spinner.warn(f"{len(failed)} arquivo(s) não enviado(s) após {self.max_attempts} tentativa(s):")
+        for file_path, error in failed:
+            print(f"  ✗ {self.manifest.relpath(file_path)}: {error}")
+        print("Execute novamente para tentar enviá-los.")
+        return False
 
     async def _step6_upload_content(self, header_info: str, footer_info: str, video_metadata: dict, summary_tree: str):
         self.spinner.text = "Etapa 6: Iniciando envio de arquivos..."
         self.spinner.info("Preparando lotes de envio...")
         
-        # Files upload
-        all_paths_found = []
-        for root, dirs, files in os.walk(self.upload_path):
-            for file in files:
-                if file.startswith(".") or file == ".processed_files" or file == "video_details.csv": continue
-                all_paths_found.append(os.path.join(root, file))
-
-        all_files = natsorted(all_paths_found)
-
         # Filter already processed files
-        files_to_upload = [f for f in all_files if not self._is_processed(os.path.basename(f))]
+        all_files = self.manifest.upload_files()
+        files_to_upload = [f for f in all_files if not self._is_processed(f)]
         
+        complete = True
         if not files_to_upload:
             self.spinner.succeed("Todos os arquivos já foram enviados anteriormente.")
         else:
             self.spinner.stop() # Stop spinner to not flicker with tqdm
             print("\n")
             pbar_total = tqdm(total=len(files_to_upload), unit="arq", desc=f"🚀 Enviando {len(files_to_upload)} arquivos...", position=0, dynamic_ncols=True)
-            
-            for file_path in files_to_upload:
-                file_name = os.path.basename(file_path)
-                file_size = os.path.getsize(file_path)
-                
-                # Helper to get description
-                caption = ""
-                tag = self.file_tags.get(file_path, "")
-                prefix_tag = f"{tag} - " if tag else ""
-                
-                if is_video_file(file_path) and file_name in video_metadata:
-                     meta = video_metadata[file_name]
-                     desc = meta.get('description', file_name)
-                     if len(desc) > 999:
-                         desc = desc[:996] + "..."
-                     caption = f"{prefix_tag}{desc}"
-                elif file_name.endswith(".zip"):
-                     caption = f"📦 {prefix_tag}Arquivos Extras: {file_name}"
-                else:
-                     caption = f"{prefix_tag}{file_name}"
-
-                # Progress bar for the current file
-                pbar_file = tqdm(total=file_size, unit="B", unit_scale=True, desc=f"Enviando {file_name[:20]}...", position=1, leave=False, dynamic_ncols=True)
+            scheduler = self._retry_scheduler(video_metadata, pbar_total)
+            self.thumb_prefetcher = ThumbnailPrefetcher(
+                self.thumbnails, [f for f in files_to_upload if is_video_file(f)], self.thumb_lookahead
+            )
+            prefetch = asyncio.create_task(self.thumb_prefetcher.run())
 
-                def progress(current, total):
-                    pbar_file.n = current
-                    pbar_file.refresh()
+            try:
+                for batch in self._group_batches(files_to_upload):
+                    await scheduler.submit(tuple(batch))
+                    await scheduler.run_due()
+                await scheduler.drain()
+            finally:
+                prefetch.cancel()
+                await asyncio.gather(prefetch, return_exceptions=True)
+                self.thumb_prefetcher = None
 
-                # Send
-                try:
-                    if is_video_file(file_path):
-                        await self._send_local_video_file(
-                            file_path,
-                            file_name,
-                            caption,
-                            video_metadata,
-                            progress,
-                        )
-                    else:
-                         await self.client.send_document(
-                             chat_id=self.client.destination_chat_id,
-                             document=file_path,
-                             caption=caption,
-                             progress=progress
-                         )
-                    
-                    self._mark_as_processed(file_name)
-                    pbar_total.update(1)
-                                    
-                except FloodWait as e:
-                    logger.warning(f"FloodWait de {e.value} segundos.")
-                    await asyncio.sleep(e.value)
-                except Exception as e:
-                    logger.error(f"Erro ao enviar {file_name}: {e}")
-                finally:
-                    pbar_file.close()
-            
             pbar_total.close()
             print() # New line after progress bars
-        
-        # 2. Send Summary
+            complete = self._report_failures(scheduler)
+
+        await self._send_summary(header_info, footer_info, summary_tree)
+        if complete:
+            self.spinner.succeed("6/6 - Arquivos e sumário enviados com sucesso.")
+        else:
+            self.spinner.warn("6/6 - Sumário enviado, mas há arquivos pendentes (veja a lista acima).")
+
+    async def _send_summary(self, header_info: str, footer_info: str, summary_tree: str):
         self.spinner.info("Enviando sumário...")
         
         # Combine Header + Tree
@@ -554,19 +903,267 @@ Convite: {invite_link}"""
         first_msg_id = None
         for i, text in enumerate(msgs):
             sent = await self.client.send_message(
-                chat_id=self.client.destination_chat_id,
+                chat_id=self.destination_chat_id,
                 text=text
             )
             if i == 0:
                 first_msg_id = sent.id
 
-        # 3. Pin First Message
+        # Pin First Message
         if first_msg_id:
             try:
                 await self.client.pin_chat_message(
-                    chat_id=self.client.destination_chat_id,
+                    chat_id=self.destination_chat_id,
                     message_id=first_msg_id
                 )
             except Exception as e:
                 logger.warning(f"Não foi possível fixar a mensagem: {e}")
-        self.spinner.succeed("6/6 - Arquivos e sumário enviados com sucesso.")
\ No newline at end of file
+
+    ###########################################################################
+    # Modo pipeline: cada arquivo é enviado assim que fica pronto
+    ###########################################################################
+
+    def _build_pipeline_plan(self) -> list[dict]:
+        """Monta a ordem de envio (natsorted) antes de qualquer processamento.
+
+        Cada slot representa uma unidade de preparo (volume ZIP, vídeo ou
+        arquivo comum) ordenada pelo caminho final previsto. O slot só é
+        resolvido com a lista de arquivos prontos quando seu preparo termina.
+        """
+        slots = []
+        zip_paths = set()
+        for volume in self._plan_zip_volumes(self._collect_non_video_files()):
+            zip_paths.add(volume['path'])
+            slots.append({
+                'kind': 'zip', 'key': volume['path'], 'source': volume['path'],
+                'files': volume['files'], 'dirty': volume['dirty'],
+            })
+
+        for file_path in self.manifest.upload_files():
+            if file_path in zip_paths:
+                continue
+            if self.manifest.get(file_path).kind == "video":
+                # Reencoded outputs always end in TARGET_EXTENSION; split parts sort right after it.
+                key = f"{os.path.splitext(file_path)[0]}{TARGET_EXTENSION}"
+                slots.append({'kind': 'video', 'key': key, 'source': file_path})
+            else:
+                slots.append({'kind': 'file', 'key': file_path, 'source': file_path})
+
+        ordered_keys = natsorted(slot['key'] for slot in slots)
+        position = {key: i for i, key in enumerate(ordered_keys)}
+        return sorted(slots, key=lambda slot: position[slot['key']])
+
+    async def _prepare_zip_volumes(self, slots: list[dict]):
+        """Escreve os volumes em paralelo, liberando cada slot ao terminar."""
+        by_path = {slot['source']: slot for slot in slots}
+        built = set()
+        for slot in slots:
+            if not slot['dirty']:
+                built.add(slot['source'])
+                slot['future'].set_result([slot['source']])
+
+        to_build = [(slot['source'], slot['files']) for slot in slots if slot['dirty']]
+        async for zip_path, ok in self._build_or_measure_volumes(to_build):
+            if ok:
+                built.add(zip_path)
+            by_path[zip_path]['future'].set_result([zip_path] if ok else [])
+        self._save_zip_manifest(
+            [{'path': slot['source'], 'files': slot['files']} for slot in slots],
+            built - set(self.zip_streams),
+        )
+
+    async def _prepare_video(self, slot: dict, reencoder: MediaReencode, semaphore: asyncio.Semaphore, video_metadata: dict):
+        """Reencoda, divide e mede um vídeo, liberando o slot com as partes prontas."""
+        try:
+            async with semaphore:
+                video_path = await reencoder.prepare_file(slot['source'])
+                parts = await self._split_if_needed(video_path) if video_path else []
+            slot['durations'] = {}
+            for part in parts:
+                name = os.path.basename(part)
+                entry = self.manifest.add(part)
+                result = await probe(part)
+                dur = result.duration
+                if entry:
+                    entry.probe = result
+                slot['durations'][part] = dur
+                try:
+                    # Ready before the consumer reaches this slot
+                    await self.thumbnails.get(part)
+                except Exception as e:
+                    logger.warning(f"Falha ao preparar thumbnail de {part}: {e}")
+                if name not in video_metadata:
+                    video_metadata[name] = {
+                        'duration': dur,
+                        'description': name,
+                        'title': name,
+                        'path': part,
+                    }
+            slot['future'].set_result(parts)
+        except Exception as e:
+            logger.error(f"Erro ao preparar vídeo {slot['source']}: {e}")
+            slot['future'].set_result([])
+
+    async def _prefetch_probes(self, paths: list[str]):
+        async for _ in probe_many(paths, self.probe_concurrency):
+            pass
+
+    async def _run_pipeline(self):
+        self.spinner.text = "Planejando envio em fluxo contínuo..."
+        video_metadata = self._load_csv_metadata()
+        slots = self._build_pipeline_plan()
+        loop = asyncio.get_running_loop()
+        for slot in slots:
+            slot['future'] = loop.create_future()
+            if slot['kind'] == 'file':
+                slot['future'].set_result([slot['source']])
+
+        # Producers run in the background; the consumer below follows the fixed plan order.
+        reencoder = MediaReencode(
+            self.client, self.upload_path, self.progress_tracker,
+            manifest=self.manifest, probe_concurrency=self.probe_concurrency,
+            on_converted=lambda path: self._set_state(path, REENCODED),
+            size_limit=self.size_limit,
+            **self.reencode_options,
+        )
+        semaphore = asyncio.Semaphore(reencoder.jobs)
+        producers = [
+            asyncio.create_task(self._prepare_zip_volumes([s for s in slots if s['kind'] == 'zip']))
+        ]
+        producers += [
+            asyncio.create_task(self._prepare_video(slot, reencoder, semaphore, video_metadata))
+            for slot in slots if slot['kind'] == 'video'
+        ]
+        # Warm the probe cache ahead of the pooled video preparation
+        producers.append(asyncio.create_task(self._prefetch_probes(
+            [slot['source'] for slot in slots if slot['kind'] == 'video']
+        )))
+        self.spinner.succeed(f"Plano de envio com {len(slots)} itens; enviando conforme ficam prontos.")
+
+        self.spinner.stop() # Stop spinner to not flicker with tqdm
+        print("\n")
+        pbar_total = tqdm(total=len(slots), unit="arq", desc=f"🚀 Enviando {len(slots)} itens...", position=0, dynamic_ncols=True)
+        total_size = 0
+        total_duration = 0.0
+        tag_index = 0
+        batch: list[str] = []
+        batch_key = None
+        scheduler = self._retry_scheduler(video_metadata, pbar_total)
+
+        async def flush_batch():
+            nonlocal batch, batch_key
+            if batch:
+                await scheduler.submit(tuple(batch))
+            # Retries whose backoff/FloodWait expired go out between new items
+            await scheduler.run_due()
+            batch, batch_key = [], None
+
+        try:
+            for slot in slots:
+                if not slot['future'].done():
+                    # Don't hold a pending album while waiting for a slow item
+                    await flush_batch()
+                files = await slot['future']
+                if len(files) > 1:
+                    pbar_total.total += len(files) - 1
+                    pbar_total.refresh()
+                for file_path in files:
+                    entry = self.manifest.add(file_path)
+                    if entry is None:
+                        continue
+                    tag_index += 1
+                    entry.tag = f"#F{tag_index:03d}"
+                    total_size += entry.size
+                    total_duration += slot.get('durations', {}).get(file_path, 0.0)
+                    if self._is_processed(file_path):
+                        pbar_total.update(1)
+                        continue
+                    key = self._album_key(file_path)
+                    if key is None or key != batch_key or len(batch) >= ALBUM_SIZE:
+                        await flush_batch()
+                        batch_key = key
+                    batch.append(file_path)
+            await flush_batch()
+            await scheduler.drain()
+        finally:
+            self.journal.set_meta("last_tag", str(tag_index))
+            pbar_total.close()
+            print() # New line after progress bars
+            for task in producers:
+                task.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+
+        self.spinner.start()
+        invite_link = await self._get_invite_link()
+        header_info, footer_info = self._build_header(total_size, total_duration, invite_link)
+        summary_tree = self._generate_summary_tree(self.manifest.root)
+        complete = self._report_failures(scheduler)
+        await self._send_summary(header_info, footer_info, summary_tree)
+        if complete:
+            self.spinner.succeed("Arquivos e sumário enviados com sucesso.")
+        else:
+            self.spinner.warn("Sumário enviado, mas há arquivos pendentes (veja a lista acima).")
+
+    ###########################################################################
+    # Modo watch: arquivos novos entram no canal sem revarrer a pasta
+    ###########################################################################
+
+    async def _watch_folder(self, watcher: FolderWatcher):
+        """Envia os arquivos que aparecem em upload_path até o usuário interromper.
+
+        O watcher já foi iniciado antes da indexação, então o que chegou durante
+        o envio inicial é entregue aqui (e ignorado se já foi enviado).
+        """
+        reencoder = MediaReencode(
+            self.client, self.upload_path, self.progress_tracker,
+            manifest=self.manifest, probe_concurrency=self.probe_concurrency,
+            on_converted=lambda path: self._set_state(path, REENCODED),
+            size_limit=self.size_limit,
+            **self.reencode_options,
+        )
+        self.spinner.info(
+            f"Observando {self.upload_path} ({watcher.backend}); novos arquivos são enviados ao ficarem prontos. Ctrl+C encerra."
+        ).start()
+        async for paths in watcher.changes():
+            await self._upload_new_files(paths, reencoder)
+            self.spinner.text = f"Observando {self.upload_path}..."
+
+    async def _upload_new_files(self, paths: set[str], reencoder: MediaReencode):
+        """Reencode/divisão/envio só dos arquivos entregues pelo watcher, com as próximas tags."""
+        ready = []
+        for path in natsorted(paths):
+            entry = self.manifest.add(path)
+            # Saídas do nosso próprio reencode/divisão também aparecem aqui depois de enviadas
+            if entry is None or entry.kind == "meta" or self._is_processed(path):
+                continue
+            if entry.kind == "video":
+                self.spinner.text = f"Preparando {os.path.basename(path)}..."
+                video_path = await reencoder.prepare_file(path)
+                ready += await self._split_if_needed(video_path) if video_path else []
+            else:
+                ready.append(path)
+        ready = [path for path in ready if not self._is_processed(path)]
+        if not ready:
+            return
+
+        last_tag = int(self.journal.get_meta("last_tag") or 0)
+        for path in ready:
+            last_tag += 1
+            self.manifest.add(path).tag = f"#F{last_tag:03d}"
+        self.journal.set_meta("last_tag", str(last_tag))
+
+        video_metadata = self._load_csv_metadata()
+        self.spinner.stop()
+        pbar_total = tqdm(total=len(ready), unit="arq", desc=f"🚀 Enviando {len(ready)} novo(s)...", position=0, dynamic_ncols=True)
+        scheduler = self._retry_scheduler(video_metadata, pbar_total)
+        try:
+            for batch in self._group_batches(ready):
+                await scheduler.submit(tuple(batch))
+                await scheduler.run_due()
+            await scheduler.drain()
+        finally:
+            pbar_total.close()
+            self.journal.commit()
+        self._report_failures(scheduler)
+        self.spinner.start()
+        logger.info(f"Modo watch: {len(ready)} arquivo(s) processado(s) de {len(paths)} alterado(s).")
@@ -1,13 +1,90 @@
 ###############################################################################
 # Classe para persistência do progresso (para retomar de onde parou)
 ###############################################################################
+# progress.json guarda um snapshot; cada update() só acrescenta uma linha em
+# progress.json.journal. O journal é reaplicado na carga e incorporado ao
+# snapshot (compactação) quando cresce demais ou no close().
+# Além do "último id" de cada chave, ids concluídos fora de ordem ficam em
+# conjuntos de intervalos ("<chave>:done"), base para transferências paralelas.
 
-import json, os
+import atexit, bisect, json, os, time
 from src.log import logger
 
+JOURNAL_SUFFIX = ".journal"
+COMPACT_EVERY = 1000      # linhas no journal antes de reescrever o snapshot
+FLUSH_INTERVAL = 1.0      # segundos entre flush() do journal (0 = a cada update)
+FSYNC_INTERVAL = 30.0     # segundos entre os.fsync() do journal (0 = nunca)
+DONE_SUFFIX = ":done"
+
+
+class IntervalSet:
+    """Inteiros como intervalos fechados [início, fim] disjuntos, ordenados e mesclados.
+
+    A busca é O(log n) (bisect); intervalos adjacentes ou sobrepostos viram um só.
+    """
+
+    def __init__(self, ranges=()):
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+        for start, end in ranges:
+            self.add(start, end)
+
+    def add(self, start: int, end: int):
+        if end < start:
+            return
+        # Primeiro intervalo que termina em start-1 ou depois (pode encostar ou sobrepor)
+        i = bisect.bisect_left(self.ends, start - 1)
+        # Primeiro intervalo que começa depois de end+1 (não encosta)
+        j = bisect.bisect_right(self.starts, end + 1)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def __contains__(self, value: int) -> bool:
+        i = bisect.bisect_right(self.starts, value) - 1
+        return i >= 0 and value <= self.ends[i]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def low_water(self, floor: int = 0) -> int:
+        """Maior n tal que todos os inteiros de floor até n estão no conjunto (floor-1 se nenhum)."""
+        i = bisect.bisect_right(self.starts, floor) - 1
+        if i < 0 or self.ends[i] < floor:
+            return floor - 1
+        return self.ends[i]
+
+    def holes(self, floor: int = 0) -> list[tuple[int, int]]:
+        """Lacunas [início, fim] entre floor e o último intervalo."""
+        gaps = []
+        previous_end = floor - 1
+        for start, end in zip(self.starts, self.ends):
+            if start > previous_end + 1:
+                gaps.append((previous_end + 1, start - 1))
+            previous_end = max(previous_end, end)
+        return gaps
+
+    def to_list(self) -> list[list[int]]:
+        return [[start, end] for start, end in zip(self.starts, self.ends)]
+
+
 class ProgressTracker:
-    def __init__(self, filename: str = "progress.json"):
+    def __init__(
+        self,
+        filename: str = "progress.json",
+        flush_interval: float = FLUSH_INTERVAL,
+        fsync_interval: float = FSYNC_INTERVAL,
+        compact_every: int = COMPACT_EVERY,
+    ):
         self.filename = filename
+        self.journal_filename = f"{filename}{JOURNAL_SUFFIX}"
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.data = {}
+        self.done: dict[str, IntervalSet] = {}
         if os.path.exists(filename):
             try:
                 with open(filename, "r", encoding="utf-8") as f:
@@ -15,26 +92,150 @@ class ProgressTracker:
             except Exception as e:
                 logger.error(f"Erro ao ler arquivo de progresso: {e}")
                 self.data = {}
-        else:
-            self.data = {}
+        for key in [k for k in self.data if k.endswith(DONE_SUFFIX)]:
+            self.done[key[:-len(DONE_SUFFIX)]] = IntervalSet(self.data.pop(key))
+        self._journal_lines = self._replay_journal()
+        self._journal = None
+        self._last_flush = self._last_fsync = time.monotonic()
+        self._dirty = False
+        # Sobras de uma execução anterior viram snapshot logo na abertura
+        if self._journal_lines:
+            self._compact()
+        atexit.register(self.close)
+
+    def _replay_journal(self) -> int:
+        if not os.path.exists(self.journal_filename):
+            return 0
+        lines = 0
+        try:
+            with open(self.journal_filename, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue  # última linha truncada por interrupção
+                    if "add" in item:
+                        self._done_set(item["k"]).add(*item["add"])
+                    else:
+                        self.data[item["k"]] = item["v"]
+                    lines += 1
+        except Exception as e:
+            logger.error(f"Erro ao ler journal de progresso: {e}")
+        return lines
 
     def _get_key(self, op: str, chat_id: int, dest_chat_id: int = None) -> str:
         if dest_chat_id:
             return f"{op}_{chat_id}_{dest_chat_id}"
         return f"{op}_{chat_id}"
 
+    def _done_set(self, key: str) -> IntervalSet:
+        done = self.done.get(key)
+        if done is None:
+            done = self.done[key] = IntervalSet()
+        return done
+
     def get_last_message_id(self, op: str, chat_id: int, dest_chat_id: int = None) -> int:
+        """Id até o qual tudo foi concluído (marca d'água contígua) para retomar."""
         key = self._get_key(op, chat_id, dest_chat_id)
-        return self.data.get(key, 0)
+        last = self.data.get(key, 0)
+        done = self.done.get(key)
+        if done is not None:
+            # Intervalos só acrescentam ao que update() já garante como contíguo
+            last = max(last, done.low_water(floor=last + 1))
+        return last
 
     def update(self, op: str, chat_id: int, dest_chat_id: int, message_id: int):
+        """Marca todos os ids até message_id como concluídos (processamento em ordem)."""
         key = self._get_key(op, chat_id, dest_chat_id)
         self.data[key] = message_id
-        self._save()
+        self._append({"k": key, "v": message_id})
+
+    def mark_done(self, op: str, chat_id: int, dest_chat_id: int, message_id: int, after_id: int | None = None):
+        """Registra um id concluído, em qualquer ordem.
 
-    def _save(self):
+        after_id é o id da mensagem anterior na mesma listagem: o intervalo
+        (after_id, message_id] fica concluído, cobrindo ids que não existem no
+        chat (apagados, serviço) para que não pareçam lacunas.
+        """
+        key = self._get_key(op, chat_id, dest_chat_id)
+        start = message_id if after_id is None else min(after_id + 1, message_id)
+        self._done_set(key).add(start, message_id)
+        self._append({"k": key, "add": [start, message_id]})
+
+    def is_done(self, op: str, chat_id: int, dest_chat_id: int, message_id: int) -> bool:
+        key = self._get_key(op, chat_id, dest_chat_id)
+        if message_id <= self.data.get(key, 0):
+            return True
+        done = self.done.get(key)
+        return done is not None and message_id in done
+
+    def holes(self, op: str, chat_id: int, dest_chat_id: int = None) -> list[tuple[int, int]]:
+        """Faixas de ids ainda pendentes entre a marca d'água e o maior id concluído."""
+        key = self._get_key(op, chat_id, dest_chat_id)
+        done = self.done.get(key)
+        if done is None:
+            return []
+        return done.holes(floor=self.get_last_message_id(op, chat_id, dest_chat_id) + 1)
+
+    def _append(self, item: dict):
+        try:
+            if self._journal is None:
+                self._journal = open(self.journal_filename, "a", encoding="utf-8")
+            self._journal.write(json.dumps(item) + "\n")
+            self._journal_lines += 1
+            self._dirty = True
+        except Exception as e:
+            logger.error(f"Erro ao salvar progresso: {e}")
+            return
+
+        if self._journal_lines >= self.compact_every:
+            self._compact()
+            return
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.flush(fsync=self.fsync_interval > 0 and now - self._last_fsync >= self.fsync_interval)
+
+    def flush(self, fsync: bool = False):
+        """Envia o journal ao SO (e opcionalmente ao disco)."""
+        if self._journal is None or not self._dirty:
+            return
+        try:
+            self._journal.flush()
+            self._last_flush = time.monotonic()
+            if fsync:
+                os.fsync(self._journal.fileno())
+                self._last_fsync = self._last_flush
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Erro ao salvar progresso: {e}")
+
+    def _compact(self):
+        """Reescreve o snapshot de forma atômica e zera o journal."""
+        tmp = f"{self.filename}.tmp"
         try:
-            with open(self.filename, "w", encoding="utf-8") as f:
-                json.dump(self.data, f, indent=4)
+            snapshot = dict(self.data)
+            for key, done in self.done.items():
+                snapshot[f"{key}{DONE_SUFFIX}"] = done.to_list()
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.filename)
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            # Só depois do snapshot estar no disco o journal pode sumir
+            if os.path.exists(self.journal_filename):
+                os.remove(self.journal_filename)
+            self._journal_lines = 0
+            self._dirty = False
         except Exception as e:
             logger.error(f"Erro ao salvar progresso: {e}")
+
+    def close(self):
+        """Incorpora o journal ao snapshot; chamado também na saída do processo."""
+        if self._journal_lines:
+            self._compact()
+        elif self._journal is not None:
+            self._journal.close()
+            self._journal = None
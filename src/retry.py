@@ -0,0 +1,132 @@
+###############################################################################
+# Reenvio com backoff: itens que falham voltam para a fila em vez de serem pulados
+###############################################################################
+
+import asyncio, heapq, itertools, random, time
+from pyrogram.errors import FloodWait
+from src.log import logger
+
+DEFAULT_MAX_ATTEMPTS = 5
+BASE_DELAY = 5.0     # segundos antes da 1ª nova tentativa; dobra a cada falha
+MAX_DELAY = 300.0
+# Erros que não melhoram com nova tentativa
+PERMANENT_ERRORS = (FileNotFoundError, IsADirectoryError, PermissionError)
+
+
+class RetryScheduler:
+    """Fila de novas tentativas ordenada pelo instante em que cada item pode voltar.
+
+    `send(item)` deve levantar exceção em caso de falha. Um FloodWait reagenda o
+    item para o fim da espera pedida pelo Telegram; demais erros usam backoff
+    exponencial com jitter. Com `flood_gate` (uma só conta), o FloodWait vale
+    para a conta inteira: nenhuma tentativa começa antes do prazo, em vez de
+    cada item enviar o arquivo todo só para receber o mesmo FloodWait. Sem ele
+    (pool), só o item volta para a fila, pois outra sessão pode assumir o resto.
+
+    Com `concurrency` > 1, submit() e run_due() só esperam por uma vaga: as
+    tentativas rodam em paralelo e drain() aguarda as que estão em andamento.
+    """
+
+    def __init__(self, send, on_success=None, describe=str, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY, concurrency: int = 1,
+                 flood_gate: bool = True):
+        self.send = send
+        self.on_success = on_success
+        self.describe = describe
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures: list[tuple[object, str]] = []  # (item, último erro)
+        self._queue: list[tuple[float, int, object]] = []
+        self._attempts: dict[int, int] = {}
+        self._order = itertools.count()
+        self.concurrency = max(1, concurrency)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self.flood_gate = flood_gate
+        self._flood_until = 0.0  # time.monotonic() até o fim do último FloodWait da conta
+
+    def __len__(self) -> int:
+        return len(self._queue) + len(self._tasks)
+
+    def _delay(self, attempt: int) -> float:
+        # "Full jitter": espalha as novas tentativas em vez de sincronizá-las
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def _wait_flood(self):
+        # Em loop: outra tentativa pode estender o prazo enquanto esta dorme
+        while self.flood_gate and (wait := self._flood_until - time.monotonic()) > 0:
+            await asyncio.sleep(wait)
+
+    async def _attempt(self, item, order: int) -> bool:
+        await self._wait_flood()
+        attempt = self._attempts.get(order, 0) + 1
+        self._attempts[order] = attempt
+        try:
+            await self.send(item)
+        except FloodWait as e:
+            # Espera imposta pelo servidor não conta como tentativa
+            self._attempts[order] = attempt - 1
+            if self.flood_gate:
+                self._flood_until = max(self._flood_until, time.monotonic() + e.value)
+            logger.warning(f"FloodWait de {e.value} segundos; {self.describe(item)} volta para a fila.")
+            heapq.heappush(self._queue, (time.monotonic() + e.value, order, item))
+            return False
+        except Exception as e:
+            if isinstance(e, PERMANENT_ERRORS) or attempt >= self.max_attempts:
+                logger.error(f"Falha definitiva em {self.describe(item)} após {attempt} tentativa(s): {e}")
+                self.failures.append((item, str(e)))
+                self._attempts.pop(order, None)
+                return False
+            delay = self._delay(attempt)
+            logger.warning(
+                f"Falha em {self.describe(item)} (tentativa {attempt}/{self.max_attempts}): {e}; "
+                f"nova tentativa em {delay:.0f}s."
+            )
+            heapq.heappush(self._queue, (time.monotonic() + delay, order, item))
+            return False
+
+        self._attempts.pop(order, None)
+        if self.on_success is not None:
+            self.on_success(item)
+        return True
+
+    async def _dispatch(self, item, order: int):
+        if self.concurrency == 1:
+            await self._attempt(item, order)
+            return
+        await self._slots.acquire()
+        task = asyncio.ensure_future(self._attempt(item, order))
+        self._tasks.add(task)
+
+        def done(task: asyncio.Task):
+            self._tasks.discard(task)
+            self._slots.release()
+
+        task.add_done_callback(done)
+
+    async def submit(self, item):
+        """Primeira tentativa de um item; se falhar ele fica agendado para depois."""
+        await self._dispatch(item, next(self._order))
+
+    async def run_due(self):
+        """Tenta de novo, sem esperar, os itens cujo prazo já passou."""
+        while self._queue and self._queue[0][0] <= time.monotonic():
+            _, order, item = heapq.heappop(self._queue)
+            await self._dispatch(item, order)
+
+    async def drain(self):
+        """Esvazia a fila, dormindo até o próximo prazo (ou até uma tentativa em andamento terminar)."""
+        try:
+            while self._queue or self._tasks:
+                wait = self._queue[0][0] - time.monotonic() if self._queue else None
+                if self._tasks and (wait is None or wait > 0):
+                    # Uma tentativa que falha agora pode reagendar antes do próximo prazo
+                    await asyncio.wait(self._tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                elif wait is not None and wait > 0:
+                    await asyncio.sleep(wait)
+                await self.run_due()
+        except asyncio.CancelledError:
+            for task in self._tasks:
+                task.cancel()
+            raise
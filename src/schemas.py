@@ -10,6 +10,8 @@ class InputModel(BaseModel):
     upload_path: Optional[str] = None
     add_suffix: Optional[str] = None
     remove_suffix: Optional[str] = None
+    watch: bool = False
+    mirror: bool = False
     confirm: bool = None
 
     @field_validator("action")
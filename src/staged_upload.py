@@ -0,0 +1,103 @@
+###############################################################################
+# Envio em duas etapas: bytes enviados em paralelo, postagem na ordem certa
+###############################################################################
+# send_video/send_document sobem o arquivo e postam numa só chamada, então
+# uploads paralelos postariam na ordem em que terminam. Aqui o upload
+# (save_file) devolve a mídia pronta e send_uploaded() faz só o SendMedia,
+# que quem chama executa na vez de cada arquivo (ver SendTurns).
+
+import asyncio, os
+from pyrogram import raw, types, utils
+from pyrogram.client import Client
+from pyrogram.errors import FilePartMissing
+
+
+class UploadedMedia:
+    """Mídia já enviada ao Telegram por uma conta, aguardando o SendMedia."""
+
+    def __init__(self, media, source):
+        self.media = media
+        self.source = source  # caminho ou stream, para reenviar partes perdidas
+
+
+async def upload_video(client: Client, path: str, *, duration: int, width: int, height: int,
+                       thumb: str | None = None, progress=None) -> UploadedMedia:
+    """Etapa de bytes de send_video (player nativo)."""
+    thumb_file = await client.save_file(thumb) if thumb else None
+    file = await client.save_file(path, progress=progress)
+    media = raw.types.InputMediaUploadedDocument(
+        mime_type=client.guess_mime_type(path) or "video/mp4",
+        file=file,
+        thumb=thumb_file,
+        attributes=[
+            raw.types.DocumentAttributeVideo(supports_streaming=True, duration=duration, w=width, h=height),
+            raw.types.DocumentAttributeFilename(file_name=os.path.basename(path)),
+        ],
+    )
+    return UploadedMedia(media, path)
+
+
+async def upload_document(client: Client, document, file_name: str, progress=None) -> UploadedMedia:
+    """Etapa de bytes de send_document; `document` é um caminho ou um stream com .name."""
+    file = await client.save_file(document, progress=progress)
+    media = raw.types.InputMediaUploadedDocument(
+        mime_type=client.guess_mime_type(file_name) or "application/zip",
+        file=file,
+        attributes=[raw.types.DocumentAttributeFilename(file_name=file_name)],
+    )
+    return UploadedMedia(media, document)
+
+
+async def send_uploaded(client: Client, chat_id, uploaded: UploadedMedia, caption: str) -> "types.Message | None":
+    """SendMedia de uma mídia já enviada pela mesma conta (como o final de send_video)."""
+    while True:
+        try:
+            r = await client.invoke(
+                raw.functions.messages.SendMedia(
+                    peer=await client.resolve_peer(chat_id),
+                    media=uploaded.media,
+                    random_id=client.rnd_id(),
+                    **await utils.parse_text_entities(client, caption, None, None),
+                )
+            )
+        except FilePartMissing as e:
+            await client.save_file(uploaded.source, file_id=uploaded.media.file.id, file_part=e.value)
+            continue
+        for update in r.updates:
+            if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                return await types.Message._parse(
+                    client, update.message,
+                    {u.id: u for u in r.users},
+                    {c.id: c for c in r.chats},
+                )
+        return None
+
+
+class SendTurns:
+    """Libera a postagem na ordem em que as vezes foram tiradas.
+
+    take() no início de cada tentativa; wait() antes de postar espera as vezes
+    anteriores terminarem; release() sempre ao final (sucesso ou falha), para
+    que uma tentativa que falha antes de postar não segure as seguintes.
+    """
+
+    def __init__(self):
+        self._next = 0
+        self._pending: list[int] = []
+        self._changed = asyncio.Condition()
+
+    def take(self) -> int:
+        turn = self._next
+        self._next += 1
+        self._pending.append(turn)  # crescente: vezes são tiradas em ordem
+        return turn
+
+    async def wait(self, turn: int):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._pending[0] == turn)
+
+    async def release(self, turn: int):
+        async with self._changed:
+            if turn in self._pending:
+                self._pending.remove(turn)
+            self._changed.notify_all()
@@ -0,0 +1,91 @@
+###############################################################################
+# Thumbs e metadados de vídeo gerados antes do envio, em cache por conteúdo
+###############################################################################
+
+import asyncio, os
+from dataclasses import dataclass
+from src.cache import CACHE_DIR, JsonlCache
+from src.ffmpeg_utils import extract_video_thumbnail_jpeg, probe
+from src.fingerprint import fingerprint
+from src.log import logger
+
+THUMB_DIR = os.path.join(CACHE_DIR, "thumbs")
+DEFAULT_LOOKAHEAD = 3  # vídeos preparados à frente do que está sendo enviado
+
+
+@dataclass(frozen=True)
+class VideoPreview:
+    thumb: str | None  # JPEG pronto para send_video(thumb=...), ou None se falhou
+    duration: float
+    width: int
+    height: int
+
+
+class ThumbnailCache:
+    """Gera (uma vez por conteúdo) o thumb JPEG e lê duração/dimensões de um vídeo.
+
+    A chave é a impressão digital do arquivo, então novas tentativas, novas
+    execuções e cópias renomeadas reaproveitam o mesmo resultado.
+    """
+
+    def __init__(self, thumb_dir: str = THUMB_DIR):
+        self.thumb_dir = thumb_dir
+        os.makedirs(thumb_dir, exist_ok=True)
+        self.index = JsonlCache(os.path.join(CACHE_DIR, "thumbs.jsonl"))
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def get(self, video_path: str) -> VideoPreview:
+        # Quem pede um vídeo já em preparo espera pelo mesmo trabalho
+        future = self._inflight.get(video_path)
+        if future is None:
+            future = asyncio.ensure_future(self._build(video_path))
+            self._inflight[video_path] = future
+            future.add_done_callback(lambda _: self._inflight.pop(video_path, None))
+        return await asyncio.shield(future)
+
+    async def _build(self, video_path: str) -> VideoPreview:
+        fp = await fingerprint(video_path, "sample")
+        cached = self.index.get(fp)
+        if cached and (cached["thumb"] is None or os.path.isfile(cached["thumb"])):
+            return VideoPreview(**cached)
+
+        result = await probe(video_path)
+        thumb = os.path.join(self.thumb_dir, f"{fp.replace(':', '_')}.jpg")
+        if not await extract_video_thumbnail_jpeg(video_path, thumb, duration=result.duration):
+            thumb = None
+        preview = VideoPreview(thumb, result.duration, result.width or 0, result.height or 0)
+        if result.ok:
+            self.index.set(fp, {
+                "thumb": preview.thumb, "duration": preview.duration,
+                "width": preview.width, "height": preview.height,
+            })
+        return preview
+
+
+class ThumbnailPrefetcher:
+    """Estágio em segundo plano que prepara os vídeos alguns itens à frente do envio."""
+
+    def __init__(self, cache: ThumbnailCache, paths: list[str], lookahead: int = DEFAULT_LOOKAHEAD):
+        self.cache = cache
+        self.paths = paths
+        self.position = {path: i for i, path in enumerate(paths)}
+        self.lookahead = max(1, lookahead)
+        self.cursor = 0
+        self._moved = asyncio.Event()
+
+    def advance(self, path: str):
+        """Avisa que o envio chegou em path; libera a preparação dos próximos."""
+        i = self.position.get(path)
+        if i is not None and i > self.cursor:
+            self.cursor = i
+            self._moved.set()
+
+    async def run(self):
+        for i, path in enumerate(self.paths):
+            while i >= self.cursor + self.lookahead:
+                self._moved.clear()
+                await self._moved.wait()
+            try:
+                await self.cache.get(path)
+            except Exception as e:
+                logger.warning(f"Falha ao preparar thumbnail de {path}: {e}")
@@ -0,0 +1,118 @@
+###############################################################################
+# Journal de envio por pasta (SQLite): estado de cada arquivo + chat de destino
+###############################################################################
+
+import sqlite3, time
+from src.log import logger
+
+UPLOAD_JOURNAL_NAME = ".upload_journal.db"
+LEGACY_LOG_NAME = ".processed_files"
+COMMIT_INTERVAL = 2.0   # segundos entre commits de escritas acumuladas
+COMMIT_EVERY = 100      # ou antes, ao acumular tantas escritas
+
+# Estados de um arquivo, na ordem em que as etapas acontecem
+ZIPPED, REENCODED, SPLIT, UPLOADED = "zipped", "reencoded", "split", "uploaded"
+
+
+class UploadJournal:
+    """Estado por arquivo, chaveado pelo caminho relativo e validado por tamanho + mtime.
+
+    As linhas ficam em memória (consulta O(1)); as escritas entram numa
+    transação aberta que é confirmada em lote por tempo ou quantidade.
+    """
+
+    def __init__(self, db_path: str, commit_interval: float = COMMIT_INTERVAL, commit_every: int = COMMIT_EVERY):
+        self.db_path = db_path
+        self.commit_interval = commit_interval
+        self.commit_every = commit_every
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS files (
+                rel_path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                state TEXT NOT NULL,
+                message_id INTEGER,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+        self.meta: dict[str, str] = dict(self.conn.execute("SELECT key, value FROM meta"))
+        self.rows: dict[str, tuple[int, float, str, int | None]] = {
+            rel: (size, mtime, state, message_id)
+            for rel, size, mtime, state, message_id in self.conn.execute(
+                "SELECT rel_path, size, mtime, state, message_id FROM files"
+            )
+        }
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def get_meta(self, key: str) -> str | None:
+        return self.meta.get(key)
+
+    def set_meta(self, key: str, value: str):
+        if self.meta.get(key) == value:
+            return
+        self.meta[key] = value
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        self._wrote()
+
+    def state(self, rel_path: str, size: int, mtime: float) -> str | None:
+        """Estado registrado, ou None se o arquivo é desconhecido ou mudou desde então."""
+        row = self.rows.get(rel_path)
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+        return row[2]
+
+    def message_id(self, rel_path: str) -> int | None:
+        row = self.rows.get(rel_path)
+        return row[3] if row else None
+
+    def set_state(self, rel_path: str, size: int, mtime: float, state: str, message_id: int | None = None):
+        self.rows[rel_path] = (size, mtime, state, message_id)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (rel_path, size, mtime, state, message_id, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (rel_path, size, mtime, state, message_id, time.time()),
+        )
+        self._wrote()
+
+    def _wrote(self):
+        self._pending += 1
+        if self._pending >= self.commit_every or time.monotonic() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        if not self._pending:
+            return
+        try:
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Erro ao gravar journal de envio {self.db_path}: {e}")
+            return
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+def read_legacy_log(path: str) -> tuple[str | None, set[str]]:
+    """(chat_id, nomes enviados) de um .processed_files antigo."""
+    chat_id, names = None, set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("CHAT_ID:"):
+                chat_id = line.replace("CHAT_ID:", "").strip() or chat_id
+            else:
+                names.add(line)
+    return chat_id, names
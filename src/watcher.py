@@ -0,0 +1,209 @@
+###############################################################################
+# Observação de pasta: arquivos novos/alterados entregues quando param de mudar
+###############################################################################
+
+import asyncio, ctypes, ctypes.util, errno, os, struct, sys, time
+from src.log import logger
+from src.manifest import SEGMENT_DIR_PREFIX, classify
+
+DEFAULT_DEBOUNCE = 3.0       # segundos sem alteração até o arquivo ser considerado pronto
+DEFAULT_POLL_INTERVAL = 5.0  # intervalo da varredura quando não há inotify
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _scan(root: str) -> tuple[dict[str, tuple[int, int]], list[str]]:
+    """(arquivos -> (tamanho, mtime_ns), diretórios) sob root, como FileManifest.scan."""
+    files, dirs = {}, [root]
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for item in it:
+                    if item.is_dir(follow_symlinks=False):
+                        if not item.name.startswith(SEGMENT_DIR_PREFIX):
+                            dirs.append(item.path)
+                            stack.append(item.path)
+                    elif item.is_file():
+                        st = item.stat()
+                        files[item.path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            continue
+    return files, dirs
+
+
+def _signature(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class _Inotify:
+    """inotify via ctypes (Linux), sem dependências externas."""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.paths: dict[int, str] = {}
+
+    def add_watch(self, path: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                logger.warning("Limite de inotify atingido (fs.inotify.max_user_watches); subpastas novas podem não ser vistas.")
+            return
+        self.paths[wd] = path
+
+    def read(self) -> list[tuple[str, int]]:
+        """(caminho, máscara) dos eventos disponíveis; overflow vem com caminho vazio."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    events.append(("", mask))
+                elif mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                elif wd in self.paths and name:
+                    events.append((os.path.join(self.paths[wd], os.fsdecode(name)), mask))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Entrega lotes de arquivos novos ou alterados depois de `debounce` segundos estáveis.
+
+    Usa inotify quando disponível e cai para varreduras periódicas (os.scandir)
+    caso contrário. Arquivos de controle e temporários (ver manifest.classify)
+    são ignorados; o que já existia ao iniciar não é entregue.
+    """
+
+    def __init__(self, root: str, debounce: float = DEFAULT_DEBOUNCE, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.root = os.path.normpath(root)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend = "polling"
+        self._inotify: _Inotify | None = None
+        self._snapshot: dict[str, tuple[int, int]] = {}
+        # Caminho -> (assinatura vista por último, instante da última mudança)
+        self._pending: dict[str, tuple[tuple[int, int] | None, float]] = {}
+        self._rescan = False
+        self._started = False
+
+    def _touch(self, path: str):
+        if classify(path) == "meta":
+            return
+        self._pending[path] = (_signature(path), time.monotonic())
+
+    def _diff_scan(self):
+        """Compara a pasta com a última varredura e marca o que mudou."""
+        files, dirs = _scan(self.root)
+        for path, sig in files.items():
+            if self._snapshot.get(path) != sig:
+                self._touch(path)
+        self._snapshot = files
+        if self._inotify is not None:
+            for d in dirs:
+                self._inotify.add_watch(d)  # pastas criadas durante os eventos perdidos
+
+    def _on_readable(self):
+        for path, mask in self._inotify.read():
+            if not path:
+                self._rescan = True  # eventos perdidos: uma varredura completa recupera
+            elif mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not os.path.basename(path).startswith(SEGMENT_DIR_PREFIX):
+                    # Pasta nova (ou movida para dentro): observa e pega o que já veio nela
+                    files, dirs = _scan(path)
+                    for d in dirs:
+                        self._inotify.add_watch(d)
+                    for file_path in files:
+                        self._touch(file_path)
+            else:
+                self._touch(path)
+
+    def start(self):
+        """Tira a foto inicial da pasta e liga o inotify; changes() chama se ainda não foi chamado."""
+        if self._started:
+            return
+        self._started = True
+        self._snapshot, dirs = _scan(self.root)
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                for d in dirs:
+                    self._inotify.add_watch(d)
+                asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_readable)
+                self.backend = "inotify"
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify indisponível ({e}); usando varredura a cada {self.poll_interval:.0f}s.")
+                self._inotify = None
+
+    def stop(self):
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        self._started = False
+
+    def _settled(self) -> set[str]:
+        now = time.monotonic()
+        ready = set()
+        for path, (sig, changed) in list(self._pending.items()):
+            if now - changed < self.debounce:
+                continue
+            current = _signature(path)
+            if current is None:
+                del self._pending[path]  # removido/renomeado antes de ficar pronto
+            elif current != sig:
+                self._pending[path] = (current, now)  # ainda sendo escrito
+            else:
+                del self._pending[path]
+                self._snapshot[path] = current
+                ready.add(path)
+        return ready
+
+    async def changes(self):
+        """Gerador assíncrono de conjuntos de caminhos prontos para envio."""
+        self.start()
+        tick = min(0.5, self.debounce / 2) if self.debounce > 0 else 0.1
+        last_poll = time.monotonic()
+        try:
+            while True:
+                await asyncio.sleep(tick)
+                now = time.monotonic()
+                if self._rescan or (self._inotify is None and now - last_poll >= self.poll_interval):
+                    self._rescan = False
+                    last_poll = now
+                    self._diff_scan()
+                ready = self._settled()
+                if ready:
+                    yield ready
+        finally:
+            self.stop()
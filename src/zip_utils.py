@@ -0,0 +1,421 @@
+"""Utilitários para gerar os volumes ZIP de documentos fora do event loop."""
+
+import io
+import os
+import json
+import time
+import zlib
+import queue
+import struct
+import asyncio
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator
+from src.log import logger
+from src.ffmpeg_utils import VIDEO_EXTENSIONS
+
+# Formatos que já são comprimidos: deflate gasta CPU e quase não reduz o tamanho
+COMPRESSED_EXTENSIONS = {
+    # imagens
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif', '.avif',
+    # documentos (containers zip/deflate internos)
+    '.pdf', '.epub', '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.cbz', '.cbr',
+    # arquivos compactados
+    '.zip', '.rar', '.7z', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.lz4', '.apk', '.jar',
+    # áudio
+    '.mp3', '.m4a', '.aac', '.ogg', '.oga', '.opus', '.flac', '.wma',
+    *VIDEO_EXTENSIONS,
+}
+
+
+def default_zip_workers() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def compress_type_for(file_path: str) -> int:
+    """ZIP_STORED para formatos já comprimidos, ZIP_DEFLATED para o resto."""
+    if os.path.splitext(file_path)[1].lower() in COMPRESSED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def write_zip_volume(zip_path: str, files: list[str], base_path: str) -> str:
+    """Escreve um volume ZIP (executado em processo worker).
+
+    O volume é gravado em um arquivo temporário e renomeado no final, então
+    um volume interrompido nunca parece completo.
+    """
+    tmp_path = f"{zip_path}.partial"
+    with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for file_path in files:
+            zf.write(
+                file_path,
+                os.path.relpath(file_path, base_path),
+                compress_type=compress_type_for(file_path),
+            )
+    os.replace(tmp_path, zip_path)
+    return zip_path
+
+
+async def _run_on_pool(
+    func,
+    volumes: list[tuple[str, list[str]]],
+    base_path: str,
+    workers: int | None,
+) -> AsyncIterator[tuple[str, object]]:
+    """Executa func(zip_path, files, base_path) por volume em processos, entregando (zip_path, resultado ou None)."""
+    if not volumes:
+        return
+    loop = asyncio.get_running_loop()
+    pool = ProcessPoolExecutor(max_workers=min(len(volumes), workers or default_zip_workers()))
+
+    async def _run(zip_path: str, files: list[str]) -> tuple[str, object]:
+        try:
+            return zip_path, await loop.run_in_executor(pool, func, zip_path, files, base_path)
+        except Exception as e:
+            logger.error(f"Erro ao compactar {zip_path}: {e}")
+            if os.path.exists(f"{zip_path}.partial"):
+                os.remove(f"{zip_path}.partial")
+            return zip_path, None
+
+    try:
+        for finished in asyncio.as_completed([_run(path, files) for path, files in volumes]):
+            yield await finished
+    finally:
+        # Never block the event loop waiting for workers (e.g. when the caller is cancelled)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def build_zip_volumes(
+    volumes: list[tuple[str, list[str]]],
+    base_path: str,
+    workers: int | None = None,
+) -> AsyncIterator[tuple[str, bool]]:
+    """Gera os volumes em paralelo (um por núcleo), entregando (zip_path, ok) conforme terminam."""
+    async for zip_path, result in _run_on_pool(write_zip_volume, volumes, base_path, workers):
+        yield zip_path, result is not None
+
+
+###############################################################################
+# Plano incremental: reaproveita volumes cujos arquivos não mudaram
+###############################################################################
+
+ZIP_MANIFEST_NAME = ".zip_manifest.json"
+VOLUME_NAME = "Documentos_Part{:03d}.zip"
+
+
+def load_zip_manifest(manifest_path: str) -> dict[str, list]:
+    """Lê o manifesto {volume: [[rel, size, mtime], ...]} gravado ao lado dos volumes."""
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("volumes", {})
+    except Exception as e:
+        logger.error(f"Erro ao ler manifesto de zip {manifest_path}: {e}")
+        return {}
+
+
+def save_zip_manifest(manifest_path: str, volumes: dict[str, list]):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"volumes": volumes}, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def _volume_index(name: str) -> int:
+    digits = "".join(ch for ch in name if ch.isdigit())
+    return int(digits) if digits else 0
+
+
+def plan_zip_volumes(
+    current: dict[str, tuple[int, float]],
+    previous: dict[str, list],
+    limit: int,
+    existing: set[str],
+) -> tuple[list[dict], list[str]]:
+    """Distribui os arquivos em volumes mantendo a atribuição da execução anterior.
+
+    current: rel -> (size, mtime), em ordem natural.
+    previous: manifesto anterior (volume -> [[rel, size, mtime], ...]).
+    existing: volumes do manifesto anterior que ainda existem em disco.
+
+    Retorna (plano, volumes_obsoletos). Cada item do plano é
+    {'name', 'rels', 'size', 'dirty'}; só volumes 'dirty' precisam ser refeitos.
+    Arquivos novos entram no último volume (se couber) ou em volumes novos.
+    """
+    remaining = dict(current)
+    plan: list[dict] = []
+    stale: list[str] = []
+
+    for name in sorted(previous, key=_volume_index):
+        volume = {'name': name, 'rels': [], 'size': 0, 'dirty': name not in existing}
+        for rel, old_size, old_mtime in previous[name]:
+            if rel not in remaining:
+                volume['dirty'] = True
+                continue
+            size, mtime = remaining[rel]
+            if (size, mtime) != (old_size, old_mtime):
+                volume['dirty'] = True
+            if volume['rels'] and volume['size'] + size > limit:
+                volume['dirty'] = True
+                continue  # fica para ser realocado junto com os arquivos novos
+            volume['rels'].append(rel)
+            volume['size'] += size
+            del remaining[rel]
+        if volume['rels']:
+            plan.append(volume)
+        else:
+            stale.append(name)
+
+    next_index = max((_volume_index(name) for name in previous), default=0) + 1
+    for rel, (size, _) in remaining.items():
+        last = plan[-1] if plan else None
+        if last is None or (last['rels'] and last['size'] + size > limit):
+            last = {'name': VOLUME_NAME.format(next_index), 'rels': [], 'size': 0, 'dirty': True}
+            next_index += 1
+            plan.append(last)
+        last['rels'].append(rel)
+        last['size'] += size
+        last['dirty'] = True
+
+    return plan, stale
+
+
+###############################################################################
+# Volume em stream: o ZIP é gerado durante o upload, sem arquivo intermediário
+###############################################################################
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+STREAM_PREFETCH = 8  # blocos gerados à frente do upload pela thread do stream
+ZIP32_LIMIT = 0xFFFFFFFF
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_RECORD = struct.Struct("<IHHHHIIH")
+_UTF8_FLAG = 0x800
+
+
+def _deflater():
+    # Same parameters in the measuring pass and in the stream, so the output is identical
+    return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+
+
+def _dos_datetime(mtime: float) -> tuple[int, int]:
+    t = time.localtime(max(mtime, 315532800))  # ZIP não representa datas antes de 1980
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def measure_zip_entries(zip_path: str, files: list[str], base_path: str) -> list[dict]:
+    """Calcula CRC e tamanho comprimido de cada entrada (executado em processo worker).
+
+    O deflate é determinístico para os mesmos parâmetros e blocos de leitura,
+    então o stream gerado depois terá exatamente esses tamanhos. Entradas que
+    o deflate não reduz viram ZIP_STORED: o stream não as comprime de novo.
+    """
+    entries = []
+    for file_path in files:
+        st = os.stat(file_path)
+        method = compress_type_for(file_path)
+        crc = 0
+        compressed = 0
+        deflater = _deflater() if method == zipfile.ZIP_DEFLATED else None
+        with open(file_path, "rb") as f:
+            while chunk := f.read(STREAM_CHUNK_SIZE):
+                crc = zlib.crc32(chunk, crc)
+                compressed += len(deflater.compress(chunk)) if deflater else len(chunk)
+        if deflater:
+            compressed += len(deflater.flush())
+            if compressed >= st.st_size:
+                method, compressed = zipfile.ZIP_STORED, st.st_size
+        entries.append({
+            'path': file_path,
+            'arcname': os.path.relpath(file_path, base_path).replace(os.sep, "/"),
+            'method': method,
+            'crc': crc,
+            'compressed_size': compressed,
+            'size': st.st_size,
+            'mtime': st.st_mtime,
+            'mode': st.st_mode,
+        })
+    return entries
+
+
+async def measure_zip_volumes(
+    volumes: list[tuple[str, list[str]]],
+    base_path: str,
+    workers: int | None = None,
+) -> AsyncIterator[tuple[str, list[dict] | None]]:
+    """Mede os volumes em paralelo, entregando (zip_path, entradas) conforme terminam."""
+    async for zip_path, entries in _run_on_pool(measure_zip_entries, volumes, base_path, workers):
+        yield zip_path, entries
+
+
+def can_stream(entries: list[dict]) -> bool:
+    """O stream só gera ZIP32: sem entradas/offsets acima de 4 GB nem mais de 65535 arquivos."""
+    return len(entries) < 0xFFFF and zip_stream_size(entries) < ZIP32_LIMIT
+
+
+def zip_stream_size(entries: list[dict]) -> int:
+    """Tamanho exato do ZIP em stream, conhecido antes de gerar qualquer byte."""
+    total = _END_RECORD.size
+    for entry in entries:
+        name_len = len(entry['arcname'].encode("utf-8"))
+        total += _LOCAL_HEADER.size + name_len + entry['compressed_size']
+        total += _CENTRAL_HEADER.size + name_len
+    return total
+
+
+class ZipVolumeStream(io.RawIOBase):
+    """Arquivo somente-leitura que gera o volume ZIP sob demanda para o upload.
+
+    Suporta o que o upload precisa: seek para o fim (tamanho), seek para o
+    início e leitura sequencial. Seek para outras posições regenera o stream.
+
+    O upload chama read() de dentro do event loop; a leitura e o deflate rodam
+    numa thread que mantém até STREAM_PREFETCH blocos prontos, então read()
+    só copia bytes já gerados (como o zip em disco, nada comprime no loop).
+    """
+
+    def __init__(self, name: str, entries: list[dict]):
+        super().__init__()
+        self.name = name
+        self.entries = entries
+        self.size = zip_stream_size(entries)
+        self._thread: threading.Thread | None = None
+        self._rewind()
+
+    def _rewind(self):
+        self._stop_producer()
+        self._buffer = bytearray()
+        self._position = 0
+        self._chunks: queue.Queue | None = None
+        self._finished = False  # a thread começa na primeira leitura
+
+    def _start_producer(self):
+        self._chunks = queue.Queue(maxsize=STREAM_PREFETCH)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(self._chunks, self._stop), daemon=True)
+        self._thread.start()
+
+    def _produce(self, chunks: queue.Queue, stop: threading.Event):
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for chunk in self._generate():
+                if chunk and not put(chunk):
+                    return
+            put(None)  # fim do stream
+        except Exception as e:
+            put(e)
+
+    def _stop_producer(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self._stop_producer()
+        super().close()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset == self.size:
+            # Só consulta de tamanho: o próximo seek(0) reinicia o stream
+            self._stop_producer()
+            self._chunks = None
+            self._finished = True
+            self._buffer = bytearray()
+            self._position = offset
+            return offset
+        if offset < self._position:
+            self._rewind()
+        self.read(offset - self._position)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if self._chunks is None and not self._finished:
+            self._start_producer()
+        while (size < 0 or len(self._buffer) < size) and not self._finished:
+            chunk = self._chunks.get()
+            if chunk is None or isinstance(chunk, Exception):
+                self._finished = True
+                self._stop_producer()
+                if chunk is not None:
+                    raise chunk
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self._position += len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def _generate(self):
+        central = []
+        offset = 0
+        for entry in self.entries:
+            name = entry['arcname'].encode("utf-8")
+            dos_time, dos_date = _dos_datetime(entry['mtime'])
+            version = 20 if entry['method'] == zipfile.ZIP_DEFLATED else 10
+            yield _LOCAL_HEADER.pack(
+                0x04034B50, version, _UTF8_FLAG, entry['method'], dos_time, dos_date,
+                entry['crc'], entry['compressed_size'], entry['size'], len(name), 0,
+            ) + name
+
+            crc = 0
+            written = 0
+            deflater = _deflater() if entry['method'] == zipfile.ZIP_DEFLATED else None
+            with open(entry['path'], "rb") as f:
+                while chunk := f.read(STREAM_CHUNK_SIZE):
+                    crc = zlib.crc32(chunk, crc)
+                    data = deflater.compress(chunk) if deflater else chunk
+                    written += len(data)
+                    yield data
+            if deflater:
+                data = deflater.flush()
+                written += len(data)
+                yield data
+            if crc != entry['crc'] or written != entry['compressed_size']:
+                raise IOError(f"Arquivo alterado durante o envio do zip: {entry['path']}")
+
+            central.append(_CENTRAL_HEADER.pack(
+                0x02014B50, (3 << 8) | 20, version, _UTF8_FLAG, entry['method'],
+                dos_time, dos_date, entry['crc'], entry['compressed_size'], entry['size'],
+                len(name), 0, 0, 0, 0, (entry['mode'] & 0xFFFF) << 16, offset,
+            ) + name)
+            offset += _LOCAL_HEADER.size + len(name) + written
+
+        directory = b"".join(central)
+        yield directory
+        yield _END_RECORD.pack(
+            0x06054B50, 0, 0, len(central), len(central), len(directory), offset, 0,
+        )